@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the R -> NumPy float converter on `betaHat_var`-shaped
+arrays (L x L x p).
+
+Written in airspeed velocity style (`setup` plus `time_*` methods); run it
+directly for a quick comparison::
+
+    python benchmarks/bench_convert.py
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+import rpy2.rinterface as rinterface  # type: ignore
+from rpy2.rinterface_lib.sexp import NULLType  # type: ignore
+
+from fast_fmm_rpy2.convert import rpy2py_floatvector
+
+
+def legacy_rpy2py_floatvector(obj):
+    # the converter previously duplicated in fmm_run, ingest and plot_fui
+    x = np.array(obj)
+    try:
+        return pd.Series(x, obj.names)
+    except Exception:
+        try:
+            rownames, colnames = obj.do_slot("dimnames")
+            if not isinstance(rownames, NULLType) and not isinstance(
+                colnames, NULLType
+            ):
+                x = pd.DataFrame(x, index=rownames, columns=colnames)
+            else:
+                x = pd.DataFrame(x, columns=colnames)
+        finally:
+            return x
+
+
+def r_array(shape: tuple[int, ...]) -> rinterface.FloatSexpVector:
+    rng = np.random.default_rng(0)
+    flat = rng.standard_normal(int(np.prod(shape)))
+    arr = rinterface.FloatSexpVector.from_memoryview(memoryview(flat))
+    arr.do_slot_assign("dim", rinterface.IntSexpVector(shape))
+    return arr
+
+
+class ConvertBetaHatVar:
+    params = [100, 500]
+    param_names = ["L"]
+
+    def setup(self, L):
+        self.obj = r_array((L, L, 3))
+
+    def time_shared_converter(self, L):
+        rpy2py_floatvector(self.obj)
+
+    def time_legacy_converter(self, L):
+        legacy_rpy2py_floatvector(self.obj)
+
+    def peakmem_shared_converter(self, L):
+        rpy2py_floatvector(self.obj)
+
+    def peakmem_legacy_converter(self, L):
+        legacy_rpy2py_floatvector(self.obj)
+
+
+class ConvertUnnamedVector:
+    def setup(self):
+        self.obj = rinterface.FloatSexpVector(np.arange(100.0))
+
+    def time_shared_converter(self):
+        rpy2py_floatvector(self.obj)
+
+    def time_legacy_converter(self):
+        legacy_rpy2py_floatvector(self.obj)
+
+
+def main() -> None:
+    for L in ConvertBetaHatVar.params:
+        obj = r_array((L, L, 3))
+        for name, fn in (
+            ("legacy", legacy_rpy2py_floatvector),
+            ("shared", rpy2py_floatvector),
+        ):
+            n, total = timeit.Timer(lambda: fn(obj)).autorange()
+            print(f"betaHat_var L={L:<4} {name:<7} {total / n * 1e3:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
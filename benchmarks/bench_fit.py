@@ -0,0 +1,58 @@
+"""
+Benchmarks of `fastFMM::fui` under several argument sets.
+
+The data are passed to R in `setup`, so `time_fastfmm_fui` times the R fit
+alone. `time_fit_r_data` adds the wrapper's core budget and result
+wrapping, and `time_fui` adds on top the fingerprint of the data, which
+serializes the R data.frame, and the timing spans.
+"""
+
+from rpy2 import robjects as ro  # type: ignore
+from rpy2.robjects.conversion import localconverter  # type: ignore
+from rpy2.robjects.packages import importr  # type: ignore
+
+from fast_fmm_rpy2.fmm_run import fit_r_data, fui
+from fast_fmm_rpy2.ingest import read_csv_in_pandas_pass_to_r
+
+from .common import FORMULA, dataset_path
+
+FIT_ARGS = {
+    "analytic": {},
+    "no_var": {"var": False},
+    "bootstrap": {"analytic": False, "n_boots": 50},
+    "parallel": {"parallel": True, "n_cores": 4},
+}
+
+
+class Fit:
+    params = [["binary", "small", "medium"], list(FIT_ARGS)]
+    param_names = ["dataset", "args"]
+    timeout = 3600
+    number = 1
+    repeat = 3
+
+    def setup(self, dataset, args):
+        read_csv_in_pandas_pass_to_r(
+            dataset_path(dataset), r_var_name="bench_dat"
+        )
+        self.kwargs = {"parallel": False, "silent": True, **FIT_ARGS[args]}
+        self.fastFMM = importr("fastFMM")
+        self.stats = importr("stats")
+        self.base = importr("base")
+
+    def time_fastfmm_fui(self, dataset, args):
+        with localconverter(ro.default_converter):
+            self.fastFMM.fui(
+                formula=self.stats.as_formula(FORMULA),
+                data=self.base.as_symbol("bench_dat"),
+                **self.kwargs,
+            )
+
+    def time_fit_r_data(self, dataset, args):
+        fit_r_data(FORMULA, "bench_dat", **self.kwargs)
+
+    def time_fui(self, dataset, args):
+        fui(None, FORMULA, r_var_name="bench_dat", **self.kwargs)
+
+    def peakmem_fui(self, dataset, args):
+        fui(None, FORMULA, r_var_name="bench_dat", **self.kwargs)
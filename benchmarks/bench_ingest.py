@@ -0,0 +1,40 @@
+"""
+Benchmarks of CSV parsing and the pandas -> R transfer.
+"""
+
+from fast_fmm_rpy2.ingest import (
+    pass_pandas_matrix_to_r,
+    pass_pandas_to_r,
+    read_csv_cached,
+    read_csv_in_pandas_pass_to_r,
+    split_functional_outcome,
+)
+
+from .common import dataset_path
+
+
+class Ingest:
+    params = [["binary", "small", "medium", "large"]]
+    param_names = ["dataset"]
+
+    def setup(self, dataset):
+        self.path = dataset_path(dataset)
+        self.df = read_csv_cached(self.path)
+        self.covariates, self.outcome = split_functional_outcome(self.df)
+
+    def time_read_csv(self, dataset):
+        read_csv_cached(self.path)
+
+    def time_read_csv_in_pandas_pass_to_r(self, dataset):
+        read_csv_in_pandas_pass_to_r(self.path, r_var_name="bench_dat")
+
+    def time_pandas2ri_transfer(self, dataset):
+        pass_pandas_to_r(self.df, r_var_name="bench_dat")
+
+    def time_matrix_transfer(self, dataset):
+        pass_pandas_matrix_to_r(
+            self.covariates, self.outcome, r_var_name="bench_dat"
+        )
+
+    def peakmem_read_csv_in_pandas_pass_to_r(self, dataset):
+        read_csv_in_pandas_pass_to_r(self.path, r_var_name="bench_dat")
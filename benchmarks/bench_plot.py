@@ -0,0 +1,55 @@
+"""
+Benchmarks of `compute_plot_data` and `plot_fui` at several domain sizes.
+
+The results are built in Python, so these benchmarks do not need R.
+"""
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from fast_fmm_rpy2.plot_fui import compute_plot_data, plot_fui  # noqa: E402
+from fast_fmm_rpy2.result import FuiResult  # noqa: E402
+
+
+def fitted_result(L: int, p: int = 2) -> FuiResult:
+    rng = np.random.default_rng(0)
+    diag = np.abs(rng.standard_normal((L, p))) + 0.1
+    beta_var = np.zeros((L, L, p), order="F")
+    for r in range(p):
+        beta_var[:, :, r] = np.diag(diag[:, r])
+    return FuiResult._from_fields(
+        {
+            "betaHat": pd.DataFrame(
+                rng.standard_normal((p, L)).cumsum(axis=1),
+                index=["(Intercept)", "cs"][:p],
+            ),
+            "betaHat_var": beta_var,
+            "argvals": np.arange(1, L + 1),
+            "qn": np.full(p, 2.8),
+        }
+    )
+
+
+class Plot:
+    params = [[100, 1000, 4000]]
+    param_names = ["L"]
+
+    def setup(self, L):
+        self.mod = fitted_result(L)
+
+    def teardown(self, L):
+        plt.close("all")
+
+    def time_compute_plot_data(self, L):
+        compute_plot_data(self.mod)
+
+    def time_plot_fui(self, L):
+        plot_fui(self.mod)
+
+    def time_plot_fui_max_points(self, L):
+        plot_fui(self.mod, max_points=500)
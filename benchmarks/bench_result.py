@@ -0,0 +1,45 @@
+"""
+Benchmarks of the R -> Python conversion of fitted models.
+"""
+
+from rpy2 import robjects as ro  # type: ignore
+from rpy2.robjects.conversion import localconverter  # type: ignore
+
+from fast_fmm_rpy2.fmm_run import fui, fui_result_to_dict, local_rules
+from fast_fmm_rpy2.result import FuiResult
+
+from .common import FORMULA, dataset_path
+
+DATASETS = ["binary", "medium"]
+
+
+class Convert:
+    params = [DATASETS]
+    param_names = ["dataset"]
+    timeout = 3600
+
+    def setup_cache(self):
+        # fit once; R objects pickle through R's serialize
+        return {
+            dataset: fui(
+                dataset_path(dataset), FORMULA, parallel=False, silent=True
+            ).r_object
+            for dataset in DATASETS
+        }
+
+    def setup(self, fits, dataset):
+        self.r_mod = fits[dataset]
+
+    def time_local_rules_all_fields(self, fits, dataset):
+        with localconverter(local_rules):
+            ro.conversion.get_conversion().rpy2py(self.r_mod)
+
+    def time_fui_result_betahat(self, fits, dataset):
+        FuiResult(self.r_mod)["betaHat"]
+
+    def time_fui_result_to_dict(self, fits, dataset):
+        fui_result_to_dict(FuiResult(self.r_mod))
+
+    def peakmem_local_rules_all_fields(self, fits, dataset):
+        with localconverter(local_rules):
+            ro.conversion.get_conversion().rpy2py(self.r_mod)
@@ -0,0 +1,47 @@
+"""
+Datasets shared by the benchmarks.
+
+The bundled datasets are the CSVs under `tests/data`; synthetic datasets
+are generated by `fast_fmm_rpy2.synthetic` at a chosen scale and written
+once per process to a temporary directory, removed when the process exits.
+"""
+
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+
+from fast_fmm_rpy2.synthetic import write_synthetic
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "tests" / "data"
+
+BUNDLED = {
+    "binary": DATA_DIR / "binary.csv",
+    "anova": DATA_DIR / "anova_data.csv",
+    "corr": DATA_DIR / "corr_data.csv",
+}
+
+# (subjects, trials per subject, L)
+SCALES = {
+    "small": (8, 50, 50),
+    "medium": (20, 100, 200),
+    "large": (40, 200, 1000),
+}
+
+FORMULA = "photometry ~ cs + (1 | id)"
+
+_tmp_dir = Path(tempfile.mkdtemp(prefix="fast_fmm_rpy2_bench_"))
+atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
+
+
+def dataset_path(name: str) -> Path:
+    """Path of a bundled dataset or of a synthetic one, written on demand."""
+    if name in BUNDLED:
+        return BUNDLED[name]
+    path = _tmp_dir / f"{name}.csv"
+    if not path.exists():
+        n_subjects, n_trials, L = SCALES[name]
+        write_synthetic(
+            path, n_subjects=n_subjects, n_trials=n_trials, L=L, seed=0
+        )
+    return path
@@ -1,3 +1,30 @@
-from .fmm_run import check_fastfmm_version, fui, get_fastfmm_version
+# fmm_run imports rpy2, which starts an embedded R; load it on first
+# attribute access so `import fast_fmm_rpy2` stays cheap
+_LAZY_ATTRS = {
+    "FuiResult": "result",
+    "fui": "fmm_run",
+    "get_fastfmm_version": "fmm_run",
+    "check_fastfmm_version": "fmm_run",
+}
 
-__all__ = ["fui", "get_fastfmm_version", "check_fastfmm_version"]
+__all__ = [
+    "FuiResult",
+    "fui",
+    "get_fastfmm_version",
+    "check_fastfmm_version",
+]
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        from importlib import import_module
+
+        module = import_module(f".{_LAZY_ATTRS[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
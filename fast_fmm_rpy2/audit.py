@@ -0,0 +1,277 @@
+"""
+Audit the precision of data read by pandas against the same data in R.
+
+`audit_precision` compares two numeric tables in one vectorized pass and
+reports only the cells that are not close, optionally with their distance
+in units in the last place (ULP). `audit_df_dat` converts the outcome
+columns of an R data.frame in a single call and audits them against a
+pandas frame, replacing the per-cell `dat.rx` lookups of
+`ingest.compare_df_dat`.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from rpy2 import robjects as ro
+
+
+@dataclass(frozen=True)
+class PrecisionAudit:
+    """
+    Cells that differ between two tables, and how much they differ overall.
+
+    Parameters
+    ----------
+    mismatches : pd.DataFrame
+        One row per cell that is not close, with its 0-based `row`, its
+        `column` name, the `expected` and `actual` values, `abs_diff`,
+        `rel_diff` (relative to `expected`) and, when requested, `ulp`.
+    summary : dict
+        Statistics over every compared cell: `n_cells`, `n_mismatched`,
+        `n_identical` (bitwise equal or both NaN), `n_nan_mismatched`
+        (NaN on one side only), `max_abs_diff`, `max_rel_diff`,
+        `mean_abs_diff` and, when requested, `max_ulp`. The differences
+        are taken over cells that are finite on both sides.
+    """
+
+    mismatches: pd.DataFrame
+    summary: dict
+
+    @property
+    def ok(self) -> bool:
+        """Whether every cell is close."""
+        return self.summary["n_mismatched"] == 0
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the audit.
+
+        Returns
+        -------
+        dict
+            The summary statistics.
+        """
+        return dict(self.summary)
+
+
+def _ordered_bits(values: np.ndarray) -> np.ndarray:
+    # map float64 bit patterns to integers that sort like the floats, so
+    # that adjacent floats differ by one; -0.0 and 0.0 both map to 0
+    bits = values.view(np.int64)
+    return np.where(bits < 0, -(bits & np.int64(0x7FFFFFFFFFFFFFFF)), bits)
+
+
+def ulp_distance(expected, actual) -> np.ndarray:
+    """
+    Count the float64 values between each pair of values.
+
+    Parameters
+    ----------
+    expected, actual : array_like
+        Values of the same shape, compared as float64.
+
+    Returns
+    -------
+    np.ndarray
+        uint64 array of distances; 0 for equal values. Pairs with a NaN
+        or infinity are not meaningful.
+    """
+    a = _ordered_bits(np.ascontiguousarray(expected, dtype=np.float64))
+    b = _ordered_bits(np.ascontiguousarray(actual, dtype=np.float64))
+    # the distance can exceed int64 but always fits in uint64, where
+    # wrapping subtraction of the smaller from the larger is exact
+    larger = a >= b
+    a, b = a.view(np.uint64), b.view(np.uint64)
+    return np.where(larger, a - b, b - a)
+
+
+def _as_matrix(values, columns) -> tuple[np.ndarray, list[str]]:
+    if isinstance(values, pd.DataFrame):
+        columns = list(values.columns) if columns is None else columns
+        values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    matrix = np.asarray(values, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix[:, np.newaxis]
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a 2-D table, got {matrix.ndim} dims")
+    if columns is None:
+        columns = [str(j) for j in range(matrix.shape[1])]
+    return matrix, list(columns)
+
+
+def audit_precision(
+    expected,
+    actual,
+    columns: list[str] | None = None,
+    rtol: float = 1e-05,
+    atol: float = 1e-08,
+    equal_nan: bool = True,
+    ulp: bool = False,
+) -> PrecisionAudit:
+    """
+    Compare two numeric tables cell by cell with `np.isclose`.
+
+    Parameters
+    ----------
+    expected : pd.DataFrame or array_like
+        Reference values, e.g. as parsed by pandas.
+    actual : pd.DataFrame or array_like
+        Values to check, of the same shape, e.g. as parsed by R.
+    columns : list of str or None, optional
+        Column names used in the report. Default is None, which takes the
+        names of `expected` if it is a DataFrame and the column positions
+        otherwise.
+    rtol, atol : float, optional
+        Tolerances of `np.isclose`. Defaults are 1e-05 and 1e-08.
+    equal_nan : bool, optional
+        Whether NaN (R's NA) on both sides counts as close. Default is
+        True.
+    ulp : bool, optional
+        Whether to add the ULP distance of each mismatch and the largest
+        ULP distance over all finite cells. Default is False.
+
+    Returns
+    -------
+    PrecisionAudit
+        The mismatching cells and the summary statistics.
+
+    Raises
+    ------
+    ValueError
+        If the tables are not 2-D or their shapes differ.
+    """
+    a, columns = _as_matrix(expected, columns)
+    b, _ = _as_matrix(actual, columns)
+    if a.shape != b.shape:
+        raise ValueError(f"Shapes differ: {a.shape} and {b.shape}")
+    close = np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=equal_nan)
+    a_nan, b_nan = np.isnan(a), np.isnan(b)
+    finite = np.isfinite(a) & np.isfinite(b)
+    identical = (a.view(np.int64) == b.view(np.int64)) | (a_nan & b_nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        abs_diff = np.abs(a - b)
+        rel_diff = abs_diff / np.abs(a)
+    diffs = abs_diff[finite]
+    rel_diffs = rel_diff[finite & (a != 0)]
+    summary = {
+        "n_cells": int(a.size),
+        "n_mismatched": int(a.size - np.count_nonzero(close)),
+        "n_identical": int(np.count_nonzero(identical)),
+        "n_nan_mismatched": int(np.count_nonzero(a_nan != b_nan)),
+        "max_abs_diff": float(diffs.max()) if diffs.size else 0.0,
+        "max_rel_diff": float(rel_diffs.max()) if rel_diffs.size else 0.0,
+        "mean_abs_diff": float(diffs.mean()) if diffs.size else 0.0,
+    }
+    rows, cols = np.nonzero(~close)
+    report = {
+        "row": rows,
+        "column": pd.Categorical.from_codes(cols, categories=columns),
+        "expected": a[rows, cols],
+        "actual": b[rows, cols],
+        "abs_diff": abs_diff[rows, cols],
+        "rel_diff": rel_diff[rows, cols],
+    }
+    if ulp:
+        distance = ulp_distance(a, b)
+        summary["max_ulp"] = int(distance[finite].max()) if finite.any() else 0
+        # distances between NaN or infinite values are meaningless
+        report["ulp"] = pd.array(distance[rows, cols], dtype="UInt64")
+        report["ulp"][~finite[rows, cols]] = pd.NA
+    return PrecisionAudit(pd.DataFrame(report), summary)
+
+
+def r_numeric_matrix(
+    dat: "ro.vectors.DataFrame", columns: list[str]
+) -> np.ndarray:
+    """
+    Copy columns of an R data.frame into a float64 array in one call.
+
+    Parameters
+    ----------
+    dat : ro.vectors.DataFrame
+        R data.frame, e.g. from `ingest.r_read_in_csv_rpy2_convert`.
+    columns : list of str
+        Names of numeric (double, integer or logical) columns.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (nrow(dat), len(columns)); NA becomes NaN.
+    """
+    from rpy2 import robjects as ro  # type: ignore
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+
+    to_matrix = ro.r(
+        "function(d, cols) {"
+        " m <- as.matrix(d[, cols, drop = FALSE]);"
+        ' storage.mode(m) <- "double"; m }'
+    )
+    with localconverter(ro.default_converter):
+        matrix = to_matrix(dat, ro.StrVector(columns))
+    # R matrices are column-major, so the flat buffer reshapes in F order
+    flat = np.array(matrix, dtype=np.float64)
+    return flat.reshape((-1, len(columns)), order="F")
+
+
+def outcome_columns(df: pd.DataFrame, prefix: str = "photometry") -> list:
+    """
+    List the `<prefix>.N` columns of a frame, in frame order.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame with one column per functional domain point.
+    prefix : str, optional
+        Name of the functional outcome. Default is "photometry".
+
+    Returns
+    -------
+    list of str
+        Matching column names.
+    """
+    return [c for c in df.columns if str(c).startswith(f"{prefix}.")]
+
+
+def audit_df_dat(
+    df: pd.DataFrame,
+    dat: "ro.vectors.DataFrame",
+    prefix: str = "photometry",
+    rtol: float = 1e-05,
+    atol: float = 1e-08,
+    ulp: bool = False,
+) -> PrecisionAudit:
+    """
+    Audit the functional outcome parsed by pandas against R's `read.csv`.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame read by pandas, e.g. `ingest.pandas_read_in_csv_roundtrip`.
+    dat : ro.vectors.DataFrame
+        The same CSV read by R, e.g. `ingest.r_read_in_csv_rpy2_convert`.
+    prefix : str, optional
+        Name of the functional outcome. Default is "photometry".
+    rtol, atol : float, optional
+        Tolerances of `np.isclose`. Defaults are 1e-05 and 1e-08.
+    ulp : bool, optional
+        Whether to report ULP distances. Default is False.
+
+    Returns
+    -------
+    PrecisionAudit
+        Mismatching cells, with `row` counted from 0 in `df`, and summary
+        statistics.
+    """
+    columns = outcome_columns(df, prefix)
+    return audit_precision(
+        df[columns],
+        r_numeric_matrix(dat, columns),
+        columns=columns,
+        rtol=rtol,
+        atol=atol,
+        ulp=ulp,
+    )
@@ -0,0 +1,381 @@
+"""
+Fit many fastFMM models across a pool of R worker processes.
+
+Embedded R runs on one thread per process, so a thread pool cannot run
+`fui` calls concurrently. `fit_batch` starts worker processes that each
+load R and fastFMM once, keeps a bounded number of jobs in flight and
+yields results as they finish.
+"""
+
+import multiprocessing
+import time
+from collections.abc import Callable, Iterable, Iterator, Sized
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor
+from concurrent.futures import wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+from fast_fmm_rpy2.cache import IngestCache
+from fast_fmm_rpy2.scheduler import (
+    ResourcePlan,
+    apply_thread_env,
+    available_cores,
+    plan_resources,
+)
+from fast_fmm_rpy2.schema import DEFAULT_SCHEMA, IngestSchema
+from fast_fmm_rpy2.worker import _preload, run_fui_job
+
+
+@dataclass
+class FuiJob:
+    """
+    One model to fit: the data, the formula and any other `fui` arguments.
+
+    Parameters
+    ----------
+    data : Path or pd.DataFrame or None
+        Passed to `fmm_run.fui` as `csv_filepath`.
+    formula : str
+        The formula to be used in the fastFMM model.
+    kwargs : dict, optional
+        Other keyword arguments of `fmm_run.fui`, with None for R's NULL.
+        `import_rules` and `result_cache` cannot be sent to a worker.
+    tag : object, optional
+        Caller's label for the job, returned with its result.
+    """
+
+    data: Path | pd.DataFrame | None
+    formula: str
+    kwargs: dict = field(default_factory=dict)
+    tag: object = None
+
+    def to_job(self) -> dict:
+        """
+        Build the argument dict understood by `worker.run_fui_job`.
+
+        Returns
+        -------
+        dict
+            `csv_filepath`, `formula` and the keyword arguments.
+
+        Raises
+        ------
+        TypeError
+            If `kwargs` holds an argument that cannot be sent to a worker.
+        """
+        for unsupported in ("import_rules", "result_cache"):
+            if unsupported in self.kwargs:
+                raise TypeError(
+                    f"{unsupported} is not supported in batch jobs"
+                )
+        data = self.data
+        if data is not None and not isinstance(data, pd.DataFrame):
+            data = Path(data).absolute()
+        return dict(csv_filepath=data, formula=self.formula, **self.kwargs)
+
+
+@dataclass
+class FuiJobResult:
+    """
+    Outcome of one batch job.
+
+    Attributes
+    ----------
+    index : int
+        Position of the job in the input sequence.
+    job : object
+        The job as given, e.g. a `FuiJob`.
+    result : object
+        R-free model (see `fmm_run.fui_result_to_dict`), or None if the
+        job failed.
+    error : BaseException or None
+        The exception raised by the job, or None on success.
+    attempts : int
+        Number of times the job was started.
+    elapsed : float
+        Seconds between the last submission and completion.
+    """
+
+    index: int
+    job: object
+    result: object = None
+    error: BaseException | None = None
+    attempts: int = 1
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _as_fui_job(job) -> FuiJob:
+    if isinstance(job, FuiJob):
+        return job
+    if isinstance(job, dict):
+        return FuiJob(**job)
+    return FuiJob(*job)
+
+
+def _fit_job(job: FuiJob, plan: ResourcePlan):
+    # explicit per-job settings win over the plan
+    return run_fui_job({**plan.fui_kwargs(), **job.to_job()})
+
+
+def _init_fit_worker(plan: ResourcePlan) -> None:
+    # thread caps must be in place before R loads its BLAS
+    apply_thread_env(plan)
+    _preload()
+
+
+def _init_data_worker(
+    plan: ResourcePlan,
+    data: Path | pd.DataFrame,
+    outcome,
+    outcome_name: str,
+    r_var_name: str,
+    ingest_cache: IngestCache | bool | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+) -> None:
+    # load the shared data into R once per worker, for jobs that fit
+    # against an R variable
+    _init_fit_worker(plan)
+    from fast_fmm_rpy2.fmm_run import pass_data_to_r
+
+    pass_data_to_r(
+        data,
+        outcome_name,
+        outcome=outcome,
+        r_var_name=r_var_name,
+        ingest_cache=ingest_cache,
+        schema=schema,
+    )
+
+
+def run_batch(
+    jobs: Iterable,
+    fn: Callable,
+    max_workers: int | None = None,
+    max_pending: int | None = None,
+    retries: int = 1,
+    initializer: Callable | None = None,
+    initargs: tuple = (),
+) -> Iterator[FuiJobResult]:
+    """
+    Run `fn` over `jobs` in spawned worker processes and stream results.
+
+    This is the engine behind `fit_batch`; `fn` and `initializer` must be
+    importable module-level callables.
+
+    Parameters
+    ----------
+    jobs : iterable
+        Picklable job payloads, consumed lazily so that a generator of
+        thousands of jobs is never materialized.
+    fn : callable
+        Called as `fn(job)` in a worker process.
+    max_workers : int or None, optional
+        Number of worker processes. Default is `available_cores()`.
+    max_pending : int or None, optional
+        Maximum number of submitted but unfinished jobs, which bounds the
+        memory held by queued payloads and results. Default is
+        `2 * max_workers`.
+    retries : int, optional
+        How many times a job is resubmitted when its worker process dies
+        (e.g. R segfaults or runs out of memory). Every job in flight when
+        a worker dies is resubmitted, since the pool cannot tell which one
+        killed it. Exceptions raised by `fn` are not retried.
+        Default is 1.
+    initializer : callable or None, optional
+        Called once in every new worker process. Default is None.
+    initargs : tuple, optional
+        Arguments passed to `initializer`. Default is ().
+
+    Yields
+    ------
+    FuiJobResult
+        One result per job, in completion order.
+    """
+    if max_workers is None:
+        max_workers = available_cores()
+    if max_pending is None:
+        max_pending = 2 * max_workers
+    if max_workers < 1 or max_pending < 1:
+        raise ValueError("max_workers and max_pending must be at least 1")
+    max_pending = max(max_pending, max_workers)
+    # R is not fork-safe, so workers always start from a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=initializer,
+            initargs=initargs,
+        )
+
+    pool = new_pool()
+    job_iter = enumerate(jobs)
+    retry_queue: list[FuiJobResult] = []
+    pending: dict[Future, tuple[FuiJobResult, float, object]] = {}
+
+    def replace_pool() -> None:
+        # a pool is unusable once one of its workers died; its unfinished
+        # futures fail with BrokenProcessPool and are retried below
+        nonlocal pool
+        pool.shutdown(wait=True, cancel_futures=True)
+        pool = new_pool()
+
+    def submit(entry: FuiJobResult) -> None:
+        try:
+            future = pool.submit(fn, entry.job)
+        except BrokenProcessPool:
+            replace_pool()
+            future = pool.submit(fn, entry.job)
+        pending[future] = (entry, time.perf_counter(), pool)
+
+    try:
+        exhausted = False
+        while True:
+            while len(pending) < max_pending:
+                if retry_queue:
+                    submit(retry_queue.pop(0))
+                    continue
+                if exhausted:
+                    break
+                try:
+                    index, job = next(job_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                submit(FuiJobResult(index=index, job=job, attempts=1))
+            if not pending:
+                return
+            done, _ = wait_futures(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                entry, started, owner = pending.pop(future)
+                entry.elapsed = time.perf_counter() - started
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    broken = broken or owner is pool
+                    if entry.attempts <= retries:
+                        entry.attempts += 1
+                        retry_queue.append(entry)
+                        continue
+                if error is None:
+                    entry.result = future.result()
+                else:
+                    entry.error = error
+                yield entry
+            if broken:
+                replace_pool()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchRun:
+    """
+    Iterator over the results of `fit_batch`, exposing the resource plan.
+
+    Attributes
+    ----------
+    plan : ResourcePlan
+        How the CPU budget is divided between the batch's fits.
+    """
+
+    def __init__(self, results: Iterator[FuiJobResult], plan: ResourcePlan):
+        self._results = results
+        self.plan = plan
+
+    def __iter__(self) -> "BatchRun":
+        return self
+
+    def __next__(self) -> FuiJobResult:
+        return next(self._results)
+
+    def close(self) -> None:
+        """Stop the batch, cancelling jobs that have not started."""
+        self._results.close()  # type: ignore[attr-defined]
+
+
+def fit_batch(
+    jobs: Iterable,
+    max_workers: int | None = None,
+    max_pending: int | None = None,
+    retries: int = 1,
+    total_cores: int | None = None,
+    plan: ResourcePlan | None = None,
+) -> BatchRun:
+    """
+    Fit many models in parallel R worker processes.
+
+    Each worker process starts R and loads fastFMM once, then fits jobs
+    until the batch is done. Results are R-free and stream back as they
+    finish; use `FuiJobResult.index` (or `FuiJob.tag`) to match them to
+    jobs.
+
+    The CPU budget is split by `scheduler.plan_resources`. Every job gets
+    the plan's `parallel` and `n_cores` unless its kwargs set them, and
+    every worker caps its BLAS/OpenMP threads. Fits running side by side
+    therefore never ask for more cores than the budget.
+
+    Parameters
+    ----------
+    jobs : iterable of FuiJob, tuple or dict
+        Jobs as `FuiJob`s, `(data, formula[, kwargs[, tag]])` tuples or
+        dicts of `FuiJob` fields.
+    max_workers : int or None, optional
+        Upper bound on concurrent fits. Default is None (as many as the
+        budget and the number of jobs allow).
+    max_pending : int or None, optional
+        Maximum number of jobs in flight. Default is `2 * max_workers`.
+    retries : int, optional
+        Resubmissions of a job whose worker process died. Default is 1.
+    total_cores : int or None, optional
+        CPU budget shared by all fits. Default is every available core.
+    plan : ResourcePlan or None, optional
+        Use this plan instead of computing one; `max_workers` and
+        `total_cores` are then ignored. Default is None.
+
+    Returns
+    -------
+    BatchRun
+        Iterator of `FuiJobResult`, one per job, in completion order;
+        `BatchRun.plan` holds the plan in use. Failed jobs carry the
+        exception in `error` instead of raising, so one bad dataset does
+        not stop the batch.
+
+    Examples
+    --------
+    >>> jobs = [
+    ...     FuiJob(path, "photometry ~ cs + (1 | id)")
+    ...     for path in Path("sessions").glob("*.csv")
+    ... ]
+    >>> run = fit_batch(jobs, total_cores=32)
+    >>> run.plan
+    ResourcePlan(total_cores=32, max_workers=32, n_cores=1, blas_threads=1)
+    >>> for res in run:
+    ...     if res.ok:
+    ...         save(res.job.data, res.result)
+    """
+    if plan is None:
+        plan = plan_resources(
+            n_jobs=len(jobs) if isinstance(jobs, Sized) else None,
+            total_cores=total_cores,
+            max_workers=max_workers,
+        )
+    fui_jobs = (_as_fui_job(job) for job in jobs)
+    results = run_batch(
+        fui_jobs,
+        partial(_fit_job, plan=plan),
+        max_workers=plan.max_workers,
+        max_pending=max_pending,
+        retries=retries,
+        initializer=_init_fit_worker,
+        initargs=(plan,),
+    )
+    return BatchRun(results, plan)
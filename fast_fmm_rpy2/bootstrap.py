@@ -0,0 +1,925 @@
+"""
+Bootstrap inference for fastFMM split into shards across processes or hosts.
+
+With `analytic=False`, `fastFMM::fui` runs every bootstrap replicate inside
+one R call. `fui_bootstrap` instead resamples subjects in Python and fits
+each replicate as a separate point-estimate fit, so the replicates can be
+split into shards that run in worker processes (`processes`) or, through a
+`ShardQueue` on a shared file system, on several hosts. Every replicate
+draws its subjects from its own random stream seeded by `(seed,
+replicate)`, so the merged result depends only on `seed` and `n_boots`:
+not on the number of shards, processes or hosts, nor on the order in
+which shards finish.
+
+The merged result has the fields `plot_fui` and `compute_plot_data` use:
+`betaHat` from the fit to the full data, `betaHat_var` from the bootstrap
+covariance and `qn`, the quantile of the maximum absolute t-statistic
+over the functional domain, for the joint bands.
+
+Run queued shards from the shell with::
+
+    python -m fast_fmm_rpy2.bootstrap /shared/queue_dir
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import time
+import warnings
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_fmm_rpy2.batch import _init_data_worker, run_batch
+from fast_fmm_rpy2.cache import _atomic_write
+from fast_fmm_rpy2.result import FuiResult
+from fast_fmm_rpy2.scheduler import plan_resources
+from fast_fmm_rpy2.schema import DEFAULT_SCHEMA
+
+BOOTSTRAP_FORMAT_VERSION = 1
+
+BOOT_R_VAR = "boot_dat"
+
+# fields of the full-data fit kept in the merged result
+ESTIMATE_FIELDS = ("betaHat", "argvals", "aic")
+
+_GROUPING = re.compile(r"\|\s*([^()|]+?)\s*\)")
+
+
+@dataclass(frozen=True)
+class BootstrapShard:
+    """
+    A contiguous range of bootstrap replicates.
+
+    Parameters
+    ----------
+    index : int
+        Position of the shard.
+    start : int
+        First replicate of the shard.
+    stop : int
+        One past the last replicate of the shard.
+    seed : int
+        Seed of the whole bootstrap; replicate `b` draws from
+        `np.random.default_rng([seed, b])`.
+    """
+
+    index: int
+    start: int
+    stop: int
+    seed: int
+
+    @property
+    def n_boots(self) -> int:
+        """Number of replicates in the shard."""
+        return self.stop - self.start
+
+    @property
+    def name(self) -> str:
+        """Task name of the shard in a `ShardQueue`."""
+        return f"shard-{self.index:04d}"
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the shard.
+
+        Returns
+        -------
+        dict
+            Every field of the shard.
+        """
+        return asdict(self)
+
+
+def plan_shards(
+    n_boots: int, n_shards: int, seed: int = 1
+) -> list[BootstrapShard]:
+    """
+    Split replicates into shards of near-equal size.
+
+    Parameters
+    ----------
+    n_boots : int
+        Total number of bootstrap replicates.
+    n_shards : int
+        Number of shards; capped at `n_boots`.
+    seed : int, optional
+        Seed of the bootstrap. Default is 1.
+
+    Returns
+    -------
+    list[BootstrapShard]
+        Shards covering replicates 0 to `n_boots - 1` in order.
+
+    Raises
+    ------
+    ValueError
+        If `n_boots` or `n_shards` is less than 1.
+    """
+    if n_boots < 1 or n_shards < 1:
+        raise ValueError("n_boots and n_shards must be at least 1")
+    bounds = np.linspace(0, n_boots, min(n_shards, n_boots) + 1)
+    bounds = bounds.round().astype(int)
+    return [
+        BootstrapShard(i, int(start), int(stop), seed)
+        for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def grouping_variable(formula: str) -> str:
+    """
+    Get the subject variable of a formula's random effects.
+
+    Parameters
+    ----------
+    formula : str
+        A fastFMM formula, e.g. "photometry ~ cs + (cs | id)".
+
+    Returns
+    -------
+    str
+        The grouping variable of the last random-effect term, e.g. "id".
+
+    Raises
+    ------
+    ValueError
+        If the formula has no `( ... | group)` term.
+    """
+    groups = _GROUPING.findall(formula)
+    if not groups:
+        raise ValueError(f"no random-effect grouping in {formula!r}")
+    return groups[-1]
+
+
+def resample_clusters(
+    groups: Sequence, seed: int, replicate: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Draw one cluster bootstrap sample of the rows.
+
+    Subjects are drawn with replacement, keeping all of a subject's rows
+    together, and each draw becomes a new subject, so a subject drawn
+    twice enters the fit as two independent subjects.
+
+    Parameters
+    ----------
+    groups : sequence
+        Subject of every row of the data.
+    seed : int
+        Seed of the bootstrap.
+    replicate : int
+        Replicate number; with `seed`, it fully determines the draw.
+
+    Returns
+    -------
+    rows : np.ndarray
+        0-based positions of the resampled rows, draw by draw.
+    ids : np.ndarray
+        New subject of each resampled row, numbered from 1.
+    """
+    _, codes = np.unique(np.asarray(groups), return_inverse=True)
+    counts = np.bincount(codes)
+    starts = np.cumsum(counts) - counts
+    order = np.argsort(codes, kind="stable")
+    rng = np.random.default_rng([seed, replicate])
+    draw = rng.integers(len(counts), size=len(counts))
+    lengths = counts[draw]
+    # position of every output row within its drawn subject
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    rows = order[np.repeat(starts[draw], lengths) + offsets]
+    ids = np.repeat(np.arange(1, len(draw) + 1), lengths)
+    return rows, ids
+
+
+def _point_fit_kwargs(fui_kwargs: dict) -> dict:
+    kwargs = dict(fui_kwargs)
+    # None stands for R's NULL, which is what fui defaults these to
+    for key in ("argvals", "nknots_min", "subj_id", "n_cores"):
+        if key in kwargs and kwargs[key] is None:
+            del kwargs[key]
+    # the bootstrap chooses what each fit returns
+    for key in ("return_fields", "betaHat_var_path", "progress"):
+        kwargs.pop(key, None)
+    return {**kwargs, "analytic": True, "var": False}
+
+
+def fit_estimate(
+    formula: str, r_var_name: str = BOOT_R_VAR, **fui_kwargs
+) -> dict:
+    """
+    Fit the point estimate to the full data already assigned in R.
+
+    Parameters
+    ----------
+    formula : str
+        The formula to be used in the fastFMM model.
+    r_var_name : str, optional
+        R variable holding the data. Default is "boot_dat".
+    **fui_kwargs
+        Other `fmm_run.fui` arguments, with None for R's NULL.
+
+    Returns
+    -------
+    dict
+        The `ESTIMATE_FIELDS` the fit produced, as R-free objects.
+    """
+    from fast_fmm_rpy2 import fmm_run
+
+    mod = fmm_run.fui(
+        None,
+        formula,
+        r_var_name=r_var_name,
+        return_fields=list(ESTIMATE_FIELDS),
+        **_point_fit_kwargs(fui_kwargs),
+    )
+    return fmm_run.fui_result_to_dict(mod)
+
+
+def run_shard(
+    shard: BootstrapShard,
+    formula: str,
+    subj_id: str,
+    r_var_name: str = BOOT_R_VAR,
+    **fui_kwargs,
+) -> np.ndarray:
+    """
+    Fit the replicates of one shard to data already assigned in R.
+
+    Parameters
+    ----------
+    shard : BootstrapShard
+        Replicates to fit.
+    formula : str
+        The formula to be used in the fastFMM model.
+    subj_id : str
+        Column of the subjects to resample.
+    r_var_name : str, optional
+        R variable holding the full data. Default is "boot_dat".
+    **fui_kwargs
+        Other `fmm_run.fui` arguments, with None for R's NULL.
+
+    Returns
+    -------
+    np.ndarray
+        `betaHat` of every replicate, shape (n_boots, p, L); all NaN for
+        replicates whose fit failed, which `merge_replicates` leaves out.
+
+    Raises
+    ------
+    RuntimeError
+        If every replicate of the shard failed, from the last failure.
+    """
+    from rpy2 import robjects as ro  # type: ignore
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+
+    from fast_fmm_rpy2 import fmm_run
+
+    boot_var = f"{r_var_name}_boot"
+    kwargs = _point_fit_kwargs(fui_kwargs)
+    # the data were read with `schema` and `ingest_cache` before the
+    # shard, and replicates are fitted without fui's fingerprint, metadata,
+    # cache and spans
+    for key in ("ingest_cache", "schema", "result_cache"):
+        kwargs.pop(key, None)
+    get_groups = ro.r(
+        "function(nm, col) as.character(get(nm, envir = globalenv())[[col]])"
+    )
+    # matrix columns are subset by row as well
+    make_sample = ro.r(
+        "function(nm, rows, col, ids) {"
+        " d <- get(nm, envir = globalenv())[rows, , drop = FALSE];"
+        " d[[col]] <- ids; rownames(d) <- NULL; d }"
+    )
+    with localconverter(ro.default_converter):
+        groups = np.array(list(get_groups(r_var_name, subj_id)))
+    replicates: list[np.ndarray | None] = []
+    error: Exception | None = None
+    for replicate in range(shard.start, shard.stop):
+        rows, ids = resample_clusters(groups, shard.seed, replicate)
+        with localconverter(ro.default_converter):
+            ro.globalenv[boot_var] = make_sample(
+                r_var_name,
+                ro.IntVector((rows + 1).tolist()),
+                subj_id,
+                ro.IntVector(ids.tolist()),
+            )
+        try:
+            mod = fmm_run.fit_r_data(
+                formula,
+                boot_var,
+                return_fields=["betaHat"],
+                **kwargs,
+            )
+            replicates.append(mod.to_numpy("betaHat", copy=True))
+        except Exception as e:
+            # e.g. a resample in which a covariate is constant
+            replicates.append(None)
+            error = e
+    with localconverter(ro.default_converter):
+        ro.r(f"rm({boot_var})")
+    fitted = [r for r in replicates if r is not None]
+    if not fitted:
+        raise RuntimeError(
+            f"every replicate of {shard.name} failed"
+        ) from error
+    failed = np.full_like(fitted[0], np.nan, dtype=np.float64)
+    return np.stack([failed if r is None else r for r in replicates])
+
+
+def merge_replicates(
+    estimate: dict,
+    replicates: Sequence[np.ndarray],
+    alpha: float = 0.05,
+    metadata: dict | None = None,
+) -> FuiResult:
+    """
+    Combine the full-data fit and the shards' replicates into a result.
+
+    Parameters
+    ----------
+    estimate : dict
+        Fields returned by `fit_estimate`.
+    replicates : sequence of np.ndarray
+        Arrays returned by `run_shard`, in shard order.
+    alpha : float, optional
+        One minus the coverage of the joint bands. Default is 0.05.
+    metadata : dict or None, optional
+        Stored as the result's `metadata`. Default is None.
+
+    Returns
+    -------
+    FuiResult
+        R-free result with `betaHat`, `betaHat_var` (L x L x p, the
+        covariance of the replicates), `qn` (per coefficient, the
+        1 - `alpha` quantile over replicates of the maximum over the
+        domain of |replicate - mean| / se), `argvals`, `aic` when the
+        full-data fit has it, `n_boots` (the replicates used) and
+        `failed_replicates` (the numbers of those whose fit failed, which
+        are left out with a warning).
+    """
+    boots = np.concatenate(list(replicates), axis=0)
+    failed = np.isnan(boots).all(axis=(1, 2))
+    if failed.any():
+        warnings.warn(
+            f"{failed.sum()} of {len(boots)} bootstrap replicates failed "
+            + "and were left out",
+            stacklevel=2,
+        )
+        boots = boots[~failed]
+    n_boots, p, L = boots.shape
+    beta_var = np.empty((L, L, p), order="F")
+    for r in range(p):
+        beta_var[:, :, r] = np.cov(boots[:, r, :], rowvar=False)
+    se = np.sqrt(np.diagonal(beta_var, axis1=0, axis2=1))
+    centered = np.abs(boots - boots.mean(axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_max = np.nanmax(np.where(se > 0, centered / se, 0.0), axis=2)
+    qn = np.quantile(t_max, 1 - alpha, axis=0)
+    argvals = estimate.get("argvals")
+    if argvals is None:
+        argvals = np.arange(1, L + 1)
+    fields = {
+        "betaHat": estimate["betaHat"],
+        "betaHat_var": beta_var,
+        "qn": qn,
+        "argvals": np.asarray(argvals),
+        "aic": estimate.get("aic"),
+        "n_boots": n_boots,
+        "failed_replicates": np.flatnonzero(failed),
+    }
+    return FuiResult._from_fields(fields, metadata)
+
+
+def _is_json(value) -> bool:
+    try:
+        json.dumps(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _metadata(
+    formula: str,
+    n_boots: int,
+    n_shards: int,
+    seed: int,
+    alpha: float,
+    subj_id: str,
+    fui_kwargs: dict,
+) -> dict:
+    return {
+        "formula": formula,
+        "fui_kwargs": fui_kwargs,
+        "bootstrap": {
+            "n_boots": n_boots,
+            "n_shards": n_shards,
+            "seed": seed,
+            "alpha": alpha,
+            "subj_id": subj_id,
+        },
+    }
+
+
+def _run_task(job: dict):
+    # one estimate or shard task, against data already assigned in R
+    kwargs = job["fui_kwargs"]
+    if job["shard"] is None:
+        return fit_estimate(job["formula"], job["r_var_name"], **kwargs)
+    return run_shard(
+        job["shard"],
+        job["formula"],
+        job["subj_id"],
+        job["r_var_name"],
+        **kwargs,
+    )
+
+
+def fui_bootstrap(
+    data: Path | str | pd.DataFrame,
+    formula: str,
+    n_boots: int = 500,
+    seed: int = 1,
+    n_shards: int | None = None,
+    processes: int | None = None,
+    total_cores: int | None = None,
+    subj_id: str | None = None,
+    alpha: float = 0.05,
+    outcome: np.ndarray | None = None,
+    r_var_name: str = BOOT_R_VAR,
+    **fui_kwargs,
+) -> FuiResult:
+    """
+    Fit a model with cluster bootstrap inference split into shards.
+
+    The data are passed to R once per R process. The full-data point
+    estimate and every shard are then fitted against that R variable, in
+    this process or in worker processes, and merged by
+    `merge_replicates`.
+
+    Parameters
+    ----------
+    data : Path, str or pd.DataFrame
+        CSV file or in-memory data, as accepted by `fmm_run.fui`.
+    formula : str
+        The formula to be used in the fastFMM model.
+    n_boots : int, optional
+        Number of bootstrap replicates. Default is 500.
+    seed : int, optional
+        Seed of the bootstrap. Default is 1.
+    n_shards : int or None, optional
+        Number of shards. Default is None, which uses one per process.
+        The result does not depend on it.
+    processes : int or None, optional
+        Number of worker processes. Default is None, which fits every
+        shard in this process.
+    total_cores : int or None, optional
+        CPU budget shared by the worker processes, split as in
+        `batch.fit_batch`. Ignored without `processes`. Default is every
+        available core.
+    subj_id : str or None, optional
+        Column of the subjects to resample. Default is None, which takes
+        the grouping variable of the formula's last random effect.
+    alpha : float, optional
+        One minus the coverage of the joint bands. Default is 0.05.
+    outcome : np.ndarray or None, optional
+        Outcome matrix paired with a covariate DataFrame. Default is None.
+    r_var_name : str, optional
+        R variable holding the data. Default is "boot_dat".
+    **fui_kwargs
+        Other `fmm_run.fui` arguments of every fit, with None for R's
+        NULL; `analytic` and `var` are set by the bootstrap. `schema` and
+        `ingest_cache` apply to reading `data`.
+
+    Returns
+    -------
+    FuiResult
+        See `merge_replicates`; `metadata` records the formula, the
+        arguments and the bootstrap settings.
+
+    Raises
+    ------
+    ValueError
+        If `n_boots` or `n_shards` is less than 1, or no subject variable
+        is given or found.
+    RuntimeError
+        If a task of the worker processes fails twice. Replicates that
+        fail do not fail their task; see `merge_replicates`.
+
+    Examples
+    --------
+    >>> mod = fui_bootstrap(
+    ...     "tests/data/binary.csv",
+    ...     "photometry ~ cs + (1 | id)",
+    ...     n_boots=1000,
+    ...     processes=8,
+    ... )
+    >>> plot_fui(mod)
+    """
+    from fast_fmm_rpy2.fmm_run import outcome_name
+
+    if subj_id is None:
+        subj_id = grouping_variable(formula)
+    shards = plan_shards(n_boots, n_shards or processes or 1, seed)
+    if not isinstance(data, pd.DataFrame):
+        data = Path(data).absolute()
+    # the data are read once per R process; `schema` stays in the kwargs
+    # as part of a result_cache key
+    ingest_cache = fui_kwargs.pop("ingest_cache", None)
+    schema = fui_kwargs.get("schema", DEFAULT_SCHEMA)
+    metadata = _metadata(
+        formula,
+        n_boots,
+        len(shards),
+        seed,
+        alpha,
+        subj_id,
+        # only JSON-serializable arguments are recorded
+        {k: v for k, v in fui_kwargs.items() if _is_json(v)},
+    )
+    jobs = [
+        {
+            "formula": formula,
+            "shard": shard,
+            "subj_id": subj_id,
+            "r_var_name": r_var_name,
+            "fui_kwargs": fui_kwargs,
+        }
+        for shard in [None, *shards]
+    ]
+    outputs: list = [None] * len(jobs)
+    if processes is None:
+        from fast_fmm_rpy2.fmm_run import pass_data_to_r
+
+        pass_data_to_r(
+            data,
+            outcome_name(formula),
+            outcome=outcome,
+            r_var_name=r_var_name,
+            ingest_cache=ingest_cache,
+            schema=schema,
+        )
+        outputs = [_run_task(job) for job in jobs]
+    else:
+        plan = plan_resources(
+            n_jobs=len(jobs), total_cores=total_cores, max_workers=processes
+        )
+        for job in jobs:
+            # explicit settings win over the plan
+            job["fui_kwargs"] = {**plan.fui_kwargs(), **fui_kwargs}
+        pending = list(range(len(jobs)))
+        errors: dict[int, BaseException] = {}
+        # a failed task is run once more, in a fresh pool, after every
+        # other task has finished, so one failure does not discard the
+        # finished shards
+        for _ in range(2):
+            errors = {}
+            for res in run_batch(
+                [jobs[i] for i in pending],
+                _run_task,
+                max_workers=plan.max_workers,
+                initializer=_init_data_worker,
+                initargs=(
+                    plan,
+                    data,
+                    outcome,
+                    outcome_name(formula),
+                    r_var_name,
+                    ingest_cache,
+                    schema,
+                ),
+            ):
+                if res.ok:
+                    outputs[pending[res.index]] = res.result
+                else:
+                    errors[pending[res.index]] = res.error
+            pending = sorted(errors)
+            if not pending:
+                break
+        if errors:
+            names = [
+                "estimate" if i == 0 else shards[i - 1].name
+                for i in sorted(errors)
+            ]
+            raise RuntimeError(
+                f"bootstrap tasks failed twice: {', '.join(names)}"
+            ) from errors[min(errors)]
+    return merge_replicates(outputs[0], outputs[1:], alpha, metadata)
+
+
+class ShardQueue:
+    """
+    Bootstrap tasks in a directory that workers on several hosts share.
+
+    `create` writes the plan to `queue.json`. Any number of processes, on
+    any host that sees the directory and the CSV, then call `work` (or run
+    `python -m fast_fmm_rpy2.bootstrap <directory>`). A worker claims a
+    task by creating its lock file in `locks/` exclusively, fits it and
+    writes its output atomically: `estimate/` for the full-data fit,
+    `shard-NNNN.npy` for each shard. `merge` combines the outputs once
+    every task is done. A task whose worker died keeps its lock; remove
+    it with `release_stale` to let another worker take the task.
+
+    Parameters
+    ----------
+    directory : Path or str
+        Directory written by `create`.
+    """
+
+    def __init__(self, directory: Path | str):
+        self.directory = Path(directory)
+        spec = json.loads((self.directory / "queue.json").read_text())
+        if spec.get("format") != BOOTSTRAP_FORMAT_VERSION:
+            raise ValueError(
+                f"{self.directory} has queue format {spec.get('format')}, "
+                + f"expected {BOOTSTRAP_FORMAT_VERSION}"
+            )
+        self.spec = spec
+        self.shards = [BootstrapShard(**s) for s in spec["shards"]]
+
+    @classmethod
+    def create(
+        cls,
+        directory: Path | str,
+        csv_filepath: Path | str,
+        formula: str,
+        n_boots: int = 500,
+        n_shards: int = 10,
+        seed: int = 1,
+        subj_id: str | None = None,
+        alpha: float = 0.05,
+        **fui_kwargs,
+    ) -> "ShardQueue":
+        """
+        Write a bootstrap plan to a new queue directory.
+
+        Parameters
+        ----------
+        directory : Path or str
+            Directory to create; must not already hold a queue.
+        csv_filepath : Path or str
+            CSV file read by every worker, at the same path on every host.
+        formula : str
+            The formula to be used in the fastFMM model.
+        n_boots : int, optional
+            Number of bootstrap replicates. Default is 500.
+        n_shards : int, optional
+            Number of shard tasks. Default is 10.
+        seed : int, optional
+            Seed of the bootstrap. Default is 1.
+        subj_id : str or None, optional
+            As in `fui_bootstrap`. Default is None.
+        alpha : float, optional
+            As in `fui_bootstrap`. Default is 0.05.
+        **fui_kwargs
+            JSON-serializable `fmm_run.fui` arguments of every fit, with
+            None for R's NULL.
+
+        Returns
+        -------
+        ShardQueue
+            The new queue.
+
+        Raises
+        ------
+        FileExistsError
+            If `directory` already holds a queue.
+        TypeError
+            If an argument in `fui_kwargs` is not JSON-serializable.
+        """
+        directory = Path(directory)
+        (directory / "locks").mkdir(parents=True, exist_ok=True)
+        if (directory / "queue.json").exists():
+            raise FileExistsError(f"{directory} already holds a queue")
+        if subj_id is None:
+            subj_id = grouping_variable(formula)
+        shards = plan_shards(n_boots, n_shards, seed)
+        for key, value in fui_kwargs.items():
+            if not _is_json(value):
+                raise TypeError(f"{key} cannot be stored in a queue")
+        spec = {
+            "format": BOOTSTRAP_FORMAT_VERSION,
+            "csv_filepath": str(Path(csv_filepath).absolute()),
+            "shards": [shard.options() for shard in shards],
+            **_metadata(
+                formula, n_boots, len(shards), seed, alpha, subj_id, fui_kwargs
+            ),
+        }
+        _atomic_write(
+            directory / "queue.json",
+            lambda path: path.write_text(json.dumps(spec, indent=2)),
+        )
+        return cls(directory)
+
+    def tasks(self) -> list[str]:
+        """
+        List the task names.
+
+        Returns
+        -------
+        list[str]
+            "estimate" followed by the shards' names.
+        """
+        return ["estimate", *(shard.name for shard in self.shards)]
+
+    def _output(self, task: str) -> Path:
+        if task == "estimate":
+            # FuiResult.save writes its metadata.json last
+            return self.directory / "estimate" / "metadata.json"
+        return self.directory / f"{task}.npy"
+
+    def _lock(self, task: str) -> Path:
+        return self.directory / "locks" / f"{task}.lock"
+
+    def status(self) -> dict[str, str]:
+        """
+        Get the state of every task.
+
+        Returns
+        -------
+        dict[str, str]
+            "done", "running" (claimed, without output yet) or "pending"
+            for each task name.
+        """
+        states = {}
+        for task in self.tasks():
+            if self._output(task).exists():
+                states[task] = "done"
+            elif self._lock(task).exists():
+                states[task] = "running"
+            else:
+                states[task] = "pending"
+        return states
+
+    def _claim(self, task: str) -> bool:
+        if self._output(task).exists():
+            return False
+        try:
+            fd = os.open(
+                self._lock(task), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+            )
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{socket.gethostname()}:{os.getpid()}\n")
+        return True
+
+    def work(self, max_tasks: int | None = None) -> list[str]:
+        """
+        Claim and run pending tasks in this process until none are left.
+
+        The CSV is passed to R once, before the first claimed task. A task
+        that raises is released, so that it is pending again, and the
+        error is re-raised; finished tasks keep their outputs.
+
+        Parameters
+        ----------
+        max_tasks : int or None, optional
+            Stop after this many tasks. Default is None (no limit).
+
+        Returns
+        -------
+        list[str]
+            Names of the tasks this process completed.
+        """
+        spec = self.spec
+        done: list[str] = []
+        loaded = False
+        for shard in [None, *self.shards]:
+            if max_tasks is not None and len(done) >= max_tasks:
+                break
+            task = "estimate" if shard is None else shard.name
+            if not self._claim(task):
+                continue
+            if not loaded:
+                from fast_fmm_rpy2.fmm_run import outcome_name, pass_data_to_r
+
+                pass_data_to_r(
+                    Path(spec["csv_filepath"]),
+                    outcome_name(spec["formula"]),
+                    r_var_name=BOOT_R_VAR,
+                    ingest_cache=spec["fui_kwargs"].get("ingest_cache"),
+                )
+                loaded = True
+            try:
+                output = _run_task(
+                    {
+                        "formula": spec["formula"],
+                        "shard": shard,
+                        "subj_id": spec["bootstrap"]["subj_id"],
+                        "r_var_name": BOOT_R_VAR,
+                        "fui_kwargs": spec["fui_kwargs"],
+                    }
+                )
+                if shard is None:
+                    FuiResult._from_fields(output).save(
+                        self.directory / "estimate", list(output)
+                    )
+                else:
+                    _atomic_write(self._output(task), _npy_writer(output))
+            except BaseException:
+                # leave the task pending for another attempt rather than
+                # claimed by a worker that gave up on it
+                self._lock(task).unlink(missing_ok=True)
+                raise
+            done.append(task)
+        return done
+
+    def release_stale(self, max_age_s: float) -> list[str]:
+        """
+        Remove the locks of unfinished tasks claimed too long ago.
+
+        Parameters
+        ----------
+        max_age_s : float
+            Age in seconds after which a claimed task without output is
+            assumed to have lost its worker.
+
+        Returns
+        -------
+        list[str]
+            Names of the released tasks, which are pending again.
+        """
+        released = []
+        now = time.time()
+        for task, state in self.status().items():
+            lock = self._lock(task)
+            if state != "running":
+                continue
+            try:
+                stale = now - lock.stat().st_mtime > max_age_s
+            except FileNotFoundError:
+                continue
+            if stale:
+                lock.unlink(missing_ok=True)
+                released.append(task)
+        return released
+
+    def merge(self) -> FuiResult:
+        """
+        Combine the outputs of every task.
+
+        Returns
+        -------
+        FuiResult
+            As returned by `fui_bootstrap` for the same plan.
+
+        Raises
+        ------
+        RuntimeError
+            If some tasks are not done.
+        """
+        unfinished = [t for t, s in self.status().items() if s != "done"]
+        if unfinished:
+            raise RuntimeError(f"tasks not done: {', '.join(unfinished)}")
+        estimate = FuiResult.load(self.directory / "estimate", mmap=False)
+        replicates = [
+            np.load(self._output(shard.name), allow_pickle=False)
+            for shard in self.shards
+        ]
+        metadata = {
+            key: self.spec[key]
+            for key in ("formula", "fui_kwargs", "bootstrap")
+        }
+        return merge_replicates(
+            dict(estimate.items()),
+            replicates,
+            self.spec["bootstrap"]["alpha"],
+            metadata,
+        )
+
+
+def _npy_writer(array: np.ndarray):
+    def write(path: Path) -> None:
+        # np.save appends .npy to paths without it, so write to a handle
+        with open(path, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+
+    return write
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m fast_fmm_rpy2.bootstrap",
+        description="Run pending bootstrap tasks of a shard queue.",
+    )
+    parser.add_argument("directory", type=Path, help="queue directory")
+    parser.add_argument(
+        "--max-tasks",
+        type=int,
+        default=None,
+        help="stop after this many tasks (default: run until none are left)",
+    )
+    args = parser.parse_args(argv)
+    for task in ShardQueue(args.directory).work(args.max_tasks):
+        print(task, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# bump whenever the layout of cached frames changes so stale entries miss
+CACHE_FORMAT_VERSION = 1
+
+
+def default_cache_dir() -> Path:
+    """
+    Get the root directory used for on-disk caches.
+
+    Returns
+    -------
+    Path
+        `$FAST_FMM_RPY2_CACHE_DIR` if set, otherwise
+        `$XDG_CACHE_HOME/fast_fmm_rpy2` (defaulting to `~/.cache`).
+    """
+    env_dir = os.environ.get("FAST_FMM_RPY2_CACHE_DIR")
+    if env_dir:
+        return Path(env_dir)
+    xdg_dir = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg_dir) if xdg_dir else Path.home() / ".cache"
+    return base / "fast_fmm_rpy2"
+
+
+def file_digest(filepath: Path, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+
+    Parameters
+    ----------
+    filepath : Path
+        File to hash.
+    chunk_size : int, optional
+        Number of bytes read per chunk. Default is 1 MiB.
+
+    Returns
+    -------
+    str
+        Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write(path: Path, write) -> None:
+    # write to a temporary file in the same directory, then rename, so
+    # concurrent readers never see a partially written entry
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(Path(tmp_name))
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class _DiskLRU:
+    """Size-capped directory of cache entries with LRU eviction."""
+
+    suffix = ".pkl"
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def entries(self) -> list[Path]:
+        """
+        List cached entries, least recently used first.
+
+        Returns
+        -------
+        list[Path]
+            Entry files ordered by last access.
+        """
+        entries = []
+        for path in self.cache_dir.glob(f"*{self.suffix}"):
+            try:
+                entries.append((path.stat().st_mtime_ns, path))
+            except FileNotFoundError:
+                continue
+        return [path for _, path in sorted(entries)]
+
+    def size(self) -> int:
+        """
+        Get the total size of cached entries in bytes.
+
+        Returns
+        -------
+        int
+            Sum of entry file sizes.
+        """
+        return sum(
+            path.stat().st_size for path in self.entries() if path.exists()
+        )
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until under `max_bytes`.
+
+        Returns
+        -------
+        int
+            Number of entries removed.
+        """
+        entries = [(path, path.stat().st_size) for path in self.entries()]
+        total = sum(size for _, size in entries)
+        n_evicted = 0
+        for path, size in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            n_evicted += 1
+        return n_evicted
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        for path in self.entries():
+            path.unlink(missing_ok=True)
+        return None
+
+
+class IngestCache(_DiskLRU):
+    """
+    Size-capped on-disk cache of normalized CSV frames.
+
+    Entries are keyed on the SHA-256 of the file contents, its mtime and
+    size, and the parser options used to build the frame, so editing the
+    file or changing how it is parsed invalidates the entry automatically.
+    Frames are stored with `DataFrame.to_pickle`, which writes each
+    consolidated column block as a raw buffer, so a warm load is a single
+    sequential read with no float parsing. When the cache grows beyond
+    `max_bytes` the least recently used entries are evicted.
+
+    Parameters
+    ----------
+    cache_dir : Path or None, optional
+        Directory holding the entries. Default is
+        `default_cache_dir() / "ingest"`.
+    max_bytes : int, optional
+        Upper bound on the total size of cached entries. Default is 2 GiB.
+    """
+
+    def __init__(
+        self, cache_dir: Path | None = None, max_bytes: int = 2 * 1024**3
+    ):
+        if cache_dir is None:
+            cache_dir = default_cache_dir() / "ingest"
+        super().__init__(cache_dir, max_bytes)
+        self._digest_index_path = self.cache_dir / "digests.json"
+
+    def _cached_file_digest(self, filepath: Path, stat: os.stat_result) -> str:
+        # hashing a large CSV costs a full read, so remember the digest for
+        # each (path, mtime, size) and only rehash when the file changes
+        stat_key = f"{filepath}|{stat.st_mtime_ns}|{stat.st_size}"
+        try:
+            index = json.loads(self._digest_index_path.read_text())
+        except (OSError, ValueError):
+            index = {}
+        if stat_key in index:
+            return index[stat_key]
+        digest = file_digest(filepath)
+        index = {
+            key: value
+            for key, value in index.items()
+            if not key.startswith(f"{filepath}|")
+        }
+        index[stat_key] = digest
+        _atomic_write(
+            self._digest_index_path,
+            lambda tmp: tmp.write_text(json.dumps(index)),
+        )
+        return digest
+
+    def key(self, filepath: Path, **options) -> str:
+        """
+        Build the cache key for a file and the options used to parse it.
+
+        Parameters
+        ----------
+        filepath : Path
+            Source file.
+        **options
+            JSON-serializable parser options that affect the cached frame.
+
+        Returns
+        -------
+        str
+            Hex digest identifying the entry.
+        """
+        filepath = Path(filepath).absolute()
+        stat = filepath.stat()
+        payload = json.dumps(
+            {
+                "format": CACHE_FORMAT_VERSION,
+                "sha256": self._cached_file_digest(filepath, stat),
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                # pickled frames only load reliably in the same pandas
+                "pandas": pd.__version__,
+                "options": options,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """
+        Load a cached frame.
+
+        Parameters
+        ----------
+        key : str
+            Key returned by `key`.
+
+        Returns
+        -------
+        pd.DataFrame or None
+            The cached frame, or None on a miss.
+        """
+        path = self._entry_path(key)
+        if not path.exists():
+            return None
+        try:
+            df = pd.read_pickle(path)
+        except Exception:
+            # truncated, or pickled by an incompatible pandas: drop the
+            # entry so that the next put replaces it
+            path.unlink(missing_ok=True)
+            return None
+        # refresh the access time used for LRU eviction
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        """
+        Store a frame and evict old entries if the size cap is exceeded.
+
+        Parameters
+        ----------
+        key : str
+            Key returned by `key`.
+        df : pd.DataFrame
+            Frame to cache.
+        """
+        _atomic_write(self._entry_path(key), df.to_pickle)
+        self.evict()
+        return None
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        super().clear()
+        self._digest_index_path.unlink(missing_ok=True)
+        return None
+
+
+def fingerprint_array(arr: np.ndarray) -> str:
+    """
+    Hash the values and shape of an array independently of memory layout.
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        Array to hash. Fortran-ordered arrays (such as outcome sidecars)
+        are hashed without a copy.
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    arr = np.asfortranarray(arr)
+    digest = hashlib.sha256(f"{arr.dtype.str}{arr.shape}".encode())
+    digest.update(memoryview(arr.ravel(order="F")).cast("B"))
+    return digest.hexdigest()
+
+
+def fingerprint_frame(df: pd.DataFrame) -> str:
+    """
+    Hash the values, index, column names and dtypes of a frame.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame to hash.
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    digest = hashlib.sha256(
+        json.dumps(
+            [[str(col), str(dt)] for col, dt in df.dtypes.items()]
+        ).encode()
+    )
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    digest.update(memoryview(row_hashes).cast("B"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters of a `FuiResultCache`."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class FuiResultCache(_DiskLRU):
+    """
+    Two-tier memoization cache for fitted `fui` models.
+
+    Results are keyed on a fingerprint of the input data, the formula,
+    every keyword argument of `fmm_run.fui` and the installed fastFMM
+    version. The in-memory tier keeps the `max_entries` most recently used
+    results; the optional on-disk tier pickles them into `cache_dir` and
+    evicts least recently used files beyond `max_bytes`. Results that
+    cannot be pickled are kept in memory only.
+
+    Parameters
+    ----------
+    cache_dir : Path or None, optional
+        Directory of the on-disk tier. Default is
+        `default_cache_dir() / "fui"`.
+    max_bytes : int, optional
+        Size cap of the on-disk tier. Default is 2 GiB.
+    max_entries : int, optional
+        Number of results kept in memory. Default is 32.
+    disk : bool, optional
+        Whether to use the on-disk tier. Default is True.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | None = None,
+        max_bytes: int = 2 * 1024**3,
+        max_entries: int = 32,
+        disk: bool = True,
+    ):
+        if cache_dir is None:
+            cache_dir = default_cache_dir() / "fui"
+        super().__init__(cache_dir, max_bytes)
+        self.max_entries = max_entries
+        self.disk = disk
+        self.stats = CacheStats()
+        self._memory: OrderedDict[str, object] = OrderedDict()
+
+    @staticmethod
+    def key(
+        data_fingerprint: str,
+        formula: str,
+        fui_kwargs: dict,
+        fastfmm_version: str,
+    ) -> str:
+        """
+        Build the cache key of a fit.
+
+        Parameters
+        ----------
+        data_fingerprint : str
+            Digest of the input data, e.g. from `fingerprint_frame`.
+        formula : str
+            Model formula.
+        fui_kwargs : dict
+            Every other argument of the fit, as JSON-serializable values.
+        fastfmm_version : str
+            Installed fastFMM version.
+
+        Returns
+        -------
+        str
+            Hex digest identifying the fit.
+        """
+        payload = json.dumps(
+            {
+                "format": CACHE_FORMAT_VERSION,
+                "data": data_fingerprint,
+                "formula": " ".join(formula.split()),
+                "kwargs": fui_kwargs,
+                "fastFMM": fastfmm_version,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a result, promoting disk hits into memory.
+
+        Parameters
+        ----------
+        key : str
+            Key returned by `key`.
+
+        Returns
+        -------
+        object or None
+            The cached result, or None on a miss.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats.memory_hits += 1
+            return self._memory[key]
+        if self.disk:
+            path = self._entry_path(key)
+            try:
+                with open(path, "rb") as f:
+                    result = pickle.load(f)
+            except Exception:
+                # missing, truncated, or holding R objects that cannot be
+                # restored in this session: all count as a miss
+                result = None
+            if result is not None:
+                os.utime(path)
+                self.stats.disk_hits += 1
+                self._remember(key, result)
+                return result
+        self.stats.misses += 1
+        return None
+
+    def _remember(self, key: str, result) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def put(self, key: str, result) -> None:
+        """
+        Store a result in memory and, if enabled, on disk.
+
+        Parameters
+        ----------
+        key : str
+            Key returned by `key`.
+        result : object
+            Fitted model.
+        """
+        self._remember(key, result)
+        if self.disk:
+
+            def write(tmp: Path) -> None:
+                with open(tmp, "wb") as f:
+                    pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            try:
+                _atomic_write(self._entry_path(key), write)
+            except Exception:
+                # unpicklable results stay in the memory tier only
+                pass
+            else:
+                self.stats.evictions += self.evict()
+        return None
+
+    def clear(self) -> None:
+        """Remove every cached result from both tiers."""
+        self._memory.clear()
+        super().clear()
+        return None
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import rpy2.rinterface as rinterface  # type: ignore
+from rpy2 import robjects as ro  # type: ignore
+from rpy2.rinterface_lib.sexp import NULLType  # type: ignore
+from rpy2.robjects import pandas2ri  # type: ignore
+
+
+def rpy2py_floatvector(obj: rinterface.FloatSexpVector):
+    """
+    Convert an R numeric vector, matrix or array without copying its data.
+
+    The data are wrapped as a NumPy view of R's memory through the array
+    interface, with R's `dim` as the shape and column-major strides. The
+    view keeps `obj` alive, so it stays valid after the R object goes out
+    of scope. Names and dimnames are read from the attribute list, so no
+    exception is raised and caught to tell the cases apart.
+
+    Parameters
+    ----------
+    obj : rinterface.FloatSexpVector
+        R double vector, possibly with `names`, `dim` and `dimnames`.
+
+    Returns
+    -------
+    np.ndarray, pd.Series or pd.DataFrame
+        A Series for named vectors (and 1-d arrays with dimnames), a
+        DataFrame for matrices with column names, and an ndarray
+        otherwise, e.g. for unnamed vectors and 3-d arrays such as
+        `betaHat_var`.
+    """
+    x = np.asarray(obj)
+    attrs = set(obj.list_attrs())
+    if x.ndim == 1:
+        if "names" in attrs:
+            return pd.Series(x, index=list(obj.do_slot("names")), copy=False)
+        if "dimnames" in attrs:
+            (names,) = obj.do_slot("dimnames")
+            if not isinstance(names, NULLType):
+                return pd.Series(x, index=list(names), copy=False)
+        return x
+    if x.ndim != 2 or "dimnames" not in attrs:
+        return x
+    rownames, colnames = obj.do_slot("dimnames")
+    if isinstance(colnames, NULLType):
+        return x
+    return pd.DataFrame(
+        x,
+        index=None if isinstance(rownames, NULLType) else list(rownames),
+        columns=list(colnames),
+        copy=False,
+    )
+
+
+def make_rules() -> ro.conversion.Converter:
+    """
+    Build the pandas-aware converter used to import fastFMM results.
+
+    Returns
+    -------
+    ro.conversion.Converter
+        `ro.default_converter + pandas2ri.converter` with
+        `rpy2py_floatvector` registered for R doubles.
+    """
+    rules = ro.default_converter + pandas2ri.converter
+    rules.rpy2py.register(rinterface.FloatSexpVector)(rpy2py_floatvector)
+    return rules
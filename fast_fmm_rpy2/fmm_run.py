@@ -1,3 +1,7 @@
+import hashlib
+import inspect
+from collections.abc import Callable, Sequence
+from contextlib import nullcontext
 from pathlib import Path
 
 import numpy as np
@@ -7,12 +11,30 @@ from packaging import version
 from rpy2 import robjects as ro  # type: ignore
 from rpy2.rinterface import NULL  # type: ignore
 from rpy2.rinterface_lib.sexp import NULLType  # type: ignore
-from rpy2.robjects import pandas2ri  # type: ignore
+from rpy2.rlike.container import NamedList  # type: ignore
 from rpy2.robjects.conversion import localconverter  # type: ignore
 from rpy2.robjects.packages import importr  # type: ignore
-from rpy2.robjects.vectors import IntVector  # type: ignore
+from rpy2.robjects.vectors import IntVector, StrVector  # type: ignore
 
-from fast_fmm_rpy2.ingest import read_csv_in_pandas_pass_to_r
+from fast_fmm_rpy2.cache import (
+    FuiResultCache,
+    IngestCache,
+    file_digest,
+    fingerprint_array,
+    fingerprint_frame,
+)
+from fast_fmm_rpy2.convert import make_rules, rpy2py_floatvector  # noqa: F401
+from fast_fmm_rpy2.ingest import (
+    pass_pandas_matrix_to_r,
+    pass_pandas_to_r,
+    read_csv_in_pandas_pass_to_r,
+    split_functional_outcome,
+)
+from fast_fmm_rpy2.instrument import collect_spans, span
+from fast_fmm_rpy2.progress import ProgressEvent, capture_console
+from fast_fmm_rpy2.result import FuiResult
+from fast_fmm_rpy2.scheduler import available_cores, default_core_budget
+from fast_fmm_rpy2.schema import DEFAULT_SCHEMA, IngestSchema
 
 # R packages will be imported inside functions where conversion
 # context is available
@@ -86,30 +108,185 @@ def check_fastfmm_version(
     return True
 
 
-local_rules = ro.default_converter + pandas2ri.converter
+local_rules = make_rules()
 
 
-@local_rules.rpy2py.register(rinterface.FloatSexpVector)
-def rpy2py_floatvector(obj):
-    x = np.array(obj)
-    try:
-        # if names is assigned, convert to pandas series
-        return pd.Series(x, obj.names)
-    except Exception:
-        # if dimnames assigned, it's a named matrix,
-        # convert to pandas dataframe
-        try:
-            rownames, colnames = obj.do_slot("dimnames")
-            if not isinstance(rownames, NULLType) and not isinstance(
-                colnames, NULLType
-            ):
-                x = pd.DataFrame(x, index=rownames, columns=colnames)
-            else:
-                x = pd.DataFrame(x, columns=colnames)
+def data_fingerprint(
+    data: Path | pd.DataFrame | None,
+    outcome: np.ndarray | None = None,
+    r_var_name: str | None = "py_dat",
+) -> str:
+    """
+    Hash the data a `fui` call would fit.
 
-        finally:
-            # plain vector/matrix
-            return x
+    Parameters
+    ----------
+    data : Path, pd.DataFrame or None
+        CSV path or in-memory frame, as accepted by `fui`. If None, the R
+        variable `r_var_name` is serialized and hashed.
+    outcome : np.ndarray or None, optional
+        Outcome matrix paired with a covariate frame. Default is None.
+    r_var_name : str or None, optional
+        R variable holding the data when `data` is None.
+        Default is "py_dat".
+
+    Returns
+    -------
+    str
+        Hex digest of the data.
+    """
+    if isinstance(data, pd.DataFrame):
+        digest = fingerprint_frame(data)
+        if outcome is not None:
+            digest += fingerprint_array(outcome)
+        return digest
+    if data is not None:
+        return file_digest(Path(data))
+    serialize = ro.r(
+        "function(nm) serialize(get(nm, envir = globalenv()), NULL)"
+    )
+    with localconverter(ro.default_converter):
+        raw = serialize(r_var_name)
+    return hashlib.sha256(np.asarray(raw)).hexdigest()
+
+
+def fui_result_to_dict(mod):
+    """
+    Convert a fitted model into plain Python objects that need no R.
+
+    Parameters
+    ----------
+    mod : object
+        A model returned by `fui`, or any field of one.
+
+    Returns
+    -------
+    object
+        `FuiResult`s and named R lists become dicts (unnamed lists become
+        lists), NULL
+        becomes None and remaining R vectors become NumPy arrays. Pandas
+        and NumPy objects produced by the converter are returned as is.
+        Non-vector R objects (e.g. formulas) are deparsed to strings.
+    """
+    if isinstance(mod, FuiResult):
+        return {name: fui_result_to_dict(value) for name, value in mod.items()}
+    if isinstance(mod, NamedList):
+        names = list(mod.names())
+        values = [fui_result_to_dict(value) for value in mod.values()]
+        if all(name is None for name in names):
+            return values
+        return {
+            str(i) if name is None else str(name): value
+            for i, (name, value) in enumerate(zip(names, values))
+        }
+    if isinstance(mod, NULLType):
+        return None
+    if isinstance(mod, rinterface.SexpVector):
+        # copy out of R's memory so the result outlives the R object
+        return np.array(mod)
+    if isinstance(mod, rinterface.Sexp):
+        with localconverter(ro.default_converter):
+            return "\n".join(ro.r["deparse"](mod))
+    return mod
+
+
+def select_fields(r_mod, return_fields: Sequence[str]):
+    """
+    Subset a fitted model to some of its fields, in R.
+
+    Parameters
+    ----------
+    r_mod : rinterface.ListSexpVector
+        Unconverted result of `fastFMM::fui`.
+    return_fields : sequence of str
+        Field names to keep; names the result does not have are ignored.
+
+    Returns
+    -------
+    rinterface.ListSexpVector
+        A new R list with the kept fields in their original order. The
+        dropped fields are no longer referenced from Python, so R can free
+        them.
+    """
+    keep = ro.r("function(m, keep) m[names(m) %in% keep]")
+    with localconverter(ro.default_converter):
+        return keep(r_mod, StrVector(list(return_fields)))
+
+
+def outcome_name(formula: str) -> str:
+    """
+    Get the functional outcome of a formula.
+
+    Parameters
+    ----------
+    formula : str
+        A fastFMM formula, e.g. "photometry ~ cs + (1 | id)".
+
+    Returns
+    -------
+    str
+        The left-hand side, e.g. "photometry".
+    """
+    return formula.split("~")[0].strip()
+
+
+def pass_data_to_r(
+    data: Path | pd.DataFrame,
+    outcome_name: str,
+    outcome: np.ndarray | None = None,
+    r_var_name: str | None = "py_dat",
+    ingest_cache: IngestCache | bool | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+) -> None:
+    """
+    Assign a CSV file or DataFrame to an R variable, as `fui` does.
+
+    Parameters
+    ----------
+    data : Path or pd.DataFrame
+        CSV file, or in-memory data whose `<outcome_name>.1..L` columns are
+        sent to R as a single matrix column.
+    outcome_name : str
+        Name of the functional outcome.
+    outcome : np.ndarray or None, optional
+        Outcome matrix paired with a covariate DataFrame. Default is None.
+    r_var_name : str or None, optional
+        Name of the R variable to assign. Default is "py_dat".
+    ingest_cache : IngestCache, bool or None, optional
+        Cache of normalized CSV frames used when `data` is a path.
+        Default is None.
+    schema : IngestSchema, optional
+        Column typing rules applied when `data` is a path.
+        Default is `DEFAULT_SCHEMA`.
+
+    Raises
+    ------
+    ValueError
+        If `r_var_name` is None.
+    """
+    if r_var_name is None:
+        raise ValueError("r_var_name must be provided to pass data to R")
+    if isinstance(data, pd.DataFrame):
+        covariates = data
+        if outcome is None:
+            covariates, outcome = split_functional_outcome(data, outcome_name)
+        if outcome is None:
+            pass_pandas_to_r(covariates, r_var_name=r_var_name)
+        else:
+            pass_pandas_matrix_to_r(
+                covariates,
+                outcome,
+                outcome_name=outcome_name,
+                r_var_name=r_var_name,
+            )
+    else:
+        read_csv_in_pandas_pass_to_r(
+            csv_filepath=data,
+            r_var_name=r_var_name,
+            cache=ingest_cache,
+            schema=schema,
+        )
+    return None
 
 
 def run_with_pandas_dataframe(csv_filepath: Path, import_rules=local_rules):
@@ -136,8 +313,56 @@ def run_with_r_dataframe(csv_filepath: Path, import_rules=local_rules):
     return r_mod
 
 
+def _run_fastfmm(
+    formula: str,
+    r_var_name: str,
+    fui_kwargs: dict,
+    progress: Callable[[ProgressEvent], None] | None = None,
+    instrument: bool = True,
+):
+    # Import R packages locally to avoid conversion context issues
+    base = importr("base")
+    stats = importr("stats")
+    fastFMM = importr("fastFMM")
+
+    fui_kwargs = dict(fui_kwargs)
+    if fui_kwargs.get("argvals", NULL) is not NULL:
+        fui_kwargs["argvals"] = IntVector(fui_kwargs["argvals"])
+    # hold machine-wide core tokens for the cores fastFMM will fork; with
+    # n_cores=NULL it would take 3/4 of the machine, so take what is free
+    # up to that instead
+    n_cores = fui_kwargs.get("n_cores", NULL)
+    if not fui_kwargs.get("parallel", True):
+        want = minimum = 1
+    elif n_cores is NULL:
+        want, minimum = max(1, available_cores() * 3 // 4), 1
+    else:
+        want = minimum = n_cores
+    budget = default_core_budget()
+    cores = (
+        nullcontext(want) if budget is None else budget.acquire(want, minimum)
+    )
+    console = nullcontext() if progress is None else capture_console(progress)
+    with cores as granted:
+        if fui_kwargs.get("parallel", True) and n_cores is NULL:
+            fui_kwargs["n_cores"] = granted
+        # the arguments are plain scalars, so the default converter
+        # suffices; the result stays in R until FuiResult converts what is
+        # read
+        with (
+            span("fui.fit", n_cores=granted) if instrument else nullcontext(),
+            console,
+            localconverter(ro.default_converter),
+        ):
+            return fastFMM.fui(
+                formula=stats.as_formula(formula),
+                data=base.as_symbol(r_var_name),
+                **fui_kwargs,
+            )
+
+
 def fui(
-    csv_filepath: Path | None,
+    csv_filepath: Path | pd.DataFrame | None,
     formula: str,
     parallel: bool = True,
     import_rules=local_rules,
@@ -165,14 +390,25 @@ def fui(
     impute_outcome: bool = False,
     override_zero_var: bool = False,
     unsmooth: bool = False,
+    outcome: np.ndarray | None = None,
+    ingest_cache: IngestCache | bool | None = None,
+    result_cache: FuiResultCache | None = None,
+    return_fields: Sequence[str] | None = None,
+    float32: bool = False,
+    betaHat_var_path: Path | str | None = None,
+    progress: Callable[[ProgressEvent], None] | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
 ):
     """
     Run the fastFMM model using the specified formula and data.
 
     Parameters
     ----------
-    csv_filepath : Path or None
-        The file path to the CSV file containing the data.
+    csv_filepath : Path, pd.DataFrame or None
+        The file path to the CSV file containing the data, or the data
+        itself as an in-memory DataFrame. Any `<outcome>.1..L` columns of a
+        DataFrame, where `<outcome>` is the left-hand side of `formula`,
+        are sent to R as a single matrix column.
         If None, `r_var_name` must be provided.
     formula : str
         The formula to be used in the fastFMM model.
@@ -259,62 +495,254 @@ def fui(
         Whether to return the raw estimates of coefficients and variances
         without smoothing
         Default is False.
+    outcome : np.ndarray or None, optional
+        Functional outcome matrix of shape (n, L) to pair with a covariate
+        DataFrame passed as `csv_filepath`. It is sent to R as one numeric
+        matrix column named after the left-hand side of `formula`.
+        Default is None.
+    ingest_cache : IngestCache, bool or None, optional
+        Cache of normalized CSV frames used when `csv_filepath` is a path.
+        True uses an `IngestCache` in the default location.
+        Default is None (always parse the CSV).
+    result_cache : FuiResultCache or None, optional
+        Memoization cache of fitted models, keyed on a fingerprint of the
+        data, the formula, every other argument and the fastFMM version.
+        On a hit the cached model is returned without passing the data to
+        R or refitting. Default is None (always fit).
+    return_fields : sequence of str or None, optional
+        Names of the result fields to keep, e.g. ["betaHat", "qn"]. The
+        result list is subset in R before anything reaches Python, and
+        requested fields that the fit did not produce are omitted.
+        Default is None (keep every field).
+    float32 : bool, optional
+        Whether to convert double fields to float32 when they are read.
+        R has no single-precision type, so this halves Python-side memory
+        rather than R's. Default is False.
+    betaHat_var_path : Path, str or None, optional
+        `.npy` file to move `betaHat_var` (L x L x p) into as soon as the
+        fit returns; see `FuiResult.spill`. The field is then memory-mapped
+        from this file, so it is not held in memory by R or Python.
+        Default is None (keep it in R).
+    progress : callable or None, optional
+        Called with a `progress.ProgressEvent` for each step, bootstrap
+        iteration or other line fastFMM prints to R's console during the
+        fit; the output is captured instead of printed. Needs
+        `silent=False`. Default is None (leave the console alone).
+    schema : IngestSchema, optional
+        Column typing rules applied when `csv_filepath` is a path; part of
+        the `result_cache` key. Default is `DEFAULT_SCHEMA`.
+
     Returns
     -------
-    mod : object
-        The fitted fastFMM model.
+    mod : FuiResult
+        The fitted fastFMM model. Fields are converted with `import_rules`
+        the first time they are read, so unused large outputs such as
+        `betaHat_var` never leave R. `mod.spans` holds the timing and
+        memory `instrument.Span` of each stage, and of each field's
+        conversion once it is read. `mod.metadata` records the formula,
+        arguments, fastFMM version and data fingerprint, and `mod.save`
+        writes the fit to a directory that `FuiResult.load` reads back
+        without R.
 
     Raises
     ------
     AssertionError
         If `csv_filepath` is None and `r_var_name` is not provided.
     ValueError
-        If `csv_filepath` is not None and `r_var_name` is not provided.
+        If `csv_filepath` is not None and `r_var_name` is not provided, if
+        `outcome` is given without a covariate DataFrame, or if
+        `result_cache` is given with other `import_rules` than
+        `local_rules`.
     """
-    if csv_filepath is None:
-        assert r_var_name is not None, (
-            "r_var_name must be provided if csv_filepath is None"
-        )
-    elif r_var_name is not None:
-        read_csv_in_pandas_pass_to_r(
-            csv_filepath=csv_filepath, r_var_name=r_var_name
-        )
-    else:
-        raise ValueError("r_var_name must be provided if csv_filepath is None")
-    # Import R packages locally to avoid conversion context issues
-    base = importr("base")
-    stats = importr("stats")
-    fastFMM = importr("fastFMM")
+    if outcome is not None and not isinstance(csv_filepath, pd.DataFrame):
+        raise ValueError("outcome requires a covariate DataFrame")
+    if result_cache is not None and import_rules is not local_rules:
+        # converters have no stable identity to key on, and cached results
+        # unpickle with local_rules anyway
+        raise ValueError("result_cache requires the default import_rules")
+    if isinstance(return_fields, str):
+        return_fields = [return_fields]
+    fui_kwargs = dict(
+        parallel=parallel,
+        family=family,
+        analytic=analytic,
+        var=var,
+        silent=silent,
+        argvals=argvals,
+        nknots_min=nknots_min,
+        nknots_min_cov=nknots_min_cov,
+        smooth_method=smooth_method,
+        splines=splines,
+        design_mat=design_mat,
+        residuals=residuals,
+        n_boots=n_boots,
+        seed=seed,
+        subj_id=subj_id,
+        n_cores=n_cores,
+        caic=caic,
+        randeffs=randeffs,
+        non_neg=non_neg,
+        MoM=MoM,
+        concurrent=concurrent,
+        impute_outcome=impute_outcome,
+        override_zero_var=override_zero_var,
+        unsmooth=unsmooth,
+    )
+    with collect_spans() as spans, span("fui", formula=formula):
+        # JSON-serializable record of the fit, used as the cache key and
+        # stored with the result so that saved fits document themselves
+        arguments = {
+            **{k: None if v is NULL else v for k, v in fui_kwargs.items()},
+            "import_rules": getattr(import_rules, "name", None),
+            "schema": schema.options(),
+            "return_fields": (
+                None if return_fields is None else sorted(return_fields)
+            ),
+            "float32": float32,
+            "betaHat_var_path": (
+                None if betaHat_var_path is None else str(betaHat_var_path)
+            ),
+        }
 
-    if argvals is not NULL:
-        argvals = IntVector(argvals)
-    with localconverter(import_rules):
-        mod = fastFMM.fui(
-            formula=stats.as_formula(formula),
-            data=base.as_symbol(r_var_name),
-            parallel=parallel,
-            family=family,
-            analytic=analytic,
-            var=var,
-            silent=silent,
-            argvals=argvals,
-            nknots_min=nknots_min,
-            nknots_min_cov=nknots_min_cov,
-            smooth_method=smooth_method,
-            splines=splines,
-            design_mat=design_mat,
-            residuals=residuals,
-            n_boots=n_boots,
-            seed=seed,
-            subj_id=subj_id,
-            n_cores=n_cores,
-            caic=caic,
-            randeffs=randeffs,
-            non_neg=non_neg,
-            MoM=MoM,
-            concurrent=concurrent,
-            impute_outcome=impute_outcome,
-            override_zero_var=override_zero_var,
-            unsmooth=unsmooth,
+        if csv_filepath is None:
+            assert r_var_name is not None, (
+                "r_var_name must be provided if csv_filepath is None"
+            )
+        # the data are hashed now, while they are the data being fitted;
+        # only the digest is kept
+        with span("fui.fingerprint"):
+            fingerprint = data_fingerprint(csv_filepath, outcome, r_var_name)
+
+        def describe() -> dict:
+            return {
+                "formula": formula,
+                "fui_kwargs": arguments,
+                "fastFMM": str(get_fastfmm_version()),
+                "data_fingerprint": fingerprint,
+            }
+
+        # asking R for the fastFMM version is a round trip, so without a
+        # cache it waits until the metadata is read, e.g. by `save`
+        metadata = describe
+        if result_cache is not None:
+            metadata = describe()
+            cache_key = result_cache.key(
+                fingerprint,
+                formula,
+                arguments,
+                metadata["fastFMM"],
+            )
+            with span("fui.cache_get"):
+                cached = result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        with span("fui.ingest"):
+            if csv_filepath is not None:
+                pass_data_to_r(
+                    csv_filepath,
+                    outcome_name(formula),
+                    outcome=outcome,
+                    r_var_name=r_var_name,
+                    ingest_cache=ingest_cache,
+                    schema=schema,
+                )
+        r_mod = _run_fastfmm(formula, r_var_name, fui_kwargs, progress)
+        if return_fields is not None:
+            with span("fui.select_fields"):
+                r_mod = select_fields(r_mod, return_fields)
+        mod = FuiResult(
+            r_mod, import_rules, float32=float32, metadata=metadata
         )
+        if betaHat_var_path is not None and "betaHat_var" in mod:
+            with span("fui.spill"):
+                mod.spill("betaHat_var", betaHat_var_path)
+    # conversions of fields read later are appended as they happen
+    mod.spans.extend(spans)
+    if result_cache is not None:
+        result_cache.put(cache_key, mod)
     return mod
+
+
+# arguments of `fui` that are passed on to fastFMM::fui
+FASTFMM_ARGS = (
+    "parallel",
+    "family",
+    "analytic",
+    "var",
+    "silent",
+    "argvals",
+    "nknots_min",
+    "nknots_min_cov",
+    "smooth_method",
+    "splines",
+    "design_mat",
+    "residuals",
+    "n_boots",
+    "seed",
+    "subj_id",
+    "n_cores",
+    "caic",
+    "randeffs",
+    "non_neg",
+    "MoM",
+    "concurrent",
+    "impute_outcome",
+    "override_zero_var",
+    "unsmooth",
+)
+
+
+def fit_r_data(
+    formula: str,
+    r_var_name: str = "py_dat",
+    import_rules=local_rules,
+    return_fields: Sequence[str] | None = None,
+    float32: bool = False,
+    progress: Callable[[ProgressEvent], None] | None = None,
+    **fastfmm_kwargs,
+) -> FuiResult:
+    """
+    Fit data already assigned in R, without `fui`'s bookkeeping.
+
+    For loops that refit data they passed to R once, e.g. formula sweeps
+    and bootstrap replicates: no data fingerprint, metadata, cache or
+    spans, only the fit itself.
+
+    Parameters
+    ----------
+    formula : str
+        The formula to be used in the fastFMM model.
+    r_var_name : str, optional
+        R variable holding the data. Default is "py_dat".
+    import_rules, return_fields, float32, progress
+        As in `fui`.
+    **fastfmm_kwargs
+        fastFMM arguments of `fui` (`FASTFMM_ARGS`), with `fui`'s defaults
+        for those not given.
+
+    Returns
+    -------
+    FuiResult
+        The fitted model, with empty `metadata` and `spans`.
+
+    Raises
+    ------
+    TypeError
+        If an argument is not one of `FASTFMM_ARGS`.
+    """
+    unknown = set(fastfmm_kwargs) - set(FASTFMM_ARGS)
+    if unknown:
+        raise TypeError(f"unexpected fui arguments {sorted(unknown)}")
+    defaults = inspect.signature(fui).parameters
+    fui_kwargs = {
+        name: fastfmm_kwargs.get(name, defaults[name].default)
+        for name in FASTFMM_ARGS
+    }
+    r_mod = _run_fastfmm(
+        formula, r_var_name, fui_kwargs, progress, instrument=False
+    )
+    if return_fields is not None:
+        if isinstance(return_fields, str):
+            return_fields = [return_fields]
+        r_mod = select_fields(r_mod, return_fields)
+    return FuiResult(r_mod, import_rules, float32=float32)
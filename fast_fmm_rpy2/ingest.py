@@ -1,11 +1,30 @@
+import glob
+import multiprocessing
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
 import pandas as pd
-import rpy2.rinterface as rinterface  # type: ignore
-from rpy2 import robjects as ro
-from rpy2.robjects import pandas2ri  # type: ignore
-from rpy2.robjects.conversion import localconverter  # type: ignore
+
+from fast_fmm_rpy2.cache import IngestCache
+from fast_fmm_rpy2.instrument import span
+from fast_fmm_rpy2.schema import (
+    DEFAULT_SCHEMA,
+    IngestSchema,
+    apply_schema,
+    read_csv_typed,
+    read_csv_with_schema,
+)
+from fast_fmm_rpy2.sidecar import load_outcome_sidecar
+
+if TYPE_CHECKING:
+    import rpy2.rinterface as rinterface  # type: ignore
+    from rpy2 import robjects as ro
+
+# rpy2 starts an embedded R on import, so it is only imported inside the
+# functions that talk to R; the pandas-only helpers stay R-free
 
 
 def pandas_read_in_csv_roundtrip(filepath: Path) -> pd.DataFrame:
@@ -28,85 +47,433 @@ def pandas_read_in_csv_legacy(filepath: Path) -> pd.DataFrame:
     return df
 
 
-def r_read_in_csv_rpy2_convert(filepath: Path) -> ro.vectors.DataFrame:
+def r_read_in_csv_rpy2_convert(filepath: Path) -> "ro.vectors.DataFrame":
+    from rpy2 import robjects as ro
+
     ro.r(f'dat = read.csv("{str(filepath.absolute().as_posix())}")')
     dat = ro.r("dat")
     return dat
 
 
-def compare_df_dat(df: pd.DataFrame, dat: ro.vectors.DataFrame):
-    photometry_idx = [
-        int(col_name.split(".")[-1])
-        for col_name in df.columns
-        if col_name.startswith("photometry.")
-    ]
-    results: list[dict] = []
-    for col in photometry_idx:
-        for row in range(len(df)):
-            # adjust index for R dat
-            row_j = row + 1
-            dat_array = np.asarray(dat.rx(f"{row_j}", f"photometry.{col}"))
-            result = np.isclose(
-                dat_array[0],
-                df[f"photometry.{col}"][row],
-                rtol=1e-05,
-                atol=1e-08,
-            )
-            result_dict = {
-                "float_isclose": result,
-                "column": f"photometry.{col}",
-                "df_row": row,
-                "dat_row": row_j,
-                "dat_value_string": f"{dat_array[0]:.55f}",
-                "df_value_string": f"{df[f'photometry.{col}'][row]:.55f}",
-            }
-            results.append(result_dict)
-    result_df = pd.DataFrame(results)
-    return result_df
+def compare_df_dat(
+    df: pd.DataFrame, dat: "ro.vectors.DataFrame"
+) -> pd.DataFrame:
+    """
+    Compare every photometry cell parsed by pandas with R's `read.csv`.
 
+    The photometry columns of `dat` are copied to Python in a single
+    conversion and compared in one vectorized `np.isclose`. For a report
+    of only the mismatching cells, use `audit.audit_df_dat`.
 
-def read_csv_in_pandas_pass_to_r(
-    csv_filepath: Path, r_var_name: str = "py_dat"
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame read by pandas.
+    dat : ro.vectors.DataFrame
+        The same CSV read by R.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per cell, column by column, with `float_isclose`, the
+        `column` name, the 0-based `df_row`, the 1-based `dat_row` and
+        both values formatted to 55 decimals.
+    """
+    from fast_fmm_rpy2.audit import outcome_columns, r_numeric_matrix
+
+    columns = outcome_columns(df, "photometry")
+    df_values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    dat_values = r_numeric_matrix(dat, columns)
+    n_rows = len(df)
+    # ravel column by column to keep the row order of the per-cell loop
+    df_flat = df_values.ravel(order="F")
+    dat_flat = dat_values.ravel(order="F")
+    return pd.DataFrame(
+        {
+            "float_isclose": np.isclose(
+                dat_flat, df_flat, rtol=1e-05, atol=1e-08
+            ),
+            "column": np.repeat(columns, n_rows),
+            "df_row": np.tile(np.arange(n_rows), len(columns)),
+            "dat_row": np.tile(np.arange(1, n_rows + 1), len(columns)),
+            "dat_value_string": np.char.mod("%.55f", dat_flat),
+            "df_value_string": np.char.mod("%.55f", df_flat),
+        }
+    )
+
+
+def read_csv_cached(
+    csv_filepath: Path,
+    cache: IngestCache | bool | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
 ) -> pd.DataFrame:
-    # read in data using round_trip float precision to mimic R precision
-    df = pd.read_csv(csv_filepath, float_precision="round_trip")
+    """
+    Read and normalize a CSV for R, reusing a cached copy when possible.
 
-    # R uses NA_integer_, so Pandas DataFrames MUST use pd.NA and NOT np.nan
-    # for NA representation
-    df["trial"] = df["trial"].fillna(-1).astype("int")
-    df["trial"] = df["trial"].apply(lambda x: pd.NA if x < 1 else x)
-    # change index of df to match 1 to len(df) + 1 index in R
-    df.index = range(1, len(df) + 1)  # type: ignore
+    Parameters
+    ----------
+    csv_filepath : Path
+        The file path to the CSV file containing the data.
+    cache : IngestCache, bool or None, optional
+        Cache of normalized frames. True uses an `IngestCache` in the
+        default location; None or False always parses the CSV.
+        Default is None.
+    schema : IngestSchema, optional
+        Column typing rules. The default makes `trial`, when present, a
+        nullable integer with values below 1 set to NA.
+
+    Returns
+    -------
+    pd.DataFrame
+        Frame normalized by `schema` with a 1-based index.
+    """
+    if cache is None or cache is False:
+        with span("ingest.read_csv", cache=None):
+            return read_csv_with_schema(csv_filepath, schema)
+    if cache is True:
+        cache = IngestCache()
+    key = cache.key(csv_filepath, **schema.options())
+    with span("ingest.cache_get"):
+        df = cache.get(key)
+    if df is None:
+        with span("ingest.read_csv", cache="miss"):
+            df = read_csv_with_schema(csv_filepath, schema)
+        with span("ingest.cache_put"):
+            cache.put(key, df)
+    return df
+
+
+def read_csv_in_pandas_pass_to_r(
+    csv_filepath: Path,
+    r_var_name: str = "py_dat",
+    cache: IngestCache | bool | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+) -> pd.DataFrame:
+    df = read_csv_cached(csv_filepath, cache=cache, schema=schema)
 
     # convert it to an R variable
-    with localconverter(pandas2ri.converter):
-        ro.globalenv[r_var_name] = df
+    pass_pandas_to_r(df, r_var_name=r_var_name)
     return df
 
 
+def read_csv_memmap_pass_to_r(
+    csv_filepath: Path,
+    r_var_name: str = "py_dat",
+    sidecar_dir: Path | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Pass a CSV to R through a memory-mapped outcome sidecar.
+
+    The first call converts the `<outcome_prefix>.1..L` block into a
+    column-major float64 `.npy` (see `build_outcome_sidecar`); later calls
+    map it read-only and copy it into R's matrix with one memmove, without
+    building a pandas copy of the functional data. In R the outcome is a
+    single matrix column named `schema.outcome_prefix`.
+
+    Parameters
+    ----------
+    csv_filepath : Path
+        The file path to the CSV file containing the data.
+    r_var_name : str, optional
+        Name of the R variable to assign. Default is "py_dat".
+    sidecar_dir : Path or None, optional
+        Sidecar directory. Default is `<csv_filepath stem>.fmm` next to the
+        CSV.
+    schema : IngestSchema, optional
+        Column typing rules. Default is `DEFAULT_SCHEMA`.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, np.ndarray]
+        The covariates and the read-only memory-mapped outcome matrix.
+    """
+    with span("ingest.sidecar"):
+        covariates, outcome = load_outcome_sidecar(
+            csv_filepath, sidecar_dir=sidecar_dir, schema=schema
+        )
+    pass_pandas_matrix_to_r(
+        covariates,
+        outcome,
+        outcome_name=schema.outcome_prefix,
+        r_var_name=r_var_name,
+    )
+    return covariates, outcome
+
+
 def read_csv_for_r(
-    csv_filepath: Path, r_var_name: str = "py_dat"
+    csv_filepath: Path,
+    r_var_name: str = "py_dat",
+    cache: IngestCache | bool | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
 ) -> pd.DataFrame:
-    # read in data using round_trip float precision to mimic R precision
-    df = pd.read_csv(csv_filepath, float_precision="round_trip")
+    return read_csv_cached(csv_filepath, cache=cache, schema=schema)
 
-    # R uses NA_integer_, so Pandas DataFrames MUST use pd.NA and NOT np.nan
-    # for NA representation
-    df["trial"] = df["trial"].fillna(-1).astype("int")
-    df["trial"] = df["trial"].apply(lambda x: pd.NA if x < 1 else x)
-    # change index of df to match 1 to len(df) + 1 index in R
-    df.index = range(1, len(df) + 1)  # type: ignore
 
-    return df
+def expand_csv_filepaths(
+    csv_filepaths: str | Path | Sequence[str | Path],
+) -> list[Path]:
+    """
+    Expand a glob pattern or a list of paths into a list of CSV files.
+
+    Parameters
+    ----------
+    csv_filepaths : str, Path or sequence of str or Path
+        A glob pattern such as "sessions/*.csv", a single path, or a list
+        of paths (which may themselves be patterns).
+
+    Returns
+    -------
+    list[Path]
+        Matching files; each pattern's matches are sorted.
+
+    Raises
+    ------
+    FileNotFoundError
+        If nothing matches.
+    """
+    if isinstance(csv_filepaths, (str, Path)):
+        csv_filepaths = [csv_filepaths]
+    paths: list[Path] = []
+    for pattern in csv_filepaths:
+        if glob.has_magic(str(pattern)):
+            paths.extend(Path(p) for p in sorted(glob.glob(str(pattern))))
+        else:
+            paths.append(Path(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No CSV files match {csv_filepaths}")
+    return paths
+
+
+def read_csvs_for_r(
+    csv_filepaths: str | Path | Sequence[str | Path],
+    schema: IngestSchema = DEFAULT_SCHEMA,
+    max_workers: int | None = None,
+    chunksize: int | None = None,
+    source_column: str | None = None,
+    use_processes: bool = False,
+) -> pd.DataFrame:
+    """
+    Read many CSVs with the same layout in parallel into one frame for R.
+
+    Headers are checked for consistency before any data is parsed. Each
+    file is then parsed by `read_csv_typed` in a worker pool; pandas'
+    C parser releases the GIL, so threads already use several cores, and
+    `use_processes=True` switches to a process pool for fully parallel
+    parsing. The per-file frames are concatenated once and normalized with
+    `apply_schema`, giving the same frame `read_csv_for_r` would return
+    for the concatenated file.
+
+    Parameters
+    ----------
+    csv_filepaths : str, Path or sequence of str or Path
+        Glob pattern(s) or paths of the files to read, e.g. one CSV per
+        animal or session.
+    schema : IngestSchema, optional
+        Column typing rules. Default is `DEFAULT_SCHEMA`.
+    max_workers : int or None, optional
+        Size of the worker pool. Default is None (executor default).
+    chunksize : int or None, optional
+        Rows parsed at a time within each file. Default is None.
+    source_column : str or None, optional
+        If given, add a categorical column of this name holding each row's
+        source file name. Default is None.
+    use_processes : bool, optional
+        Parse in a process pool instead of a thread pool.
+        Default is False.
+
+    Returns
+    -------
+    pd.DataFrame
+        The concatenated, normalized frame with a 1-based index, in file
+        order.
+
+    Raises
+    ------
+    ValueError
+        If the files do not all have the same columns.
+    """
+    paths = expand_csv_filepaths(csv_filepaths)
+    columns = list(pd.read_csv(paths[0], nrows=0).columns)
+    mismatched = [
+        str(path)
+        for path in paths[1:]
+        if set(pd.read_csv(path, nrows=0).columns) != set(columns)
+    ]
+    if mismatched:
+        raise ValueError(
+            f"Columns of {mismatched} do not match those of {paths[0]}"
+        )
+
+    if use_processes:
+        executor: ThreadPoolExecutor | ProcessPoolExecutor = (
+            ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    with executor, span("ingest.read_csvs", files=len(paths)):
+        frames = list(
+            executor.map(
+                read_csv_typed,
+                paths,
+                [schema] * len(paths),
+                [chunksize] * len(paths),
+            )
+        )
+
+    # give every file's categoricals the same categories so the
+    # concatenated column stays categorical instead of falling back to object
+    for col in columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals(
+                [frame[col] for frame in frames]
+            ).categories
+            for frame in frames:
+                frame[col] = frame[col].cat.set_categories(categories)
+    frames = [
+        frame if list(frame.columns) == columns else frame[columns]
+        for frame in frames
+    ]
+    if source_column is not None:
+        names = [path.name for path in paths]
+        if len(set(names)) < len(names):
+            names = [str(path) for path in paths]
+        sources = pd.Categorical.from_codes(
+            np.repeat(np.arange(len(paths)), [len(f) for f in frames]),
+            categories=names,
+        )
+    df = pd.concat(frames, ignore_index=True)
+    if source_column is not None:
+        # concat instead of column assignment, which would warn on the
+        # block-per-column frames returned by read_csv
+        df = pd.concat([df, pd.DataFrame({source_column: sources})], axis=1)
+    return apply_schema(df, schema)
 
 
 def pass_pandas_to_r(df: pd.DataFrame, r_var_name: str = "py_dat") -> None:
-    with localconverter(pandas2ri.converter):
+    from rpy2 import robjects as ro
+    from rpy2.robjects import pandas2ri  # type: ignore
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+
+    with span("ingest.pandas_to_r"), localconverter(pandas2ri.converter):
         ro.globalenv[r_var_name] = df
     return None
 
 
+def split_functional_outcome(
+    df: pd.DataFrame, outcome_name: str = "photometry"
+) -> tuple[pd.DataFrame, np.ndarray | None]:
+    """
+    Split the `<outcome_name>.1..L` columns of a wide frame into a matrix.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Wide data frame, e.g. as read from `example_data.csv`.
+    outcome_name : str, optional
+        Prefix of the functional outcome columns. Default is "photometry".
+
+    Returns
+    -------
+    tuple[pd.DataFrame, np.ndarray or None]
+        The covariate columns and the (n, L) float64 outcome matrix, in
+        column order. The matrix is None if no outcome columns were found.
+    """
+    outcome_cols = IngestSchema(outcome_prefix=outcome_name).outcome_columns(
+        df.columns
+    )
+    if not outcome_cols:
+        return df, None
+    outcome = df[outcome_cols].to_numpy(dtype=np.float64)
+    return df.drop(columns=outcome_cols), outcome
+
+
+def numpy_to_r_matrix(arr: np.ndarray) -> "rinterface.FloatSexpVector":
+    """
+    Copy a 2-D array into a numeric R matrix with a single memmove.
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        Array of shape (n, L). Fortran-ordered float64 input is copied
+        straight into R memory; anything else is first laid out
+        column-major.
+
+    Returns
+    -------
+    rinterface.FloatSexpVector
+        R numeric vector with its `dim` attribute set to `arr.shape`.
+    """
+    import rpy2.rinterface as rinterface  # type: ignore
+
+    arr = np.asarray(arr, dtype=np.float64)
+    if arr.ndim != 2:
+        raise ValueError(f"Expected a 2-D array, got {arr.ndim} dimensions")
+    # R stores matrices column-major, so a Fortran-ordered array is already
+    # in R's layout and ravel does not copy
+    flat = arr.ravel(order="F")
+    mat = rinterface.FloatSexpVector.from_memoryview(memoryview(flat))
+    mat.do_slot_assign("dim", rinterface.IntSexpVector(arr.shape))
+    return mat
+
+
+def pass_pandas_matrix_to_r(
+    covariates: pd.DataFrame,
+    outcome: np.ndarray,
+    outcome_name: str = "photometry",
+    r_var_name: str = "py_dat",
+) -> None:
+    """
+    Assign a covariate frame plus one matrix outcome column in R.
+
+    The outcome is stored as a single numeric matrix column named
+    `outcome_name`, the layout fastFMM uses for its `lick` dataset, instead
+    of L separate `<outcome_name>.N` vectors.
+
+    Parameters
+    ----------
+    covariates : pd.DataFrame
+        Covariate columns, one row per functional observation.
+    outcome : np.ndarray
+        Functional outcome of shape (len(covariates), L).
+    outcome_name : str, optional
+        Name of the matrix column in R. Default is "photometry".
+    r_var_name : str, optional
+        Name of the R variable to assign. Default is "py_dat".
+
+    Raises
+    ------
+    ValueError
+        If `outcome` is not 2-D or its row count does not match
+        `covariates`.
+    """
+    from rpy2 import robjects as ro
+    from rpy2.robjects import pandas2ri  # type: ignore
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+
+    if outcome.ndim != 2 or outcome.shape[0] != len(covariates):
+        raise ValueError(
+            f"outcome must have shape ({len(covariates)}, L), "
+            + f"got {outcome.shape}"
+        )
+    with span("ingest.pandas_matrix_to_r"):
+        with localconverter(ro.default_converter + pandas2ri.converter):
+            r_df = ro.conversion.get_conversion().py2rpy(covariates)
+        add_matrix_column = ro.r("function(df, m, nm) { df[[nm]] <- m; df }")
+        with localconverter(ro.default_converter):
+            ro.globalenv[r_var_name] = add_matrix_column(
+                r_df, numpy_to_r_matrix(outcome), outcome_name
+            )
+    return None
+
+
 def compare_df_dat_in_r(csv_filepath: Path) -> bool:
+    from rpy2 import robjects as ro
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+
     with localconverter(ro.default_converter):
         ro.r(f'dat = read.csv("{str(csv_filepath.absolute().as_posix())}")')
     read_csv_in_pandas_pass_to_r(csv_filepath=csv_filepath)
@@ -125,25 +492,7 @@ def compare_df_dat_in_r(csv_filepath: Path) -> bool:
     return compare_result
 
 
-def mod_rules() -> ro.conversion.Converter:
-    rules = ro.default_converter + pandas2ri.converter
-
-    @rules.rpy2py.register(rinterface.FloatSexpVector)
-    def rpy2py_floatvector(obj):
-        x = np.array(obj)
-        try:
-            # if names is assigned, convert to pandas series
-            return pd.Series(x, obj.names)
-        except Exception:
-            # if dimnames assigned, it's a named matrix,
-            # convert to pandas dataframe
-            try:
-                rownames, colnames = obj.do_slot("dimnames")
-                x = pd.DataFrame(x, index=rownames, columns=colnames)
-            finally:
-                # plain vector/matrix
-                return x
-
-    # dummy call to prevent pylance error
-    _ = rpy2py_floatvector
-    return rules
+def mod_rules() -> "ro.conversion.Converter":
+    from fast_fmm_rpy2.convert import make_rules
+
+    return make_rules()
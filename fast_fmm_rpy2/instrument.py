@@ -0,0 +1,216 @@
+"""
+Named timing and memory spans around the stages of a fit.
+
+`fmm_run.fui` and the ingest functions wrap each stage (CSV parsing,
+pandas to R transfer, the R fit, R to Python conversion) in a `span`. A
+finished span records its wall and CPU time, the process RSS and, once R
+is running, R's heap as reported by `gc()`. Spans are handed to every hook
+registered with `add_hook` and collected by any enclosing `collect_spans`,
+which is how `fui` attaches them to its result as `mod.spans`.
+"""
+
+import os
+import sys
+import time
+import warnings
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass(frozen=True)
+class Span:
+    """
+    Measurements of one finished stage.
+
+    Parameters
+    ----------
+    name : str
+        Stage name, e.g. "fui.fit" or "ingest.read_csv".
+    parent : str or None
+        Name of the enclosing span, if any.
+    wall_s : float
+        Elapsed wall-clock time in seconds.
+    cpu_s : float
+        CPU time of this process in seconds; R runs in-process, so this
+        includes the fit but not fastFMM's forked workers.
+    rss_bytes : int or None
+        Resident set size of the process at the end of the stage, or None
+        where it cannot be read.
+    rss_delta_bytes : int or None
+        Change in RSS over the stage.
+    r_heap_bytes : int or None
+        Memory used by R's heap at the end of the stage, to 0.1 MB, or
+        None if R was not measured.
+    r_heap_delta_bytes : int or None
+        Change in R's heap over the stage.
+    attrs : dict
+        Extra labels given to `span`, e.g. the converted field.
+    """
+
+    name: str
+    parent: str | None
+    wall_s: float
+    cpu_s: float
+    rss_bytes: int | None
+    rss_delta_bytes: int | None
+    r_heap_bytes: int | None
+    r_heap_delta_bytes: int | None
+    attrs: dict = field(default_factory=dict)
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the span, for metrics.
+
+        Returns
+        -------
+        dict
+            Every field of the span.
+        """
+        return asdict(self)
+
+
+_hooks: list[Callable[[Span], None]] = []
+_collectors: ContextVar[tuple[list, ...]] = ContextVar(
+    "fast_fmm_rpy2_collectors", default=()
+)
+_open_spans: ContextVar[tuple[str, ...]] = ContextVar(
+    "fast_fmm_rpy2_open_spans", default=()
+)
+
+
+def add_hook(hook: Callable[[Span], None]) -> Callable[[Span], None]:
+    """
+    Call `hook(span)` for every span finished from now on, in any thread.
+
+    Parameters
+    ----------
+    hook : callable
+        Receives each finished `Span`. Exceptions it raises are turned
+        into warnings so that a failing metrics backend cannot break a
+        fit.
+
+    Returns
+    -------
+    callable
+        `hook`, so that this can be used as a decorator.
+    """
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: Callable[[Span], None]) -> None:
+    """
+    Stop calling a hook registered with `add_hook`.
+
+    Parameters
+    ----------
+    hook : callable
+        The registered hook; unknown hooks are ignored.
+    """
+    if hook in _hooks:
+        _hooks.remove(hook)
+    return None
+
+
+@contextmanager
+def collect_spans() -> Iterator[list[Span]]:
+    """
+    Collect the spans finished inside a `with` block, in finishing order.
+
+    Yields
+    ------
+    list[Span]
+        Filled as spans finish; nested collectors each get every span.
+    """
+    spans: list[Span] = []
+    token = _collectors.set((*_collectors.get(), spans))
+    try:
+        yield spans
+    finally:
+        _collectors.reset(token)
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak rather than current RSS outside Linux; kB on Linux, bytes on
+    # macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _r_heap_bytes() -> int | None:
+    # only measure R once something else has started it
+    if "rpy2.robjects" not in sys.modules:
+        return None
+    from rpy2 import robjects as ro  # type: ignore
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+
+    with localconverter(ro.default_converter):
+        used_mb = ro.r("sum(gc(full = FALSE)[, 2])")[0]
+    return int(used_mb * 2**20)
+
+
+def _delta(end: int | None, start: int | None) -> int | None:
+    return None if end is None or start is None else end - start
+
+
+@contextmanager
+def span(name: str, r_heap: bool = True, **attrs) -> Iterator[None]:
+    """
+    Measure a stage and report it to the hooks and collectors.
+
+    The span is reported even if the block raises.
+
+    Parameters
+    ----------
+    name : str
+        Stage name.
+    r_heap : bool, optional
+        Whether to measure R's heap, which runs a minor R garbage
+        collection at both ends of the span. It is never measured before
+        R has been started. Default is True.
+    **attrs
+        JSON-serializable labels stored in `Span.attrs`.
+    """
+    parents = _open_spans.get()
+    token = _open_spans.set((*parents, name))
+    rss_start = _rss_bytes()
+    heap_start = _r_heap_bytes() if r_heap else None
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall_s = time.perf_counter() - wall_start
+        cpu_s = time.process_time() - cpu_start
+        _open_spans.reset(token)
+        rss_end = _rss_bytes()
+        heap_end = _r_heap_bytes() if r_heap else None
+        finished = Span(
+            name=name,
+            parent=parents[-1] if parents else None,
+            wall_s=wall_s,
+            cpu_s=cpu_s,
+            rss_bytes=rss_end,
+            rss_delta_bytes=_delta(rss_end, rss_start),
+            r_heap_bytes=heap_end,
+            r_heap_delta_bytes=_delta(heap_end, heap_start),
+            attrs=attrs,
+        )
+        for spans in _collectors.get():
+            spans.append(finished)
+        for hook in list(_hooks):
+            try:
+                hook(finished)
+            except Exception as e:
+                warnings.warn(f"span hook {hook!r} failed: {e!r}")
@@ -1,19 +1,153 @@
+import warnings
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import rpy2.rinterface as rinterface  # type: ignore
-from matplotlib.gridspec import GridSpec
-from rpy2 import robjects as ro  # type: ignore
-from rpy2.rinterface_lib.sexp import NULLType  # type: ignore
-from rpy2.rlike.container import NamedList  # type: ignore
-from rpy2.robjects import pandas2ri  # type: ignore
-from rpy2.robjects.conversion import localconverter  # type: ignore
-from rpy2.robjects.packages import importr  # type: ignore
 
 from fast_fmm_rpy2.ingest import read_csv_in_pandas_pass_to_r
 
+if TYPE_CHECKING:
+    from rpy2.rlike.container import NamedList  # type: ignore
+
+# matplotlib and rpy2 are imported on first use so that plotting saved
+# results, or importing this module at all, does not start R
+
+
+def _has_field(fuiobj, name: str) -> bool:
+    if name not in fuiobj.names():
+        return False
+    value = fuiobj.getbyname(name)
+    # NULL is None in FuiResult.to_dict and saved results, but stays R's
+    # NULL in a NamedList; compare by name so rpy2 is not imported
+    return value is not None and type(value).__name__ != "NULLType"
+
+
+def compute_plot_data(fuiobj, long: bool = False):
+    """
+    Compute estimates and confidence bands of every coefficient at once.
+
+    Each field is read once and the bands of all coefficients are computed
+    as (num_vars, num_points) arrays; only the diagonals of `betaHat_var`
+    are read, which for memory-mapped results means only they are loaded.
+    matplotlib is not needed.
+
+    Parameters
+    ----------
+    fuiobj : FuiResult or rpy2.rlike.container.NamedList
+        Functional univariate inference object returned from fastFMM.fui,
+        with `betaHat` and `argvals` and, for the bands, `betaHat_var` and
+        `qn`. See `plot_fui`.
+    long : bool, optional
+        Whether to return one long-form frame instead of one frame per
+        coefficient. Default is False.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame] or pd.DataFrame
+        Per coefficient, a frame with columns `s` (the domain points) and
+        `beta` and, if the fit has variances, `lower` and `upper` (the
+        pointwise 95% band, beta -/+ 2 se) and `lower_joint` and
+        `upper_joint` (the joint band, beta -/+ qn se). With `long`, the
+        frames are stacked with a leading `coefficient` column.
+    """
+    beta_hat = fuiobj.getbyname("betaHat")
+    if isinstance(beta_hat, pd.DataFrame):
+        var_names = beta_hat.index.to_list()
+        index = beta_hat.columns
+    else:
+        var_names = [f"Variable {i}" for i in range(len(beta_hat))]
+        index = None
+    beta = np.asarray(beta_hat, dtype=np.float64)
+    columns = {"beta": beta}
+    if _has_field(fuiobj, "betaHat_var"):
+        se = np.sqrt(
+            np.diagonal(fuiobj.getbyname("betaHat_var"), axis1=0, axis2=1)
+        )
+        qn = np.asarray(fuiobj.getbyname("qn"), dtype=np.float64)
+        columns["lower"] = beta - 2 * se
+        columns["upper"] = beta + 2 * se
+        columns["lower_joint"] = beta - qn.reshape(-1, 1) * se
+        columns["upper_joint"] = beta + qn.reshape(-1, 1) * se
+    s = np.asarray(fuiobj.getbyname("argvals"))
+    if long:
+        num_points = beta.shape[1]
+        return pd.DataFrame(
+            {
+                "coefficient": np.repeat(var_names, num_points),
+                "s": np.tile(s, len(var_names)),
+                **{name: band.ravel() for name, band in columns.items()},
+            }
+        )
+    return {
+        var_name: pd.DataFrame(
+            {"s": s, **{name: band[r] for name, band in columns.items()}},
+            index=index,
+        )
+        for r, var_name in enumerate(var_names)
+    }
+
+
+def downsample_plot_data(
+    frame: pd.DataFrame, max_points: int | None
+) -> pd.DataFrame:
+    """
+    Thin one coefficient's plot data with a min/max envelope.
+
+    The domain is split into equal bins of consecutive points. Each bin
+    keeps its first point and, for every curve (`beta` and the bands), the
+    points where that curve is smallest and largest in the bin; the last
+    point of the domain is kept too. Peaks and troughs are therefore kept
+    exactly, and so are the extrema that set the y limits. The number of
+    bins is the largest for which the result cannot exceed `max_points`
+    rows, i.e. about `max_points / (1 + 2 * curves)`.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        One frame returned by `compute_plot_data`.
+    max_points : int or None
+        Most rows to keep; a few times the width of the plot in pixels is
+        enough. None disables downsampling.
+
+    Returns
+    -------
+    pd.DataFrame
+        A subset of at most `max_points` rows of `frame`, in order;
+        `frame` itself if it has no more than `max_points` rows.
+
+    Raises
+    ------
+    ValueError
+        If `max_points` is too small for a single bin, i.e. less than
+        `2 + 2 * curves`.
+    """
+    n = len(frame)
+    if max_points is None or n <= max_points:
+        return frame
+    curves = frame.columns.drop("s", errors="ignore")
+    per_bin = 1 + 2 * len(curves)
+    # the last point of the domain is kept on top of the bins' points
+    num_bins = (max_points - 1) // per_bin
+    if num_bins < 1:
+        raise ValueError(
+            f"max_points must be at least {per_bin + 1} to thin "
+            + f"{len(curves)} curves, got {max_points}"
+        )
+    bin_size = -(-n // num_bins)
+    num_bins = -(-n // bin_size)
+    offsets = np.arange(num_bins) * bin_size
+    keep = [offsets, [n - 1]]
+    for name in curves:
+        values = frame[name].to_numpy(dtype=np.float64)
+        # pad the last bin and treat NaN as never extreme
+        for fill, pick in ((np.inf, np.argmin), (-np.inf, np.argmax)):
+            padded = np.full(num_bins * bin_size, fill)
+            padded[:n] = np.where(np.isnan(values), fill, values)
+            keep.append(offsets + pick(padded.reshape(num_bins, -1), axis=1))
+    rows = np.unique(np.concatenate(keep))
+    return frame.iloc[rows[rows < n]]
+
 
 def plot_fui(
     fuiobj,
@@ -26,13 +160,17 @@ def plot_fui(
     y_val_lim=1.1,
     y_scal_orig=0.05,
     return_data=False,
+    max_points=None,
 ):
     """
     Plot fixed effects from a functional univariate inference object.
 
+    The data are computed by `compute_plot_data`; use it directly when
+    only the bands are needed.
+
     Parameters
     ----------
-    fuiobj : rpy2.rlike.container.NamedList
+    fuiobj : FuiResult or rpy2.rlike.container.NamedList
         Functional univariate inference object returned from fastFMM.fui.
         Contains the following names:
             betaHat : numpy.ndarray
@@ -64,94 +202,111 @@ def plot_fui(
         Factor to adjust bottom y-axis limit.
     return_data : bool, optional
         Whether to return the plotting data.
+    max_points : int or None, optional
+        Most points drawn per coefficient for long functional domains:
+        curves are thinned by `downsample_plot_data` to a min/max envelope
+        of at most this many points before drawing. The returned data are
+        not thinned. Default is None (draw every point).
 
     Returns
     -------
     matplotlib.figure.Figure or tuple
         If return_data is False, returns the figure.
-        If return_data is True, returns (figure, list of dataframes).
+        If return_data is True, returns (figure, dict of dataframes).
     """
-    # number of variables to plot
-    num_var = fuiobj.getbyname("betaHat").shape[0]
-    var_names = fuiobj.getbyname("betaHat").index.to_list()
-    res_list = []
+    plot_data = compute_plot_data(fuiobj)
+    num_row, num_col = _grid_shape(len(plot_data), num_row)
+    title_names = _check_titles(list(plot_data), title_names)
+
+    import matplotlib.pyplot as plt
+
+    # Create figure and subplots
+    fig = plt.figure(figsize=(5, 4 * num_row))
+    axes = _add_axes(fig, len(plot_data), num_row, num_col)
+    draw_plot_data(
+        axes,
+        plot_data,
+        xlab=xlab,
+        title_names=title_names,
+        ylim=ylim,
+        align_x=align_x,
+        x_rescale=x_rescale,
+        y_val_lim=y_val_lim,
+        y_scal_orig=y_scal_orig,
+        max_points=max_points,
+    )
+    fig.tight_layout()
+
+    if return_data:
+        return fig, plot_data
+    return fig
+
+
+def _grid_shape(num_var: int, num_row: int | None) -> tuple[int, int]:
     if num_row is None:
         num_row = int(np.ceil(num_var / 2))
-    num_col = int(np.ceil(num_var / num_row))
+    return num_row, int(np.ceil(num_var / num_row))
 
-    align = 0 if align_x is None else align_x * x_rescale
 
+def _check_titles(var_names: list, title_names) -> list:
     if title_names is None:
-        try:
-            title_names = fuiobj.getbyname("betaHat").index.to_list()
-        except KeyError:
-            title_names = [f"Variable {i}" for i in range(num_var)]
-
-    # sanity check the number of rows with number of varibles
-    if not len(fuiobj.getbyname("betaHat")) == len(title_names):
-        Warning(
+        return var_names
+    if len(title_names) != len(var_names):
+        warnings.warn(
             "Incorrect number of title_names detected,"
             + " replacing title names in plots"
         )
-        try:
-            title_names = fuiobj.getbyname("betaHat").index.to_list()
-        except KeyError:
-            title_names = [f"Variable {i}" for i in range(num_var)]
+        return var_names
+    return list(title_names)
 
-    # Create figure and subplots
-    fig = plt.figure(figsize=(5, 4 * num_row))
-    gs = GridSpec(num_row, num_col, figure=fig)
 
-    res_list = []
+def _add_axes(fig, num_var: int, num_row: int, num_col: int) -> list:
+    from matplotlib.gridspec import GridSpec
 
-    for r in range(num_var):
-        row = r // num_col
-        col = r % num_col
-        ax = fig.add_subplot(gs[row, col])
+    gs = GridSpec(num_row, num_col, figure=fig)
+    return [
+        fig.add_subplot(gs[r // num_col, r % num_col]) for r in range(num_var)
+    ]
 
-        # Create plotting dataframe
-        if "betaHat_var" not in fuiobj.names():
-            beta_hat_plt = pd.DataFrame(
-                {
-                    "s": fuiobj.getbyname("argvals"),
-                    "beta": fuiobj.getbyname("betaHat").iloc[r, :],
-                }
-            )
 
-            # Plot estimate
-            ax.plot(
-                beta_hat_plt["s"] / x_rescale
-                - align / x_rescale
-                - 1 / x_rescale,
-                beta_hat_plt["beta"],
-                color="black",
-                label="Estimate",
-                linewidth=1,
-            )
+def draw_plot_data(
+    axes,
+    plot_data: dict,
+    xlab="Functional Domain",
+    title_names=None,
+    ylim=None,
+    align_x=None,
+    x_rescale=1,
+    y_val_lim=1.1,
+    y_scal_orig=0.05,
+    max_points=None,
+) -> None:
+    """
+    Draw the output of `compute_plot_data` onto existing axes.
 
-        else:
-            var_diag = np.diag(fuiobj.getbyname("betaHat_var")[:, :, r])
-            beta_hat_plt = pd.DataFrame(
-                {
-                    "s": fuiobj.getbyname("argvals"),
-                    "beta": fuiobj.getbyname("betaHat").iloc[r, :],
-                    "lower": fuiobj.getbyname("betaHat").iloc[r, :]
-                    - 2 * np.sqrt(var_diag),
-                    "upper": fuiobj.getbyname("betaHat").iloc[r, :]
-                    + 2 * np.sqrt(var_diag),
-                    "lower_joint": fuiobj.getbyname("betaHat").iloc[r, :]
-                    - fuiobj.getbyname("qn")[r] * np.sqrt(var_diag),
-                    "upper_joint": fuiobj.getbyname("betaHat").iloc[r, :]
-                    + fuiobj.getbyname("qn")[r] * np.sqrt(var_diag),
-                }
-            )
+    Parameters
+    ----------
+    axes : sequence of matplotlib.axes.Axes
+        One empty axes per coefficient.
+    plot_data : dict[str, pd.DataFrame]
+        Per-coefficient frames returned by `compute_plot_data`.
+    xlab, title_names, ylim, align_x, x_rescale, y_val_lim, y_scal_orig
+        As in `plot_fui`.
+    max_points : int or None, optional
+        As in `plot_fui`. Default is None.
+    """
+    title_names = _check_titles(list(plot_data), title_names)
+    align = 0 if align_x is None else align_x * x_rescale
 
-            # Plot confidence bands
-            x_vals = (
-                beta_hat_plt["s"] / x_rescale
-                - align / x_rescale
-                - 1 / x_rescale
-            )
+    for r, (ax, beta_hat_plt) in enumerate(zip(axes, plot_data.values())):
+        beta_hat_plt = downsample_plot_data(beta_hat_plt, max_points)
+        has_bands = "lower_joint" in beta_hat_plt
+        x_vals = (
+            beta_hat_plt["s"] / x_rescale - align / x_rescale - 1 / x_rescale
+        )
+
+        # Plot confidence bands
+        if has_bands:
             ax.fill_between(
                 x_vals,
                 beta_hat_plt["lower_joint"],
@@ -166,13 +321,14 @@ def plot_fui(
                 color="gray",
                 alpha=0.4,
             )
-            ax.plot(
-                x_vals,
-                beta_hat_plt["beta"],
-                color="black",
-                label="Estimate",
-                linewidth=1,
-            )
+        # Plot estimate
+        ax.plot(
+            x_vals,
+            beta_hat_plt["beta"],
+            color="black",
+            label="Estimate",
+            linewidth=1,
+        )
 
         # Add horizontal line at y=0
         ax.axhline(y=0, color="black", linestyle="--", alpha=0.75)
@@ -186,20 +342,11 @@ def plot_fui(
         if ylim is not None:
             ax.set_ylim(ylim)
         else:
-            if (
-                "betaHat_var" not in fuiobj.names()
-                or fuiobj.getbyname("betaHat_var") is None
-            ):
-                y_range = [
-                    beta_hat_plt["beta"].min(),
-                    beta_hat_plt["beta"].max(),
-                ]
+            if has_bands:
+                low, high = "lower_joint", "upper_joint"
             else:
-                y_range = [
-                    beta_hat_plt["lower_joint"].min(),
-                    beta_hat_plt["upper_joint"].max(),
-                ]
-
+                low, high = "beta", "beta"
+            y_range = [beta_hat_plt[low].min(), beta_hat_plt[high].max()]
             y_adjust = y_scal_orig * (y_range[1] - y_range[0])
             y_range[0] -= y_adjust
             y_range = [y * y_val_lim for y in y_range]
@@ -211,29 +358,24 @@ def plot_fui(
                 x=0, color="black", linestyle="--", alpha=0.75, linewidth=0.5
             )
 
-        res_list.append(beta_hat_plt)
-
-    fig.tight_layout()
-
-    if return_data:
-        return fig, dict(zip(var_names, res_list))
-    return fig
-
 
 def r_export_plot_fui_results(
     csv_filepath: Path,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    from rpy2 import robjects as ro  # type: ignore
+    from rpy2.robjects import pandas2ri  # type: ignore
+
     # read data, run fui, run plot_fui in R
     ro.r(f'dat <- read.csv("{str(csv_filepath.absolute())}")')
     ro.r("library(fastFMM)")
     ro.r("mod <- fui(photometry ~ cs + (1 | id), data = dat, parallel = TRUE)")
     ro.r("plot_data <- plot_fui(mod, return=TRUE)")
     with (ro.default_converter + pandas2ri.converter).context():
-        intercept_list: NamedList = ro.conversion.get_conversion().rpy2py(
+        intercept_list: "NamedList" = ro.conversion.get_conversion().rpy2py(
             ro.r("plot_data['(Intercept)']")
         )
         r_intercept: pd.DataFrame = intercept_list.getbyname("(Intercept)")
-        cs_list: NamedList = ro.conversion.get_conversion().rpy2py(
+        cs_list: "NamedList" = ro.conversion.get_conversion().rpy2py(
             ro.r("plot_data['cs']")
         )
         r_cs: pd.DataFrame = cs_list.getbyname("cs")
@@ -243,39 +385,17 @@ def r_export_plot_fui_results(
 def py_plot_fui_results(
     csv_filepath: Path,
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    from rpy2.robjects.conversion import localconverter  # type: ignore
+    from rpy2.robjects.packages import importr  # type: ignore
+
+    from fast_fmm_rpy2.convert import make_rules
+
     # read data to pandas, pass to R, run fui, pass to rpy2, run plot_fui
     read_csv_in_pandas_pass_to_r(csv_filepath)
     fastFMM = importr("fastFMM")
     base = importr("base")
     stats = importr("stats")
-    mod_rules = ro.default_converter + pandas2ri.converter
-
-    @mod_rules.rpy2py.register(rinterface.FloatSexpVector)
-    def rpy2py_floatvector(obj):
-        x = np.array(obj)
-        try:
-            # if names is assigned, convert to pandas series
-            return pd.Series(x, obj.names)
-        except Exception:
-            # if dimnames assigned, it's a named matrix,
-            # convert to pandas dataframe
-            try:
-                rownames, colnames = obj.do_slot("dimnames")
-                if not isinstance(rownames, NULLType) and not isinstance(
-                    colnames, NULLType
-                ):
-                    x = pd.DataFrame(x, index=rownames, columns=colnames)
-                else:
-                    x = pd.DataFrame(x, columns=colnames)
-
-            finally:
-                # plain vector/matrix
-                return x
-
-    # dummy call to prevent pylance error
-    _ = rpy2py_floatvector
-
-    with localconverter(mod_rules):
+    with localconverter(make_rules()):
         mod = fastFMM.fui(
             stats.as_formula("photometry ~ cs + (1 | id)"),
             data=base.as_symbol("py_dat"),
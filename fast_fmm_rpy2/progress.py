@@ -0,0 +1,340 @@
+"""
+Turn fastFMM's console output into structured progress events.
+
+With `silent=False`, `fastFMM::fui` prints the step it is on ("Step 1: Fit
+Massively Univariate Mixed Models", "Step 2: Smoothing", ...) and, for
+bootstrap inference, a progress bar or iteration counter. These writes go
+to R's console, where they interleave with Python's stdout or are lost in
+worker processes. `capture_console` intercepts them through rpy2's console
+callbacks, `ProgressParser` turns them into `ProgressEvent`s and
+`fui_events` streams the events of a fit as an async iterator.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+# print() in R wraps strings as `[1] "..."`; message() does not
+_PRINTED = re.compile(r'^\[\d+\]\s+"(.*)"$')
+_STEP = re.compile(r"^Step\s+(\d+(?:\.\d+)*)\s*:?\s*(.*)$", re.IGNORECASE)
+_COUNT = re.compile(r"(\d+)\s*(?:/|of)\s*(\d+)")
+_PERCENT = re.compile(r"(\d{1,3})\s*%")
+
+# embedded R must only ever run on one thread at a time, so every
+# `FuiEvents` fit runs on this one thread, one after another
+_R_EXECUTOR = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix="fast_fmm_rpy2-r"
+)
+
+# rpy2's console callbacks are module globals; captures swap and restore
+# them one at a time
+_CONSOLE_LOCK = threading.RLock()
+
+# lower-case keywords of step labels, checked in order
+STAGE_KEYWORDS = (
+    ("bootstrap", "bootstrap"),
+    ("univariate", "univariate"),
+    ("smooth", "smoothing"),
+    ("covariance", "variance"),
+    ("variance", "variance"),
+    ("inference", "variance"),
+    ("confidence", "variance"),
+)
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """
+    One step, iteration or other line of fastFMM's console output.
+
+    Parameters
+    ----------
+    kind : str
+        "step" when a new step starts, "iteration" for progress within a
+        step (bootstrap counters and progress bars) and "message" for any
+        other line.
+    text : str
+        The line as printed, without R's `[1] "..."` wrapping.
+    stage : str or None
+        "univariate", "smoothing", "variance" or "bootstrap", from the
+        label of the current step; None before the first step.
+    step : str or None
+        Number of the current step, e.g. "3.1.2".
+    label : str or None
+        Label of the current step, e.g. "Smooth G".
+    current : int or None
+        For iterations, the number of iterations done, when printed.
+    total : int or None
+        For iterations, the number of iterations, when printed.
+    fraction : float or None
+        For iterations, the completed fraction of the step.
+    elapsed_s : float
+        Seconds since the parser was created.
+    eta_s : float or None
+        For iterations, the estimated seconds left in the step, assuming
+        a constant rate since the step started.
+    """
+
+    kind: str
+    text: str
+    stage: str | None
+    step: str | None
+    label: str | None
+    current: int | None = None
+    total: int | None = None
+    fraction: float | None = None
+    elapsed_s: float = 0.0
+    eta_s: float | None = None
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the event.
+
+        Returns
+        -------
+        dict
+            Every field of the event.
+        """
+        return asdict(self)
+
+
+def _stage(label: str) -> str | None:
+    lowered = label.lower()
+    for keyword, stage in STAGE_KEYWORDS:
+        if keyword in lowered:
+            return stage
+    return None
+
+
+class ProgressParser:
+    """
+    Incrementally parse console writes into `ProgressEvent`s.
+
+    R writes the console in arbitrary fragments and progress bars redraw
+    their line with carriage returns, so text is buffered until a newline
+    or carriage return completes a line.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._start = time.perf_counter()
+        self._step_start = self._start
+        self._step: str | None = None
+        self._label: str | None = None
+        self._stage: str | None = None
+        self._last_fraction: float | None = None
+
+    def feed(self, text: str) -> list[ProgressEvent]:
+        """
+        Parse a console write.
+
+        Parameters
+        ----------
+        text : str
+            Text as written to R's console.
+
+        Returns
+        -------
+        list[ProgressEvent]
+            Events for the lines completed by `text`.
+        """
+        lines = re.split(r"[\r\n]", self._buffer + text)
+        self._buffer = lines.pop()
+        return [e for line in lines if (e := self._parse(line)) is not None]
+
+    def flush(self) -> list[ProgressEvent]:
+        """
+        Parse any incomplete last line.
+
+        Returns
+        -------
+        list[ProgressEvent]
+            The event of the buffered line, if any.
+        """
+        line, self._buffer = self._buffer, ""
+        event = self._parse(line)
+        return [] if event is None else [event]
+
+    def _parse(self, line: str) -> ProgressEvent | None:
+        line = line.strip()
+        if printed := _PRINTED.match(line):
+            line = printed.group(1).strip()
+        if not line:
+            return None
+        now = time.perf_counter()
+        if step := _STEP.match(line):
+            self._step, self._label = step.group(1), step.group(2).strip()
+            # sub-steps of a bootstrap step are still bootstrap
+            self._stage = _stage(self._label) or self._stage
+            self._step_start = now
+            self._last_fraction = None
+            return self._event("step", line, now)
+        current = total = fraction = None
+        if count := _COUNT.search(line):
+            current, total = int(count.group(1)), int(count.group(2))
+            fraction = current / total if total else None
+        elif percent := _PERCENT.search(line):
+            fraction = int(percent.group(1)) / 100
+        if fraction is None:
+            return self._event("message", line, now)
+        if fraction == self._last_fraction:
+            # progress bars redraw without advancing
+            return None
+        self._last_fraction = fraction
+        elapsed = now - self._step_start
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        return self._event(
+            "iteration",
+            line,
+            now,
+            current=current,
+            total=total,
+            fraction=fraction,
+            eta_s=eta,
+        )
+
+    def _event(self, kind: str, text: str, now: float, **fields):
+        return ProgressEvent(
+            kind=kind,
+            text=text,
+            stage=self._stage,
+            step=self._step,
+            label=self._label,
+            elapsed_s=now - self._start,
+            **fields,
+        )
+
+
+@contextmanager
+def capture_console(
+    callback: Callable[[ProgressEvent], None], echo: bool = False
+) -> Iterator[ProgressParser]:
+    """
+    Send R's console output to `callback` as progress events.
+
+    Both R's standard output and its message/warning stream are captured
+    for the duration of the `with` block; the previous console handlers
+    are restored afterwards. A capture in another thread waits until this
+    one ends.
+
+    Parameters
+    ----------
+    callback : callable
+        Called with each `ProgressEvent`, on the thread running R.
+    echo : bool, optional
+        Whether to also pass the output on to the previous handlers.
+        Default is False.
+
+    Yields
+    ------
+    ProgressParser
+        The parser fed with the captured output.
+    """
+    from rpy2.rinterface_lib import callbacks  # type: ignore
+
+    # read the handlers to restore only once no other capture holds them
+    with _CONSOLE_LOCK:
+        parser = ProgressParser()
+        print_write = callbacks.consolewrite_print
+        error_write = callbacks.consolewrite_warnerror
+
+        def writer(original):
+            def write(text: str) -> None:
+                if echo:
+                    original(text)
+                for event in parser.feed(text):
+                    callback(event)
+
+            return write
+
+        with (
+            callbacks.obj_in_module(
+                callbacks, "consolewrite_print", writer(print_write)
+            ),
+            callbacks.obj_in_module(
+                callbacks, "consolewrite_warnerror", writer(error_write)
+            ),
+        ):
+            try:
+                yield parser
+            finally:
+                for event in parser.flush():
+                    callback(event)
+
+
+class FuiEvents:
+    """
+    Async iterator over the progress events of a fit running in a thread.
+
+    Returned by `fui_events`. Fits of all instances share one thread and
+    run one after another. Iterate with `async for` to receive the
+    events, then `await` the object for the fitted model; awaiting also
+    re-raises any error of the fit.
+    """
+
+    _done = object()
+
+    def __init__(self, fit: Callable, *args, **kwargs):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # queued behind the fits of any other FuiEvents
+        self._future = self._loop.run_in_executor(
+            _R_EXECUTOR, self._run, fit, args, kwargs
+        )
+
+    def _emit(self, event) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def _run(self, fit: Callable, args: tuple, kwargs: dict):
+        try:
+            return fit(*args, progress=self._emit, **kwargs)
+        finally:
+            self._emit(self._done)
+
+    def __aiter__(self) -> "FuiEvents":
+        return self
+
+    async def __anext__(self) -> ProgressEvent:
+        event = await self._queue.get()
+        if event is self._done:
+            raise StopAsyncIteration
+        return event
+
+    def __await__(self):
+        return self._future.__await__()
+
+
+def fui_events(*args, **kwargs) -> FuiEvents:
+    """
+    Start `fmm_run.fui` in a background thread and stream its progress.
+
+    Must be called from a running event loop. `silent` defaults to False
+    here, since a silent fit prints no progress.
+
+    Parameters
+    ----------
+    *args, **kwargs
+        Arguments of `fmm_run.fui`, except `progress`.
+
+    Returns
+    -------
+    FuiEvents
+        Async iterator of `ProgressEvent`s; await it for the model.
+
+    Examples
+    --------
+    >>> events = fui_events(Path("tests/data/binary.csv"),
+    ...                     "photometry ~ cs + (1 | id)")
+    >>> async for event in events:
+    ...     print(event.stage, event.fraction, event.eta_s)
+    >>> mod = await events
+    """
+    from fast_fmm_rpy2.fmm_run import fui
+
+    kwargs.setdefault("silent", False)
+    return FuiEvents(fui, *args, **kwargs)
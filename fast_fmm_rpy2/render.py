@@ -0,0 +1,184 @@
+"""
+Render many `plot_fui` figures in parallel, without a display.
+
+`render_batch` draws one figure per model in a pool of worker processes
+using matplotlib's Agg canvas and writes each straight to PNG, SVG or PDF.
+Every worker keeps the figure and axes it built for a coefficient layout
+and redraws later models with the same layout into them, so the figure
+setup and `tight_layout` are paid once per layout rather than per model.
+"""
+
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from fast_fmm_rpy2.batch import FuiJobResult, run_batch
+from fast_fmm_rpy2.plot_fui import (
+    _add_axes,
+    _check_titles,
+    _grid_shape,
+    compute_plot_data,
+    draw_plot_data,
+)
+from fast_fmm_rpy2.result import FuiResult
+
+# figures kept per worker process, keyed on their layout
+MAX_TEMPLATES = 8
+
+_templates: OrderedDict[tuple, tuple] = OrderedDict()
+
+
+def _init_render_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def render_plot_data(
+    plot_data: dict,
+    paths: list[Path],
+    dpi: float = 100,
+    num_row: int | None = None,
+    **plot_kwargs,
+) -> list[Path]:
+    """
+    Draw one model's plot data and write it to files, reusing a template.
+
+    The figure is drawn on a figure cached for the same titles, grid and
+    x label if this process has one. Only the data artists are replaced,
+    and the subplot layout computed by `tight_layout` for the first model
+    is kept.
+
+    Parameters
+    ----------
+    plot_data : dict[str, pd.DataFrame]
+        Per-coefficient frames returned by `compute_plot_data`.
+    paths : list[Path]
+        Files to write; the format is taken from each suffix.
+    dpi : float, optional
+        Resolution of raster formats. Default is 100.
+    num_row : int or None, optional
+        As in `plot_fui`.
+    **plot_kwargs
+        Other `plot_fui` arguments, e.g. `xlab`, `title_names` or
+        `align_x`.
+
+    Returns
+    -------
+    list[Path]
+        `paths`.
+    """
+    from matplotlib.figure import Figure
+
+    num_var = len(plot_data)
+    num_row, num_col = _grid_shape(num_var, num_row)
+    title_names = plot_kwargs.pop("title_names", None)
+    titles = _check_titles(list(plot_data), title_names)
+    key = (
+        tuple(titles),
+        num_row,
+        num_col,
+        plot_kwargs.get("xlab", "Functional Domain"),
+    )
+    if key in _templates:
+        _templates.move_to_end(key)
+        fig, axes = _templates[key]
+        for ax in axes:
+            for artist in [*ax.lines, *ax.collections]:
+                artist.remove()
+        draw_plot_data(axes, plot_data, title_names=titles, **plot_kwargs)
+        for ax in axes:
+            # the y limits are always set explicitly by draw_plot_data
+            ax.relim()
+            ax.autoscale_view(scaley=False)
+    else:
+        fig = Figure(figsize=(5, 4 * num_row))
+        axes = _add_axes(fig, num_var, num_row, num_col)
+        draw_plot_data(axes, plot_data, title_names=titles, **plot_kwargs)
+        fig.tight_layout()
+        _templates[key] = (fig, axes)
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    for path in paths:
+        fig.savefig(path, dpi=dpi)
+    return paths
+
+
+def _render_job(job: tuple) -> list[Path]:
+    source, paths, options = job
+    if isinstance(source, Path):
+        # saved results load without R, so workers never start it
+        source = compute_plot_data(FuiResult.load(source))
+    return render_plot_data(source, paths, **options)
+
+
+def render_batch(
+    results: Iterable,
+    output_dir: Path | str,
+    names: Iterable[str] | None = None,
+    formats: Iterable[str] = ("png",),
+    max_workers: int | None = None,
+    max_pending: int | None = None,
+    dpi: float = 100,
+    **plot_kwargs,
+) -> Iterator[FuiJobResult]:
+    """
+    Render `plot_fui` figures for many models in worker processes.
+
+    Parameters
+    ----------
+    results : iterable
+        Fitted models (`FuiResult` or `NamedList`), whose plot data are
+        computed here and sent to the workers, or directories written by
+        `FuiResult.save`, which the workers load themselves. Consumed
+        lazily.
+    output_dir : Path or str
+        Directory the figures are written to; created if needed.
+    names : iterable of str or None, optional
+        File name stem of each figure. Default is None, which uses the
+        directory name of saved results and `model_<i>` otherwise.
+    formats : iterable of str, optional
+        File formats written for every figure, e.g. ("png", "svg", "pdf").
+        Default is ("png",).
+    max_workers : int or None, optional
+        Number of worker processes. Default is `available_cores()`.
+    max_pending : int or None, optional
+        Maximum number of figures queued or rendering at once.
+        Default is `2 * max_workers`.
+    dpi : float, optional
+        Resolution of raster formats. Default is 100.
+    **plot_kwargs
+        `plot_fui` arguments applied to every figure, e.g. `xlab`,
+        `num_row` or `align_x`; `return_data` is not accepted.
+
+    Yields
+    ------
+    FuiJobResult
+        One result per model, in completion order; `result` is the list
+        of files written and `index` the model's position in `results`.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    formats = list(formats)
+    stems = None if names is None else iter(names)
+
+    def jobs():
+        for i, item in enumerate(results):
+            if isinstance(item, (str, Path)):
+                source = Path(item)
+                stem = source.name
+            else:
+                source = compute_plot_data(item)
+                stem = f"model_{i}"
+            if stems is not None:
+                stem = next(stems)
+            paths = [output_dir / f"{stem}.{fmt}" for fmt in formats]
+            yield source, paths, {"dpi": dpi, **plot_kwargs}
+
+    return run_batch(
+        jobs(),
+        _render_job,
+        max_workers=max_workers,
+        max_pending=max_pending,
+        initializer=_init_render_worker,
+    )
@@ -0,0 +1,651 @@
+import json
+from collections.abc import Callable
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from fast_fmm_rpy2.cache import _atomic_write
+from fast_fmm_rpy2.instrument import Span, collect_spans, span
+
+if TYPE_CHECKING:
+    import rpy2.rinterface as rinterface  # type: ignore
+
+# rpy2 is imported inside the methods so that unpickling or type-checking
+# against FuiResult does not start R by itself
+
+# bump whenever the layout written by FuiResult.save changes
+RESULT_FORMAT_VERSION = 1
+
+# fields written by FuiResult.save by default: everything plot_fui and
+# pointwise or joint inference on the coefficients need
+DEFAULT_SAVE_FIELDS = ("betaHat", "betaHat_var", "argvals", "qn")
+
+
+def _downcast(value):
+    # float64 -> float32 for arrays and pandas objects; anything else,
+    # including nested lists, is returned unchanged
+    if isinstance(value, (np.ndarray, pd.Series)):
+        if value.dtype == np.float64:
+            return value.astype(np.float32)
+        return value
+    if isinstance(value, pd.DataFrame):
+        doubles = value.columns[value.dtypes == np.float64]
+        if len(doubles):
+            return value.astype(dict.fromkeys(doubles, np.float32))
+    return value
+
+
+def _write_npy(path: Path, array: np.ndarray, dtype=None) -> np.memmap:
+    # copy one slice along the last axis at a time, which is one contiguous
+    # block of a column-major array, so at most that much is held in memory
+    # besides the source; returns the written file mapped read-only
+    def write(tmp: Path) -> None:
+        out = np.lib.format.open_memmap(
+            tmp,
+            mode="w+",
+            dtype=array.dtype if dtype is None else dtype,
+            shape=array.shape,
+            fortran_order=True,
+        )
+        if array.ndim < 2:
+            out[...] = array
+        else:
+            for k in range(array.shape[-1]):
+                out[..., k] = array[..., k]
+        out.flush()
+        del out
+
+    # written to a new file renamed over `path`: arrays still mapped from
+    # the old file, `array` itself included, keep reading its inode
+    _atomic_write(path, write)
+    return np.load(path, mmap_mode="r")
+
+
+def _json_value(value):
+    # labels and small values are stored in metadata.json; NumPy scalars
+    # become Python ones
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_json_value(v) for v in value]
+    return value
+
+
+def _save_field(directory: Path, name: str, index: int, value) -> dict:
+    if value is None:
+        return {"kind": "null"}
+    if isinstance(value, pd.DataFrame):
+        if value.dtypes.nunique() > 1:
+            raise TypeError(f"{name} has mixed column dtypes")
+        entry = _save_field(directory, name, index, value.to_numpy())
+        entry["kind"] = "frame"
+        entry["index"] = _json_value(value.index.to_list())
+        entry["columns"] = _json_value(value.columns.to_list())
+        return entry
+    if isinstance(value, pd.Series):
+        entry = _save_field(directory, name, index, value.to_numpy())
+        entry["kind"] = "series"
+        entry["index"] = _json_value(value.index.to_list())
+        return entry
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        # numbered files, as field names need not be valid file names
+        filename = f"{index}.npy"
+        _write_npy(directory / filename, value)
+        return {"kind": "array", "file": filename}
+    value = _json_value(
+        value.tolist() if isinstance(value, np.ndarray) else value
+    )
+    try:
+        json.dumps(value)
+    except TypeError:
+        raise TypeError(
+            f"{name} is a {type(value).__name__}, which cannot be saved"
+        ) from None
+    return {"kind": "value", "value": value}
+
+
+def _load_field(directory: Path, entry: dict, mmap: bool):
+    kind = entry["kind"]
+    if kind == "null":
+        return None
+    if kind == "value":
+        return entry["value"]
+    array = np.load(
+        directory / entry["file"],
+        mmap_mode="r" if mmap else None,
+        allow_pickle=False,
+    )
+    if kind == "frame":
+        return pd.DataFrame(
+            array, index=entry["index"], columns=entry["columns"], copy=False
+        )
+    if kind == "series":
+        return pd.Series(array, index=entry["index"], copy=False)
+    return array
+
+
+class FuiResult:
+    """
+    Fitted fastFMM model that converts R fields to Python on first access.
+
+    `fastFMM::fui` returns a named R list whose fields can be large, e.g.
+    `betaHat_var` is L x L x p and `residuals`, `design_mat` or `randeffs`
+    may hold one row per observation. `FuiResult` keeps a reference to the
+    R list and converts a field with `import_rules` only when it is first
+    read, caching the result. It supports the `NamedList` methods used on
+    results so far (`names`, `getbyname`, indexing by position).
+
+    Parameters
+    ----------
+    r_object : rinterface.ListSexpVector
+        The named R list returned by `fastFMM::fui`, unconverted.
+    import_rules : object or None, optional
+        Converter applied to each field. Default is None, which uses
+        `fmm_run.local_rules`.
+    float32 : bool, optional
+        Whether to downcast double fields (arrays, Series and DataFrame
+        columns) to float32 as they are converted. Default is False.
+    metadata : dict, callable or None, optional
+        JSON-serializable description of the fit, e.g. the formula,
+        arguments, fastFMM version and data fingerprint set by `fui`, or a
+        function returning it, called the first time `metadata` is read.
+        Default is None (empty).
+
+    Examples
+    --------
+    >>> mod = fui(Path("tests/data/binary.csv"), "photometry ~ cs + (1 | id)")
+    >>> mod["betaHat"]  # converted now; betaHat_var is never converted
+    >>> mod.to_numpy("qn")
+    >>> mod.save("fit.fui")
+    >>> FuiResult.load("fit.fui")  # no R needed
+    """
+
+    def __init__(
+        self,
+        r_object: "rinterface.ListSexpVector",
+        import_rules=None,
+        float32: bool = False,
+        metadata: dict | Callable[[], dict] | None = None,
+    ):
+        import rpy2.rinterface as rinterface  # type: ignore
+
+        # robjects.ListVector converts items on access; keep the low-level
+        # list so each field is converted once, by import_rules only
+        if type(r_object) is not rinterface.ListSexpVector:
+            r_object = rinterface.ListSexpVector(r_object)
+        self._r_object = r_object
+        self._import_rules = import_rules
+        self.float32 = float32
+        self._names = [str(name) for name in r_object.do_slot("names")]
+        self._fields: dict[int, object] = {}
+        self._spilled: set[int] = set()
+        self._metadata = {} if metadata is None else metadata
+        self.spans: list[Span] = []
+
+    @classmethod
+    def _from_fields(cls, fields: dict, metadata: dict | None = None):
+        # a result whose fields are all converted already and that has no
+        # R object behind it, e.g. one read back by `load`
+        result = cls.__new__(cls)
+        result._r_object = None
+        result._import_rules = None
+        result.float32 = False
+        result._names = list(fields)
+        result._fields = dict(enumerate(fields.values()))
+        result._spilled = set()
+        result.spans = []
+        result.metadata = {} if metadata is None else metadata
+        return result
+
+    def __repr__(self) -> str:
+        return (
+            f"FuiResult(names={self._names!r}, "
+            + f"converted={self.converted!r})"
+        )
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # converters hold registered functions and cannot be pickled;
+        # unpickled results fall back to fmm_run.local_rules
+        state["_import_rules"] = None
+        state["_metadata"] = self.metadata
+        return state
+
+    @property
+    def metadata(self) -> dict:
+        """Description of the fit, built on first read if deferred."""
+        if callable(self._metadata):
+            self._metadata = self._metadata()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata: dict | Callable[[], dict]) -> None:
+        self._metadata = metadata
+
+    @property
+    def r_object(self) -> "rinterface.ListSexpVector | None":
+        """The unconverted R list, or None for results read by `load`."""
+        return self._r_object
+
+    @property
+    def converted(self) -> list[str]:
+        """Names of the fields converted so far."""
+        return [self._names[i] for i in sorted(self._fields)]
+
+    def names(self) -> list[str]:
+        """
+        Get the names of the result's fields, in R's order.
+
+        Returns
+        -------
+        list[str]
+            Field names, e.g. "betaHat", "betaHat_var", "qn", "argvals".
+        """
+        return list(self._names)
+
+    def _index(self, key: int | str) -> int:
+        if isinstance(key, str):
+            try:
+                return self._names.index(key)
+            except ValueError:
+                raise KeyError(key) from None
+        if not -len(self._names) <= key < len(self._names):
+            raise IndexError(f"field index {key} out of range")
+        return key % len(self._names)
+
+    def _convert(self, index: int):
+        from rpy2 import robjects as ro  # type: ignore
+        from rpy2.robjects.conversion import localconverter  # type: ignore
+
+        rules = self._import_rules
+        if rules is None:
+            from fast_fmm_rpy2.fmm_run import local_rules as rules
+        # conversion does not grow R's heap, so skip measuring it
+        with (
+            collect_spans() as spans,
+            span("result.convert", r_heap=False, field=self._names[index]),
+            localconverter(rules),
+        ):
+            value = ro.conversion.get_conversion().rpy2py(
+                self._r_object[index]
+            )
+        self.spans.extend(spans)
+        return _downcast(value) if self.float32 else value
+
+    def __getitem__(self, key: int | str):
+        index = self._index(key)
+        if index not in self._fields:
+            self._fields[index] = self._convert(index)
+        return self._fields[index]
+
+    def getbyname(self, name: str):
+        """
+        Get a field converted with `import_rules`, as `NamedList` does.
+
+        Parameters
+        ----------
+        name : str
+            Field name.
+
+        Returns
+        -------
+        object
+            The converted field; it is cached for later calls.
+
+        Raises
+        ------
+        KeyError
+            If the result has no field `name`.
+        """
+        return self[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self):
+        # iterate values, like rpy2's NamedList
+        return (self[i] for i in range(len(self)))
+
+    def values(self):
+        """Iterate over all fields, converting each one."""
+        return iter(self)
+
+    def items(self):
+        """Iterate over `(name, field)` pairs, converting each field."""
+        return ((name, self[i]) for i, name in enumerate(self._names))
+
+    def to_numpy(self, name: str, copy: bool = False) -> np.ndarray | None:
+        """
+        Get a field as a NumPy array straight from R, bypassing pandas.
+
+        Parameters
+        ----------
+        name : str
+            Field name of an atomic R vector, matrix or array.
+        copy : bool, optional
+            If False, numeric, integer and logical fields are returned as
+            views of R's memory, which stay valid while this result is
+            alive; writing to them modifies the R object. Default is False.
+            With `float32`, double fields are always copied.
+
+        Returns
+        -------
+        np.ndarray or None
+            The field with R's dimensions, or None if it is NULL.
+
+        Raises
+        ------
+        TypeError
+            If the field is a list or another non-atomic R object.
+        """
+        if self._r_object is None or self._index(name) in self._spilled:
+            return self._stored_numpy(name, copy)
+        array = self._r_numpy(name, copy)
+        if self.float32 and array is not None:
+            return _downcast(array)
+        return array
+
+    def _r_numpy(self, name: str, copy: bool) -> np.ndarray | None:
+        import rpy2.rinterface as rinterface  # type: ignore
+        from rpy2.rinterface_lib.sexp import NULLType  # type: ignore
+
+        value = self._r_object[self._index(name)]
+        if isinstance(value, NULLType):
+            return None
+        if isinstance(
+            value,
+            (
+                rinterface.FloatSexpVector,
+                rinterface.IntSexpVector,
+                rinterface.BoolSexpVector,
+            ),
+        ):
+            return np.array(value) if copy else np.asarray(value)
+        if isinstance(value, rinterface.StrSexpVector):
+            return np.array(list(value), dtype=object)
+        raise TypeError(
+            f"{name} is an R {type(value).__name__}, not an atomic vector"
+        )
+
+    def spill(self, name: str, path: Path | str) -> np.memmap:
+        """
+        Move a large array field out of memory into a memory-mapped file.
+
+        The field is copied into a column-major `.npy` file one slice along
+        its last axis at a time (for `betaHat_var`, one L x L matrix per
+        coefficient), and R's copy is then released, so the array is never
+        held in memory twice. Afterwards the field is read from the file,
+        and `var_diagonal` or `var_block` only read what they return.
+
+        Parameters
+        ----------
+        name : str
+            Field holding a numeric array, e.g. "betaHat_var".
+        path : Path or str
+            `.npy` file to write. An existing file is replaced by a new
+            one, so arrays mapped from it keep their values.
+
+        Returns
+        -------
+        np.memmap
+            The field, mapped read-only from `path`.
+
+        Raises
+        ------
+        TypeError
+            If the field is not a numeric array.
+        """
+        path = Path(path)
+        index = self._index(name)
+        if self._r_object is None or index in self._spilled:
+            array = self._stored_numpy(name, copy=False)
+        else:
+            # a view of R's memory, downcast slice by slice if need be
+            array = self._r_numpy(name, copy=False)
+        if array is None or array.dtype == object:
+            raise TypeError(f"{name} is not a numeric array")
+        dtype = None
+        if self.float32 and array.dtype == np.float64:
+            dtype = np.float32
+        stored = _write_npy(path, array, dtype)
+        del array
+        self._fields[index] = stored
+        self._spilled.add(index)
+        if self._r_object is not None:
+            from rpy2 import robjects as ro  # type: ignore
+            from rpy2.robjects.conversion import localconverter  # type: ignore
+
+            # drop R's reference, keeping the field's position and name
+            release = ro.r("function(m, i) { m[i] <- list(NULL); m }")
+            with localconverter(ro.default_converter):
+                self._r_object = release(self._r_object, index + 1)
+        return stored
+
+    def var_diagonal(
+        self, r: int | None = None, name: str = "betaHat_var"
+    ) -> np.ndarray:
+        """
+        Get pointwise variances from the diagonal of a covariance field.
+
+        Parameters
+        ----------
+        r : int or None, optional
+            Coefficient index. Default is None (every coefficient).
+        name : str, optional
+            L x L x p covariance field. Default is "betaHat_var".
+
+        Returns
+        -------
+        np.ndarray
+            The length-L diagonal of coefficient `r`, or a (p, L) array of
+            all diagonals. Only these L or p * L values are read when the
+            field is memory-mapped.
+        """
+        var = self.to_numpy(name)
+        if r is not None:
+            var = var[:, :, r]
+        return np.diagonal(var, axis1=0, axis2=1)
+
+    def var_block(
+        self,
+        r: int,
+        rows: slice | np.ndarray,
+        cols: slice | np.ndarray | None = None,
+        name: str = "betaHat_var",
+    ) -> np.ndarray:
+        """
+        Read a block of one coefficient's covariance matrix.
+
+        Parameters
+        ----------
+        r : int
+            Coefficient index.
+        rows : slice or np.ndarray
+            Functional domain points (0-based) of the block's rows.
+        cols : slice, np.ndarray or None, optional
+            Points of the block's columns. Default is None (same as
+            `rows`).
+        name : str, optional
+            L x L x p covariance field. Default is "betaHat_var".
+
+        Returns
+        -------
+        np.ndarray
+            The block, copied into memory.
+        """
+        if cols is None:
+            cols = rows
+        var = self.to_numpy(name)[:, :, r]
+        if isinstance(rows, slice) or isinstance(cols, slice):
+            return np.array(var[rows, cols])
+        return var[np.ix_(rows, cols)]
+
+    def _stored_numpy(self, name: str, copy: bool) -> np.ndarray | None:
+        value = self[name]
+        if value is None:
+            return None
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            value = value.to_numpy()
+        if isinstance(value, list):
+            return np.array(value, dtype=object)
+        if not isinstance(value, np.ndarray):
+            raise TypeError(
+                f"{name} is a {type(value).__name__}, not an array"
+            )
+        return np.array(value) if copy else value
+
+    def to_pandas(self, name: str) -> pd.DataFrame | pd.Series | None:
+        """
+        Get a field as a pandas object.
+
+        Parameters
+        ----------
+        name : str
+            Field name.
+
+        Returns
+        -------
+        pd.DataFrame, pd.Series or None
+            Fields already converted to pandas by `import_rules` are
+            returned as is; unnamed vectors become a Series and matrices a
+            DataFrame. NULL fields give None.
+
+        Raises
+        ------
+        TypeError
+            If the field has more than two dimensions or is not atomic.
+        """
+        value = self[name]
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value
+        array = self.to_numpy(name)
+        if array is None:
+            return None
+        if array.ndim == 1:
+            return pd.Series(array, name=name)
+        if array.ndim == 2:
+            return pd.DataFrame(array)
+        raise TypeError(
+            f"{name} has {array.ndim} dimensions; use to_numpy instead"
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Convert every field into plain Python objects that need no R.
+
+        Returns
+        -------
+        dict
+            See `fmm_run.fui_result_to_dict`.
+        """
+        if self._r_object is None:
+            return dict(self.items())
+        from fast_fmm_rpy2.fmm_run import fui_result_to_dict
+
+        return fui_result_to_dict(self)
+
+    def save(
+        self, directory: Path | str, fields: list[str] | None = None
+    ) -> Path:
+        """
+        Write fields and metadata to a directory that loads without R.
+
+        Arrays are stored as `.npy` files in R's (column-major) layout, one
+        per field, so `load` can memory-map them; row and column labels,
+        small values and `metadata` go to `metadata.json`, which is written
+        last, so an interrupted save leaves no loadable result. Saving over
+        an earlier result removes its `metadata.json` first and its
+        arrays no longer referenced afterwards; every file is replaced by
+        a new one, so results loaded from the directory keep their values.
+
+        Parameters
+        ----------
+        directory : Path or str
+            Directory to write to; created if needed.
+        fields : list[str] or None, optional
+            Fields to save. Default is None, which saves the fields in
+            `DEFAULT_SAVE_FIELDS` that the result has.
+
+        Returns
+        -------
+        Path
+            `directory`.
+
+        Raises
+        ------
+        KeyError
+            If a requested field is missing.
+        TypeError
+            If a field is an R list or another object that has no
+            array, pandas or JSON representation.
+        """
+        directory = Path(directory)
+        if fields is None:
+            fields = [name for name in DEFAULT_SAVE_FIELDS if name in self]
+        metadata = self.metadata
+        directory.mkdir(parents=True, exist_ok=True)
+        # an earlier result in the directory stops being loadable before
+        # any of its arrays is replaced
+        (directory / "metadata.json").unlink(missing_ok=True)
+        entries = {
+            name: _save_field(directory, name, i, self[name])
+            for i, name in enumerate(fields)
+        }
+        meta = {
+            "format": RESULT_FORMAT_VERSION,
+            "fields": entries,
+            "metadata": metadata,
+        }
+        _atomic_write(
+            directory / "metadata.json",
+            lambda tmp: tmp.write_text(json.dumps(meta, default=str)),
+        )
+        written = {entry.get("file") for entry in entries.values()}
+        for path in directory.glob("*.npy"):
+            if path.stem.isdigit() and path.name not in written:
+                path.unlink()
+        return directory
+
+    @classmethod
+    def load(cls, directory: Path | str, mmap: bool = True) -> "FuiResult":
+        """
+        Read a result written by `save`, without starting R.
+
+        Parameters
+        ----------
+        directory : Path or str
+            Directory written by `save`.
+        mmap : bool, optional
+            Whether to memory-map the arrays read-only instead of reading
+            them into memory, so that e.g. only the diagonals of
+            `betaHat_var` that are used are read from disk.
+            Default is True.
+
+        Returns
+        -------
+        FuiResult
+            A result with the saved fields and `metadata`; `r_object` is
+            None.
+
+        Raises
+        ------
+        ValueError
+            If the directory was written by an incompatible version.
+        """
+        directory = Path(directory)
+        meta = json.loads((directory / "metadata.json").read_text())
+        if meta.get("format") != RESULT_FORMAT_VERSION:
+            raise ValueError(
+                f"{directory} has result format {meta.get('format')}, "
+                + f"expected {RESULT_FORMAT_VERSION}"
+            )
+        fields = {
+            name: _load_field(directory, entry, mmap)
+            for name, entry in meta["fields"].items()
+        }
+        return cls._from_fields(fields, meta["metadata"])
@@ -0,0 +1,300 @@
+"""
+Split a machine's CPU budget between concurrent fastFMM fits.
+
+With `n_cores=NULL`, every `fui` call forks R workers for 3/4 of the
+machine, and each of those may start its own BLAS/OpenMP threads, so a few
+fits running side by side oversubscribe the CPUs many times over.
+`plan_resources` picks how many fits run at once, the `n_cores` each one
+passes to fastFMM and the BLAS/OpenMP thread count, so that the product
+stays within one budget. `CoreBudget` extends the budget across batches
+and processes: every `fui` call holds as many of the machine's core tokens
+as it passes to fastFMM, so concurrent batches, sweeps, bootstraps and
+plain fits together never ask for more cores than the machine has.
+"""
+
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from fast_fmm_rpy2.cache import default_cache_dir
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+# total cores of the machine-wide budget; 0 disables it
+CORE_BUDGET_ENV = "FAST_FMM_RPY2_TOTAL_CORES"
+
+# environment variables read by the common BLAS/OpenMP runtimes when R
+# loads them; they only take effect in processes started afterwards
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "BLIS_NUM_THREADS",
+)
+
+
+def available_cores() -> int:
+    """
+    Get the number of CPUs this process may run on.
+
+    Returns
+    -------
+    int
+        CPUs in the scheduling affinity mask where supported, otherwise
+        `os.cpu_count()`; at least 1.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class ResourcePlan:
+    """
+    How a CPU budget is divided between concurrent fits.
+
+    Parameters
+    ----------
+    total_cores : int
+        The CPU budget being divided.
+    max_workers : int
+        Number of fits run at the same time, one per worker process.
+    n_cores : int
+        Cores each fit may use; passed to fastFMM as `n_cores`, and fastFMM
+        runs in parallel only if it is greater than 1.
+    blas_threads : int
+        BLAS/OpenMP threads per R process. fastFMM already spends a fit's
+        cores on forked workers across the functional domain, so threaded
+        BLAS inside each fork would only oversubscribe; plans use 1.
+    """
+
+    total_cores: int
+    max_workers: int
+    n_cores: int
+    blas_threads: int
+
+    @property
+    def parallel(self) -> bool:
+        return self.n_cores > 1
+
+    @property
+    def cores_in_use(self) -> int:
+        """Upper bound on busy cores when every worker is fitting."""
+        return self.max_workers * self.n_cores * self.blas_threads
+
+    def fui_kwargs(self) -> dict:
+        """
+        Get the `fui` arguments that apply this plan to one fit.
+
+        Returns
+        -------
+        dict
+            `parallel` and `n_cores`.
+        """
+        return {"parallel": self.parallel, "n_cores": self.n_cores}
+
+    def thread_env(self) -> dict[str, str]:
+        """
+        Get the environment that caps BLAS/OpenMP threads in a new process.
+
+        Returns
+        -------
+        dict[str, str]
+            Every variable in `THREAD_ENV_VARS` set to `blas_threads`.
+        """
+        return {name: str(self.blas_threads) for name in THREAD_ENV_VARS}
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the plan, for logging.
+
+        Returns
+        -------
+        dict
+            Every field of the plan plus `parallel` and `cores_in_use`.
+        """
+        return {
+            **asdict(self),
+            "parallel": self.parallel,
+            "cores_in_use": self.cores_in_use,
+        }
+
+
+def plan_resources(
+    n_jobs: int | None = None,
+    total_cores: int | None = None,
+    max_workers: int | None = None,
+) -> ResourcePlan:
+    """
+    Divide a CPU budget between concurrent fits.
+
+    Fits are spread over as many worker processes as there are cores,
+    capped by `max_workers` and the number of jobs. The cores left per
+    worker go to fastFMM's own forked parallelism. With few jobs on a big
+    machine, each fit therefore gets several cores instead of leaving
+    them idle.
+
+    Parameters
+    ----------
+    n_jobs : int or None, optional
+        Number of fits, if known. Default is None (unbounded).
+    total_cores : int or None, optional
+        The CPU budget. Default is `available_cores()`.
+    max_workers : int or None, optional
+        Upper bound on concurrent fits. Default is None (no bound beyond
+        the budget).
+
+    Returns
+    -------
+    ResourcePlan
+        The chosen plan; `plan.cores_in_use <= total_cores`.
+
+    Raises
+    ------
+    ValueError
+        If any argument is less than 1.
+
+    Examples
+    --------
+    >>> plan_resources(n_jobs=2, total_cores=16)
+    ResourcePlan(total_cores=16, max_workers=2, n_cores=8, blas_threads=1)
+    >>> plan_resources(n_jobs=1000, total_cores=16, max_workers=4)
+    ResourcePlan(total_cores=16, max_workers=4, n_cores=4, blas_threads=1)
+    """
+    if total_cores is None:
+        total_cores = available_cores()
+    for name, value in (
+        ("n_jobs", n_jobs),
+        ("total_cores", total_cores),
+        ("max_workers", max_workers),
+    ):
+        if value is not None and value < 1:
+            raise ValueError(f"{name} must be at least 1, got {value}")
+    workers = total_cores
+    if max_workers is not None:
+        workers = min(workers, max_workers)
+    if n_jobs is not None:
+        workers = min(workers, n_jobs)
+    return ResourcePlan(
+        total_cores=total_cores,
+        max_workers=workers,
+        n_cores=total_cores // workers,
+        blas_threads=1,
+    )
+
+
+def apply_thread_env(plan: ResourcePlan) -> None:
+    """
+    Cap BLAS/OpenMP threads for R started later in this process.
+
+    Must run before rpy2 is imported; BLAS libraries read these variables
+    once, when they are loaded.
+
+    Parameters
+    ----------
+    plan : ResourcePlan
+        Plan whose `blas_threads` is applied.
+    """
+    os.environ.update(plan.thread_env())
+
+
+@dataclass(frozen=True)
+class CoreBudget:
+    """
+    Pool of core tokens shared by every process on the machine.
+
+    Each token is a lock file in `directory`, held with `flock`, so the
+    operating system releases the tokens of a process that dies.
+
+    Parameters
+    ----------
+    total_cores : int
+        Number of tokens.
+    directory : Path
+        Directory of the token files; processes that share it share the
+        budget.
+    poll_s : float, optional
+        Seconds between attempts while waiting for tokens. Default is 0.05.
+    """
+
+    total_cores: int
+    directory: Path
+    poll_s: float = 0.05
+
+    def _try_lock(self, index: int) -> int | None:
+        fd = os.open(
+            self.directory / f"core-{index}.lock", os.O_CREAT | os.O_RDWR
+        )
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @contextmanager
+    def acquire(self, n: int, minimum: int | None = None) -> Iterator[int]:
+        """
+        Hold up to `n` tokens for the duration of a `with` block.
+
+        Tokens are taken all at once: until at least `minimum` are free,
+        none are held, so waiting requests cannot deadlock each other.
+
+        Parameters
+        ----------
+        n : int
+            Tokens wanted; capped at `total_cores`.
+        minimum : int or None, optional
+            Fewest tokens to proceed with. Default is None, which waits
+            for all `n`.
+
+        Yields
+        ------
+        int
+            Number of tokens held, between `minimum` and `n`.
+        """
+        n = max(1, min(n, self.total_cores))
+        minimum = n if minimum is None else max(1, min(minimum, n))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        while True:
+            held: list[int] = []
+            for index in range(self.total_cores):
+                if len(held) == n:
+                    break
+                fd = self._try_lock(index)
+                if fd is not None:
+                    held.append(fd)
+            if len(held) >= minimum:
+                break
+            for fd in held:
+                os.close(fd)
+            time.sleep(self.poll_s)
+        try:
+            yield len(held)
+        finally:
+            for fd in held:
+                os.close(fd)
+
+
+def default_core_budget() -> CoreBudget | None:
+    """
+    Get the machine-wide budget used by `fmm_run.fui`.
+
+    Returns
+    -------
+    CoreBudget or None
+        `$FAST_FMM_RPY2_TOTAL_CORES` tokens (default `available_cores()`)
+        in `default_cache_dir() / "cores"`, or None if the variable is 0
+        or file locks are not available on this platform.
+    """
+    total = int(os.environ.get(CORE_BUDGET_ENV) or available_cores())
+    if total <= 0 or fcntl is None:
+        return None
+    return CoreBudget(total, default_cache_dir() / "cores")
@@ -0,0 +1,222 @@
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class IngestSchema:
+    """
+    Column typing rules used to read a photometry CSV for R.
+
+    The defaults reproduce the historical behavior of
+    `read_csv_in_pandas_pass_to_r`: `trial` becomes a nullable integer with
+    values below 1 treated as missing, and everything else is inferred.
+    Columns named in the schema but absent from a file are ignored, so the
+    same schema works for datasets with and without a `trial` column.
+
+    Parameters
+    ----------
+    dtypes : dict[str, str], optional
+        Explicit dtypes for additional columns, passed to `pd.read_csv`.
+    nullable_int : tuple[str, ...], optional
+        Columns parsed as pandas `Int64`, so missing values become `pd.NA`
+        and reach R as `NA_integer_`. Default is ("trial",).
+    nullable_int_min : int or None, optional
+        Values of the `nullable_int` columns below this bound are treated
+        as missing. None disables the check. Default is 1.
+    categorical : tuple[str, ...], optional
+        Columns parsed as categoricals with string categories; they reach
+        R as factors. Default is () (e.g. `id` stays as parsed).
+    outcome_prefix : str, optional
+        Prefix of the functional outcome columns `<prefix>.1..L`, which
+        are always parsed as float64. Default is "photometry".
+    float_precision : str, optional
+        Float converter passed to `pd.read_csv`. Default is "round_trip",
+        which mimics R's `read.csv` precision.
+    """
+
+    dtypes: dict[str, str] = field(default_factory=dict)
+    nullable_int: tuple[str, ...] = ("trial",)
+    nullable_int_min: int | None = 1
+    categorical: tuple[str, ...] = ()
+    outcome_prefix: str = "photometry"
+    float_precision: str = "round_trip"
+
+    def outcome_columns(self, columns) -> list[str]:
+        """
+        Select the functional outcome columns from a list of column names.
+
+        Parameters
+        ----------
+        columns : iterable of str
+            Column names, e.g. a CSV header.
+
+        Returns
+        -------
+        list[str]
+            The `<outcome_prefix>.N` columns, in their original order.
+        """
+        prefix = f"{self.outcome_prefix}."
+        return [
+            col
+            for col in columns
+            if isinstance(col, str) and col.startswith(prefix)
+        ]
+
+    def read_dtypes(self, columns) -> dict[str, str]:
+        """
+        Build the `dtype` mapping for `pd.read_csv` from a header.
+
+        Parameters
+        ----------
+        columns : iterable of str
+            Column names present in the file.
+
+        Returns
+        -------
+        dict[str, str]
+            Dtype for every column the schema constrains.
+        """
+        columns = list(columns)
+        present = set(columns)
+        dtypes = {col: "float64" for col in self.outcome_columns(columns)}
+        dtypes.update(
+            {col: "Int64" for col in self.nullable_int if col in present}
+        )
+        dtypes.update(
+            {col: "category" for col in self.categorical if col in present}
+        )
+        dtypes.update(
+            {col: dt for col, dt in self.dtypes.items() if col in present}
+        )
+        return dtypes
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the schema.
+
+        Returns
+        -------
+        dict
+            Every field of the schema, suitable for cache keys.
+        """
+        return asdict(self)
+
+
+DEFAULT_SCHEMA = IngestSchema()
+
+
+def apply_schema(
+    df: pd.DataFrame, schema: IngestSchema = DEFAULT_SCHEMA
+) -> pd.DataFrame:
+    """
+    Normalize a frame for R according to a schema.
+
+    All NA handling uses vectorized masks on nullable dtypes; no Python
+    function is called per row.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame read with (or without) `schema.read_dtypes`. It is modified
+        in place.
+    schema : IngestSchema, optional
+        Typing rules. Default is `DEFAULT_SCHEMA`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The normalized frame with a 1-based index matching R's row names.
+    """
+    for col in schema.nullable_int:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if values.dtype != "Int64":
+            # float columns may hold NaN; route them through a nullable
+            # float so the integer cast keeps NA instead of failing
+            values = values.astype("Float64").astype("Int64")
+        if schema.nullable_int_min is not None:
+            # R uses NA_integer_, so out-of-range values MUST become pd.NA
+            values = values.mask(
+                (values < schema.nullable_int_min).fillna(False)
+            )
+        df[col] = values
+    for col in schema.categorical:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype("category")
+        # pandas2ri only converts categoricals with string categories
+        if not pd.api.types.is_string_dtype(values.cat.categories):
+            values = values.cat.rename_categories(
+                values.cat.categories.astype(str)
+            )
+        df[col] = values
+    # change index of df to match 1 to len(df) + 1 index in R
+    df.index = pd.RangeIndex(1, len(df) + 1)
+    return df
+
+
+def read_csv_with_schema(
+    csv_filepath: Path, schema: IngestSchema = DEFAULT_SCHEMA
+) -> pd.DataFrame:
+    """
+    Read a CSV in a single typed pass and normalize it for R.
+
+    Parameters
+    ----------
+    csv_filepath : Path
+        The file path to the CSV file containing the data.
+    schema : IngestSchema, optional
+        Typing rules. Default is `DEFAULT_SCHEMA`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The normalized frame; see `apply_schema`.
+    """
+    return apply_schema(read_csv_typed(csv_filepath, schema), schema)
+
+
+def read_csv_typed(
+    csv_filepath: Path,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+    chunksize: int | None = None,
+) -> pd.DataFrame:
+    """
+    Parse a CSV with the schema's dtypes, without normalizing it.
+
+    Parameters
+    ----------
+    csv_filepath : Path
+        The file path to the CSV file containing the data.
+    schema : IngestSchema, optional
+        Column typing rules. Default is `DEFAULT_SCHEMA`.
+    chunksize : int or None, optional
+        If given, parse this many rows at a time to bound the parser's
+        temporary memory. Default is None (one pass).
+
+    Returns
+    -------
+    pd.DataFrame
+        The typed frame with a default 0-based index.
+    """
+    header = pd.read_csv(csv_filepath, nrows=0).columns
+    read_kwargs = dict(
+        dtype=schema.read_dtypes(header),
+        float_precision=schema.float_precision,
+    )
+    if chunksize is None:
+        return pd.read_csv(csv_filepath, **read_kwargs)  # type: ignore
+    with pd.read_csv(
+        csv_filepath,
+        chunksize=chunksize,
+        **read_kwargs,  # type: ignore
+    ) as reader:
+        chunks = list(reader)
+    if not chunks:
+        return pd.read_csv(csv_filepath, nrows=0, **read_kwargs)  # type: ignore
+    return pd.concat(chunks, ignore_index=True)
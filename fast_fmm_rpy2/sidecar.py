@@ -0,0 +1,224 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_fmm_rpy2.cache import _atomic_write
+from fast_fmm_rpy2.schema import DEFAULT_SCHEMA, IngestSchema, apply_schema
+
+SIDECAR_FORMAT_VERSION = 1
+
+
+def default_sidecar_dir(csv_filepath: Path) -> Path:
+    """
+    Get the sidecar directory used for a CSV when none is given.
+
+    Parameters
+    ----------
+    csv_filepath : Path
+        Source CSV.
+
+    Returns
+    -------
+    Path
+        `<csv_filepath without suffix>.fmm` next to the CSV.
+    """
+    return Path(csv_filepath).with_suffix(".fmm")
+
+
+def _count_data_rows(csv_filepath: Path, chunk_size: int = 1 << 24) -> int:
+    # upper bound on the number of records: newlines minus the header line
+    n_lines = 0
+    last = b"\n"
+    with open(csv_filepath, "rb") as f:
+        while chunk := f.read(chunk_size):
+            n_lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        n_lines += 1
+    return max(n_lines - 1, 0)
+
+
+def _sidecar_meta(csv_filepath: Path, schema: IngestSchema) -> dict:
+    stat = Path(csv_filepath).stat()
+    return {
+        "format": SIDECAR_FORMAT_VERSION,
+        "source": str(Path(csv_filepath).absolute()),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "schema": schema.options(),
+    }
+
+
+def _temp_npy(directory: Path) -> Path:
+    fd, name = tempfile.mkstemp(dir=directory, suffix=".tmp.npy")
+    os.close(fd)
+    return Path(name)
+
+
+def build_outcome_sidecar(
+    csv_filepath: Path,
+    sidecar_dir: Path | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+    chunksize: int = 10_000,
+) -> Path:
+    """
+    Convert a CSV's functional block into a Fortran-ordered float64 `.npy`.
+
+    The CSV is parsed in chunks of `chunksize` rows and each chunk's
+    outcome columns are written straight into a memory-mapped array, so
+    the full matrix never exists as a pandas frame. The array is stored
+    column-major, which is R's matrix layout, so it can later be copied
+    into R without a transpose.
+
+    Parameters
+    ----------
+    csv_filepath : Path
+        The file path to the CSV file containing the data.
+    sidecar_dir : Path or None, optional
+        Directory to write the sidecar to. Default is
+        `default_sidecar_dir(csv_filepath)`.
+    schema : IngestSchema, optional
+        Column typing rules; `schema.outcome_prefix` selects the
+        functional block. Default is `DEFAULT_SCHEMA`.
+    chunksize : int, optional
+        Number of rows parsed at a time. Default is 10,000.
+
+    Returns
+    -------
+    Path
+        The sidecar directory, holding `outcome.npy`, `covariates.pkl` and
+        `meta.json`.
+
+    Raises
+    ------
+    ValueError
+        If the CSV has no `<outcome_prefix>.N` columns.
+    """
+    if sidecar_dir is None:
+        sidecar_dir = default_sidecar_dir(csv_filepath)
+    sidecar_dir = Path(sidecar_dir)
+    sidecar_dir.mkdir(parents=True, exist_ok=True)
+
+    header = pd.read_csv(csv_filepath, nrows=0).columns
+    outcome_cols = schema.outcome_columns(header)
+    if not outcome_cols:
+        raise ValueError(
+            f"{csv_filepath} has no {schema.outcome_prefix}.N columns"
+        )
+    capacity = _count_data_rows(csv_filepath)
+    outcome_path = sidecar_dir / "outcome.npy"
+    # build in a new file and rename it over the old one: processes that
+    # still map the previous sidecar keep reading its unchanged inode
+    tmp_path = _temp_npy(sidecar_dir)
+    try:
+        outcome = np.lib.format.open_memmap(
+            tmp_path,
+            mode="w+",
+            dtype=np.float64,
+            shape=(capacity, len(outcome_cols)),
+            fortran_order=True,
+        )
+        covariate_chunks = []
+        n_rows = 0
+        reader = pd.read_csv(
+            csv_filepath,
+            dtype=schema.read_dtypes(header),  # type: ignore[arg-type]
+            float_precision=schema.float_precision,  # type: ignore[arg-type]
+            chunksize=chunksize,
+        )
+        with reader:
+            for chunk in reader:
+                stop = n_rows + len(chunk)
+                outcome[n_rows:stop] = chunk[outcome_cols].to_numpy(
+                    dtype=np.float64
+                )
+                covariate_chunks.append(chunk.drop(columns=outcome_cols))
+                n_rows = stop
+        outcome.flush()
+        if n_rows != capacity:
+            # blank lines or quoted newlines made the row count an
+            # overestimate; column-major data cannot be truncated in place
+            trimmed_path = _temp_npy(sidecar_dir)
+            try:
+                trimmed = np.lib.format.open_memmap(
+                    trimmed_path,
+                    mode="w+",
+                    dtype=np.float64,
+                    shape=(n_rows, len(outcome_cols)),
+                    fortran_order=True,
+                )
+                trimmed[:] = outcome[:n_rows]
+                trimmed.flush()
+                del trimmed
+            except BaseException:
+                trimmed_path.unlink(missing_ok=True)
+                raise
+            tmp_path.unlink()
+            tmp_path = trimmed_path
+        del outcome
+        os.replace(tmp_path, outcome_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    covariates = apply_schema(
+        pd.concat(covariate_chunks, ignore_index=True), schema
+    )
+    _atomic_write(sidecar_dir / "covariates.pkl", covariates.to_pickle)
+    meta = _sidecar_meta(csv_filepath, schema)
+    meta["outcome_columns"] = outcome_cols
+    _atomic_write(
+        sidecar_dir / "meta.json",
+        lambda tmp: tmp.write_text(json.dumps(meta)),
+    )
+    return sidecar_dir
+
+
+def load_outcome_sidecar(
+    csv_filepath: Path,
+    sidecar_dir: Path | None = None,
+    schema: IngestSchema = DEFAULT_SCHEMA,
+    chunksize: int = 10_000,
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Map a CSV's functional block read-only, building the sidecar if needed.
+
+    The sidecar is rebuilt whenever the CSV's mtime or size, or the
+    schema, differ from the ones recorded when it was written.
+
+    Parameters
+    ----------
+    csv_filepath : Path
+        The file path to the CSV file containing the data.
+    sidecar_dir : Path or None, optional
+        Sidecar directory. Default is `default_sidecar_dir(csv_filepath)`.
+    schema : IngestSchema, optional
+        Column typing rules. Default is `DEFAULT_SCHEMA`.
+    chunksize : int, optional
+        Number of rows parsed at a time when (re)building.
+        Default is 10,000.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, np.ndarray]
+        The normalized covariates (1-based index) and a read-only
+        memory-mapped (n, L) outcome matrix in Fortran order.
+    """
+    if sidecar_dir is None:
+        sidecar_dir = default_sidecar_dir(csv_filepath)
+    sidecar_dir = Path(sidecar_dir)
+    try:
+        meta = json.loads((sidecar_dir / "meta.json").read_text())
+        meta.pop("outcome_columns")
+        is_fresh = meta == _sidecar_meta(csv_filepath, schema)
+    except (OSError, ValueError, KeyError):
+        is_fresh = False
+    if not is_fresh:
+        build_outcome_sidecar(csv_filepath, sidecar_dir, schema, chunksize)
+    covariates = pd.read_pickle(sidecar_dir / "covariates.pkl")
+    outcome = np.load(sidecar_dir / "outcome.npy", mmap_mode="r")
+    return covariates, outcome
@@ -0,0 +1,294 @@
+"""
+Fit one dataset with many formulas and arguments, passing it to R once.
+
+Model exploration fits the same data with dozens of candidate formulas.
+`fmm_run.fui` reads the CSV and assigns it in R on every call; `sweep`
+assigns it once per R process instead and fits every candidate against
+that R variable, in this process or in a pool of worker processes. The
+result is a table with one row per candidate: its arguments, status,
+information criteria and timings, ready for model selection.
+"""
+
+import functools
+import itertools
+import time
+from collections.abc import Iterable, Mapping, Sequence
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_fmm_rpy2.batch import _init_data_worker, run_batch
+from fast_fmm_rpy2.scheduler import plan_resources
+from fast_fmm_rpy2.schema import DEFAULT_SCHEMA
+
+# column order of the `aic` field of a fastFMM result
+AIC_COLUMNS = ("AIC", "BIC", "cAIC")
+
+SWEEP_R_VAR = "sweep_dat"
+
+
+def candidates(
+    formulas: Iterable[str | tuple[str, dict]],
+    grid: Mapping[str, Sequence] | None = None,
+) -> list[tuple[str, dict]]:
+    """
+    Expand formulas and an argument grid into (formula, kwargs) pairs.
+
+    Parameters
+    ----------
+    formulas : iterable of str or (str, dict)
+        Formulas, optionally paired with `fui` arguments of their own.
+    grid : mapping of str to sequence, optional
+        `fui` argument values to combine with every formula, e.g.
+        {"smooth_method": ["GCV.Cp", "REML"]}. Every combination is
+        fitted. Default is None (no grid).
+
+    Returns
+    -------
+    list of (str, dict)
+        One pair per candidate, formulas outermost. A formula's own
+        arguments win over the grid.
+    """
+    grid = dict(grid or {})
+    combos = [
+        dict(zip(grid, values)) for values in itertools.product(*grid.values())
+    ]
+    expanded = []
+    for item in formulas:
+        formula, own = (item, {}) if isinstance(item, str) else item
+        expanded.extend((formula, {**combo, **own}) for combo in combos)
+    return expanded
+
+
+def _check_outcomes(pairs: list[tuple[str, dict]]) -> str:
+    names = {pair[0].split("~")[0].strip() for pair in pairs}
+    if len(names) != 1:
+        raise ValueError(
+            f"all formulas must share one outcome, got {sorted(names)}"
+        )
+    return names.pop()
+
+
+def _aic_summary(aic) -> dict:
+    # fastFMM reports the criteria per point of the functional domain;
+    # their mean ranks candidates like the sum but reads on a per-point
+    # scale
+    summary = dict.fromkeys(AIC_COLUMNS, np.nan)
+    if aic is None:
+        return summary
+    aic = np.asarray(aic, dtype=np.float64)
+    if aic.ndim != 2 or aic.shape[1] != len(AIC_COLUMNS):
+        return summary
+    with np.errstate(invalid="ignore"):
+        for name, column in zip(AIC_COLUMNS, aic.T):
+            if not np.isnan(column).all():
+                summary[name] = float(np.nanmean(column))
+    return summary
+
+
+def _fit_candidate(job: dict) -> dict:
+    # fit one candidate against data already assigned in R
+    from fast_fmm_rpy2 import fmm_run
+
+    kwargs = dict(job["kwargs"])
+    # None stands for R's NULL, which is what fui defaults these to
+    for key in ("argvals", "nknots_min", "subj_id", "n_cores"):
+        if key in kwargs and kwargs[key] is None:
+            del kwargs[key]
+    fit = fmm_run.fit_r_data
+    if "result_cache" in kwargs or "betaHat_var_path" in kwargs:
+        # fui keys the cache on its data fingerprint and spills betaHat_var
+        fit = functools.partial(fmm_run.fui, None)
+    else:
+        # sweep read the data with it already
+        kwargs.pop("schema", None)
+    started = time.perf_counter()
+    mod = fit(job["formula"], r_var_name=job["r_var_name"], **kwargs)
+    fit_s = time.perf_counter() - started
+    row = {
+        **_aic_summary(mod.to_numpy("aic") if "aic" in mod else None),
+        "fit_s": fit_s,
+        "elapsed_s": time.perf_counter() - started,
+    }
+    if job["keep_results"]:
+        row["result"] = (
+            mod if job["in_process"] else fmm_run.fui_result_to_dict(mod)
+        )
+    return row
+
+
+def sweep(
+    data: Path | str | pd.DataFrame,
+    formulas: Iterable[str | tuple[str, dict]],
+    grid: Mapping[str, Sequence] | None = None,
+    caic: bool = True,
+    outcome: np.ndarray | None = None,
+    processes: int | None = None,
+    total_cores: int | None = None,
+    keep_results: bool = False,
+    r_var_name: str = SWEEP_R_VAR,
+    **fui_kwargs,
+) -> pd.DataFrame:
+    """
+    Fit every candidate formula and argument combination on one dataset.
+
+    The data are assigned to the R variable `r_var_name` once per R
+    process, and every candidate is fitted against it with
+    `fmm_run.fit_r_data`, which skips `fui`'s data fingerprint and
+    metadata (`fui` is used with `result_cache`). Failed candidates are
+    recorded in the table rather than stopping the sweep.
+
+    Parameters
+    ----------
+    data : Path, str or pd.DataFrame
+        CSV file or in-memory data, as accepted by `fmm_run.fui`.
+    formulas : iterable of str or (str, dict)
+        Candidate formulas, optionally with their own `fui` arguments. All
+        must have the same outcome.
+    grid : mapping of str to sequence, optional
+        `fui` argument values to try with every formula; see
+        `candidates`. Default is None.
+    caic : bool, optional
+        Whether fastFMM computes the cAIC of each candidate.
+        Default is True.
+    outcome : np.ndarray or None, optional
+        Outcome matrix paired with a covariate DataFrame. Default is None.
+    processes : int or None, optional
+        Number of worker processes, each of which loads the data once.
+        Default is None, which fits every candidate in this process.
+    total_cores : int or None, optional
+        CPU budget shared by the worker processes, split as in
+        `batch.fit_batch`. Ignored without `processes`. Default is every
+        available core.
+    keep_results : bool, optional
+        Whether to add a `result` column holding each model: a `FuiResult`
+        in this process, or the R-free dict of `fmm_run.fui_result_to_dict`
+        from worker processes. Default is False, which keeps only the
+        `aic` field in R while fitting.
+    r_var_name : str, optional
+        R variable holding the data. Default is "sweep_dat".
+    **fui_kwargs
+        Other `fmm_run.fui` arguments applied to every candidate, with
+        None for R's NULL. The grid and per-formula arguments win over
+        these. `schema` and `ingest_cache` apply to reading `data`.
+        `import_rules` and `result_cache` are only supported in this
+        process.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per candidate, in candidate order: `formula`, one column
+        per grid argument, `status` ("ok" or "error"), `error`, the mean
+        over the functional domain of `AIC`, `BIC` and `cAIC` (NaN where
+        fastFMM did not compute them), `fit_s` (the R fit), `elapsed_s`
+        (the fit and reading its results) and, with `keep_results`,
+        `result`.
+
+    Raises
+    ------
+    ValueError
+        If there are no candidates or their outcomes differ.
+    TypeError
+        If `import_rules` or `result_cache` is given with `processes`.
+
+    Examples
+    --------
+    >>> table = sweep(
+    ...     "tests/data/binary.csv",
+    ...     ["photometry ~ cs + (1 | id)", "photometry ~ cs + (cs | id)"],
+    ...     grid={"smooth_method": ["GCV.Cp", "REML"]},
+    ...     processes=4,
+    ... )
+    >>> table.sort_values("cAIC").head()
+    """
+    pairs = candidates(formulas, grid)
+    if not pairs:
+        raise ValueError("no candidates to fit")
+    name = _check_outcomes(pairs)
+    if not isinstance(data, pd.DataFrame):
+        data = Path(data).absolute()
+    base = {"caic": caic, **fui_kwargs}
+    # the data are read once, for every candidate; `schema` stays in the
+    # kwargs as part of a result_cache key
+    ingest_cache = base.pop("ingest_cache", None)
+    schema = base.get("schema", DEFAULT_SCHEMA)
+    if not keep_results:
+        base.setdefault("return_fields", ["aic"])
+    in_process = processes is None
+    jobs = [
+        {
+            "formula": formula,
+            "kwargs": {**base, **kwargs},
+            "r_var_name": r_var_name,
+            "keep_results": keep_results,
+            "in_process": in_process,
+        }
+        for formula, kwargs in pairs
+    ]
+    if in_process:
+        from fast_fmm_rpy2 import fmm_run
+
+        fmm_run.pass_data_to_r(
+            data,
+            name,
+            outcome=outcome,
+            r_var_name=r_var_name,
+            ingest_cache=ingest_cache,
+            schema=schema,
+        )
+        rows = []
+        for job in jobs:
+            try:
+                rows.append({"status": "ok", **_fit_candidate(job)})
+            except Exception as e:
+                rows.append({"status": "error", "error": repr(e)})
+    else:
+        for unsupported in ("import_rules", "result_cache"):
+            if unsupported in base:
+                raise TypeError(
+                    f"{unsupported} is not supported with processes"
+                )
+        plan = plan_resources(
+            n_jobs=len(jobs), total_cores=total_cores, max_workers=processes
+        )
+        for job in jobs:
+            # explicit per-candidate settings win over the plan
+            job["kwargs"] = {**plan.fui_kwargs(), **job["kwargs"]}
+        rows = [{} for _ in jobs]
+        for res in run_batch(
+            jobs,
+            _fit_candidate,
+            max_workers=plan.max_workers,
+            initializer=_init_data_worker,
+            initargs=(
+                plan,
+                data,
+                outcome,
+                name,
+                r_var_name,
+                ingest_cache,
+                schema,
+            ),
+        ):
+            if res.ok:
+                rows[res.index] = {"status": "ok", **res.result}
+            else:
+                rows[res.index] = {"status": "error", "error": repr(res.error)}
+    grid_keys = list(grid or {})
+    table = pd.DataFrame(
+        [
+            {
+                "formula": formula,
+                **{key: kwargs.get(key) for key in grid_keys},
+                "status": row["status"],
+                "error": row.get("error"),
+                **{c: row.get(c, np.nan) for c in AIC_COLUMNS},
+                "fit_s": row.get("fit_s", np.nan),
+                "elapsed_s": row.get("elapsed_s", np.nan),
+                **({"result": row.get("result")} if keep_results else {}),
+            }
+            for (formula, kwargs), row in zip(pairs, rows)
+        ]
+    )
+    return table
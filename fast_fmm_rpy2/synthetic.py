@@ -0,0 +1,388 @@
+"""
+Generate synthetic photometry datasets for load and scaling tests.
+
+Datasets have the layout of `tests/data/anova_data.csv`: `id`, `session`,
+`trial`, trial-level covariates and a functional outcome in
+`photometry.1..L`. Each outcome curve is
+
+    y_ij(s) = beta_0(s) + sum_k x_ijk beta_k(s) + u_i0(s)
+              + sum_k x_ijk u_ik(s) + e_ij(s),
+
+with fixed-effect curves `beta_k`, smooth subject-level random curves
+`u_ik` for the terms in `random_effects` and white noise `e_ij`. Every
+subject is drawn from its own seeded stream, so a dataset is the same
+whether it is built in memory or written in chunks.
+"""
+
+import json
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_fmm_rpy2.cache import _atomic_write
+
+Curve = Callable[[np.ndarray], np.ndarray] | np.ndarray | float
+
+
+def bump(center: float = 0.3, width: float = 0.1, height: float = 1.0):
+    """
+    Make a Gaussian bump effect curve on the unit interval.
+
+    Parameters
+    ----------
+    center : float, optional
+        Location of the peak in [0, 1]. Default is 0.3.
+    width : float, optional
+        Standard deviation of the bump. Default is 0.1.
+    height : float, optional
+        Peak value. Default is 1.0.
+
+    Returns
+    -------
+    callable
+        Maps domain points `s` in [0, 1] to `height * exp(...)`.
+    """
+
+    def curve(s: np.ndarray) -> np.ndarray:
+        return height * np.exp(-0.5 * ((s - center) / width) ** 2)
+
+    return curve
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """
+    Size and generative model of a synthetic dataset.
+
+    Parameters
+    ----------
+    n_subjects : int, optional
+        Number of subjects (`id`). Default is 10.
+    n_sessions : int, optional
+        Sessions per subject. Default is 1.
+    n_trials : int, optional
+        Trials per session. Default is 50.
+    L : int, optional
+        Number of points of the functional domain. Default is 100.
+    effects : mapping, optional
+        Fixed-effect curve of each term: "(Intercept)" and one entry per
+        covariate. Each curve is a callable of the domain points in
+        [0, 1], an array of length L or a constant. Covariates are
+        Bernoulli(0.5) trial indicators unless listed in `continuous`.
+        Default is a zero intercept and a `bump()` effect of `cs`.
+    continuous : sequence of str, optional
+        Covariates drawn from a standard normal instead. Default is ().
+    random_effects : sequence of str, optional
+        Terms with a subject-level random curve: "(Intercept)" for a
+        random intercept and covariate names for random slopes, i.e.
+        `(1 | id)` or `(cs | id)` in the model formula.
+        Default is ("(Intercept)",).
+    random_sd : float, optional
+        Standard deviation of the random curves. Default is 0.5.
+    noise_sd : float, optional
+        Standard deviation of the pointwise noise. Default is 1.0.
+    missing_trials : float, optional
+        Fraction of trials dropped at random. Default is 0.0.
+    missing_outcome : float, optional
+        Fraction of outcome values set to NaN at random. Default is 0.0.
+    outcome_name : str, optional
+        Prefix of the outcome columns. Default is "photometry".
+    seed : int, optional
+        Seed of the generator. Default is 0.
+    """
+
+    n_subjects: int = 10
+    n_sessions: int = 1
+    n_trials: int = 50
+    L: int = 100
+    effects: Mapping[str, Curve] = field(
+        default_factory=lambda: {"(Intercept)": 0.0, "cs": bump()}
+    )
+    continuous: Sequence[str] = ()
+    random_effects: Sequence[str] = ("(Intercept)",)
+    random_sd: float = 0.5
+    noise_sd: float = 1.0
+    missing_trials: float = 0.0
+    missing_outcome: float = 0.0
+    outcome_name: str = "photometry"
+    seed: int = 0
+
+    @property
+    def covariates(self) -> list[str]:
+        """Names of the covariates, in column order."""
+        return [name for name in self.effects if name != "(Intercept)"]
+
+    def options(self) -> dict:
+        """
+        Get a JSON-serializable description of the spec.
+
+        Returns
+        -------
+        dict
+            Every field; effect curves are given as their values on the
+            domain.
+        """
+        options = asdict(self)
+        options["effects"] = {
+            name: curve.tolist() for name, curve in self._curves().items()
+        }
+        options["continuous"] = list(self.continuous)
+        options["random_effects"] = list(self.random_effects)
+        return options
+
+    def _curves(self) -> dict[str, np.ndarray]:
+        s = np.linspace(0, 1, self.L)
+        curves = {}
+        for name, curve in self.effects.items():
+            values = curve(s) if callable(curve) else curve
+            curves[name] = np.broadcast_to(
+                np.asarray(values, dtype=np.float64), (self.L,)
+            )
+        return curves
+
+
+def _random_curves(rng, n: int, L: int, sd: float) -> np.ndarray:
+    # smooth random functions: a few low-frequency Fourier terms with
+    # decaying weights, scaled so that the pointwise sd is about `sd`
+    s = np.linspace(0, 1, L)
+    k = np.arange(1, 4)
+    basis = np.vstack([np.ones(L), np.sin(np.pi * k[:, None] * s)])  # (4, L)
+    weights = np.array([1.0, 1.0, 0.5, 0.25])
+    coefs = rng.normal(0, 1, (n, len(weights))) * weights
+    return sd / np.sqrt(np.sum(weights**2) / 2) * coefs @ basis
+
+
+def _subject_frame(spec: SyntheticSpec, curves: dict, subject: int):
+    rng = np.random.default_rng([spec.seed, subject])
+    n = spec.n_sessions * spec.n_trials
+    covariates = {
+        name: (
+            rng.normal(0, 1, n)
+            if name in spec.continuous
+            else rng.integers(0, 2, n)
+        )
+        for name in spec.covariates
+    }
+    design = {"(Intercept)": np.ones(n), **covariates}
+    random = _random_curves(
+        rng, len(spec.random_effects), spec.L, spec.random_sd
+    )
+    outcome = rng.normal(0, spec.noise_sd, (n, spec.L))
+    for name, curve in curves.items():
+        outcome += np.outer(design[name], curve)
+    for name, curve in zip(spec.random_effects, random):
+        outcome += np.outer(design[name], curve)
+    if spec.missing_outcome > 0:
+        outcome[rng.random(outcome.shape) < spec.missing_outcome] = np.nan
+    sessions = np.arange(1, spec.n_sessions + 1)
+    trials = np.arange(1, spec.n_trials + 1)
+    frame = pd.DataFrame(
+        {
+            "id": subject,
+            "session": np.repeat(sessions, spec.n_trials),
+            "trial": np.tile(trials, spec.n_sessions),
+            **covariates,
+        }
+    )
+    keep = rng.random(n) >= spec.missing_trials
+    return frame[keep], outcome[keep]
+
+
+def iter_synthetic(
+    spec: SyntheticSpec, chunk_subjects: int = 100
+) -> Iterator[tuple[pd.DataFrame, np.ndarray]]:
+    """
+    Generate a dataset a few subjects at a time.
+
+    Parameters
+    ----------
+    spec : SyntheticSpec
+        What to generate.
+    chunk_subjects : int, optional
+        Subjects per chunk. Default is 100.
+
+    Yields
+    ------
+    tuple[pd.DataFrame, np.ndarray]
+        Covariates (`id`, `session`, `trial` and the covariates) and the
+        matching (rows, L) outcome matrix of each chunk.
+    """
+    curves = spec._curves()
+    for start in range(1, spec.n_subjects + 1, chunk_subjects):
+        stop = min(start + chunk_subjects, spec.n_subjects + 1)
+        parts = [_subject_frame(spec, curves, i) for i in range(start, stop)]
+        yield (
+            pd.concat([frame for frame, _ in parts], ignore_index=True),
+            np.concatenate([outcome for _, outcome in parts]),
+        )
+
+
+def _outcome_columns(spec: SyntheticSpec) -> list[str]:
+    return [f"{spec.outcome_name}.{i}" for i in range(1, spec.L + 1)]
+
+
+def make_synthetic(
+    spec: SyntheticSpec | None = None, wide: bool = True, **kwargs
+) -> pd.DataFrame | tuple[pd.DataFrame, np.ndarray]:
+    """
+    Generate a synthetic dataset in memory.
+
+    Parameters
+    ----------
+    spec : SyntheticSpec or None, optional
+        What to generate. Default is None, which builds a spec from
+        `kwargs`.
+    wide : bool, optional
+        Whether to return one wide frame with `photometry.1..L` columns,
+        as read from a CSV. If False, return the covariates and the
+        outcome matrix, which `fmm_run.fui` accepts as
+        `fui(covariates, formula, outcome=outcome)`. Default is True.
+    **kwargs
+        Fields of `SyntheticSpec`, if `spec` is None.
+
+    Returns
+    -------
+    pd.DataFrame or tuple[pd.DataFrame, np.ndarray]
+        The dataset.
+
+    Examples
+    --------
+    >>> df = make_synthetic(n_subjects=40, n_trials=200, L=500, seed=1)
+    >>> mod = fui(df, "photometry ~ cs + (1 | id)")
+    """
+    if spec is None:
+        spec = SyntheticSpec(**kwargs)
+    chunks = list(iter_synthetic(spec))
+    covariates = pd.concat([c for c, _ in chunks], ignore_index=True)
+    outcome = np.concatenate([o for _, o in chunks])
+    if not wide:
+        return covariates, outcome
+    return pd.concat(
+        [
+            covariates,
+            pd.DataFrame(outcome, columns=_outcome_columns(spec)),
+        ],
+        axis=1,
+    )
+
+
+def write_synthetic(
+    path: Path | str,
+    spec: SyntheticSpec | None = None,
+    format: str | None = None,
+    chunk_subjects: int = 100,
+    **kwargs,
+) -> Path:
+    """
+    Write a synthetic dataset to disk, a few subjects at a time.
+
+    Parameters
+    ----------
+    path : Path or str
+        Output file or directory.
+    spec : SyntheticSpec or None, optional
+        What to generate. Default is None, which builds a spec from
+        `kwargs`.
+    format : str or None, optional
+        "csv" for a wide CSV like `tests/data/anova_data.csv`, "parquet"
+        for the same frame as Parquet (needs pyarrow or fastparquet and
+        is written in one piece), or "npy" for a directory with a
+        column-major `outcome.npy`, `covariates.pkl` and `meta.json`,
+        read back by `load_synthetic`. Default is None, which uses the
+        suffix of `path` and "npy" for paths without one.
+    chunk_subjects : int, optional
+        Subjects generated at a time for "csv" and "npy", which bounds
+        memory use. Default is 100.
+    **kwargs
+        Fields of `SyntheticSpec`, if `spec` is None.
+
+    Returns
+    -------
+    Path
+        `path`.
+
+    Raises
+    ------
+    ValueError
+        If the format is unknown.
+    """
+    if spec is None:
+        spec = SyntheticSpec(**kwargs)
+    path = Path(path)
+    if format is None:
+        format = path.suffix.lstrip(".").lower() or "npy"
+    columns = _outcome_columns(spec)
+    if format == "parquet":
+        make_synthetic(spec).to_parquet(path, index=False)
+    elif format == "csv":
+        with open(path, "w", newline="") as f:
+            for i, (covariates, outcome) in enumerate(
+                iter_synthetic(spec, chunk_subjects)
+            ):
+                chunk = pd.concat(
+                    [covariates, pd.DataFrame(outcome, columns=columns)],
+                    axis=1,
+                )
+                chunk.to_csv(f, header=i == 0, index=False)
+    elif format == "npy":
+        path.mkdir(parents=True, exist_ok=True)
+        chunks = iter_synthetic(spec, chunk_subjects)
+        # the row count depends on the dropped trials, so the chunks are
+        # appended to a raw file and moved into a Fortran-ordered array
+        covariate_chunks = []
+        raw_path = path / "outcome.raw"
+        with open(raw_path, "wb") as f:
+            for covariates, outcome in chunks:
+                covariate_chunks.append(covariates)
+                f.write(np.ascontiguousarray(outcome).tobytes())
+        covariates = pd.concat(covariate_chunks, ignore_index=True)
+        raw = np.memmap(
+            raw_path,
+            dtype=np.float64,
+            mode="r",
+            shape=(len(covariates), spec.L),
+        )
+        out = np.lib.format.open_memmap(
+            path / "outcome.npy",
+            mode="w+",
+            dtype=np.float64,
+            shape=raw.shape,
+            fortran_order=True,
+        )
+        for start in range(0, spec.L, 64):
+            out[:, start : start + 64] = raw[:, start : start + 64]
+        out.flush()
+        del out, raw
+        raw_path.unlink()
+        _atomic_write(path / "covariates.pkl", covariates.to_pickle)
+        _atomic_write(
+            path / "meta.json",
+            lambda tmp: tmp.write_text(json.dumps(spec.options())),
+        )
+    else:
+        raise ValueError(f"unknown format {format!r}")
+    return path
+
+
+def load_synthetic(path: Path | str) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Read a dataset written by `write_synthetic` in "npy" format.
+
+    Parameters
+    ----------
+    path : Path or str
+        Directory written by `write_synthetic`.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, np.ndarray]
+        The covariates and the read-only memory-mapped (n, L) outcome
+        matrix, for `fui(covariates, formula, outcome=outcome)`.
+    """
+    path = Path(path)
+    covariates = pd.read_pickle(path / "covariates.pkl")
+    outcome = np.load(path / "outcome.npy", mmap_mode="r")
+    return covariates, outcome
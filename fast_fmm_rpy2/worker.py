@@ -0,0 +1,535 @@
+"""
+Long-lived R worker that keeps R and fastFMM loaded between `fui` calls.
+
+Starting embedded R and running `library(fastFMM)` dominates the wall time
+of short jobs. The worker pays that cost once; clients then talk to it over
+a Unix socket (or the worker's stdin/stdout) with length-prefixed pickle
+frames, and receive R-free results (see `fmm_run.fui_result_to_dict`).
+This module does not import rpy2 on the client side.
+
+Start a worker from the shell with::
+
+    python -m fast_fmm_rpy2.worker --socket /tmp/fast_fmm_rpy2.sock
+"""
+
+import argparse
+import os
+import pickle
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+import pandas as pd
+
+_HEADER = struct.Struct(">Q")
+
+
+class WorkerError(RuntimeError):
+    """Raised when the worker cannot be reached or a request fails."""
+
+
+def default_socket_path() -> Path:
+    """
+    Get the per-user socket path used when none is given.
+
+    Returns
+    -------
+    Path
+        `$FAST_FMM_RPY2_WORKER_SOCKET` if set, else
+        `<tempdir>/fast_fmm_rpy2-<uid>.sock`.
+    """
+    env = os.environ.get("FAST_FMM_RPY2_WORKER_SOCKET")
+    if env:
+        return Path(env)
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return Path(tempfile.gettempdir()) / f"fast_fmm_rpy2-{uid}.sock"
+
+
+def _read_exact(stream: BinaryIO, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = stream.read(n - len(buf))
+        if not chunk:
+            raise EOFError("worker connection closed mid-frame")
+        buf += chunk
+    return bytes(buf)
+
+
+def send_frame(stream: BinaryIO, obj) -> None:
+    """
+    Write one length-prefixed pickle frame.
+
+    Parameters
+    ----------
+    stream : BinaryIO
+        Writable binary stream, e.g. `socket.makefile("wb")`.
+    obj : object
+        Picklable payload. NumPy arrays and pandas frames are sent as raw
+        buffers (pickle protocol 5).
+    """
+    payload = pickle.dumps(obj, protocol=5)
+    stream.write(_HEADER.pack(len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+
+def recv_frame(stream: BinaryIO):
+    """
+    Read one length-prefixed pickle frame.
+
+    Parameters
+    ----------
+    stream : BinaryIO
+        Readable binary stream.
+
+    Returns
+    -------
+    object
+        The unpickled payload.
+
+    Raises
+    ------
+    EOFError
+        If the stream ends before a complete frame was read.
+    """
+    header = stream.read(_HEADER.size)
+    if not header:
+        raise EOFError("worker connection closed")
+    if len(header) < _HEADER.size:
+        header += _read_exact(stream, _HEADER.size - len(header))
+    (size,) = _HEADER.unpack(header)
+    return pickle.loads(_read_exact(stream, size))
+
+
+def run_fui_job(job: dict, progress: Callable | None = None):
+    """
+    Fit one model in this process and return an R-free result.
+
+    Parameters
+    ----------
+    job : dict
+        Arguments of `fmm_run.fui`; `csv_filepath` and `formula` are
+        required.
+    progress : callable or None, optional
+        Passed to `fmm_run.fui`. Default is None.
+
+    Returns
+    -------
+    object
+        The fitted model converted by `fmm_run.fui_result_to_dict`. Fields
+        moved to disk with `betaHat_var_path` are returned as the Path of
+        their `.npy` file, so the array does not travel through the pipe.
+    """
+    from fast_fmm_rpy2 import fmm_run
+
+    job = dict(job)
+    # None stands for R's NULL, which is what fui defaults these to
+    for key in ("argvals", "nknots_min", "subj_id", "n_cores"):
+        if key in job and job[key] is None:
+            del job[key]
+    if progress is not None:
+        job["progress"] = progress
+    mod = fmm_run.fui(job.pop("csv_filepath"), job.pop("formula"), **job)
+    result = fmm_run.fui_result_to_dict(mod)
+    if isinstance(result, dict):
+        for name, value in result.items():
+            if isinstance(value, np.memmap):
+                result[name] = Path(value.filename)
+    return result
+
+
+def _handle(
+    request: dict, emit: Callable[[dict], None] | None = None
+) -> tuple[dict, bool]:
+    # emit sends intermediate frames, e.g. progress events, before the
+    # response
+    op = request.get("op")
+    try:
+        if op == "fui":
+            progress = None
+            if request.get("progress") and emit is not None:
+
+                def progress(event):
+                    emit({"event": event})
+
+            result = run_fui_job(request["job"], progress)
+        elif op == "ping":
+            from fast_fmm_rpy2.fmm_run import get_fastfmm_version
+
+            result = {
+                "pid": os.getpid(),
+                "fastfmm_version": str(get_fastfmm_version()),
+            }
+        elif op == "shutdown":
+            return {"ok": True, "result": None}, True
+        else:
+            raise ValueError(f"unknown worker op: {op!r}")
+    except Exception as exc:
+        response = {"ok": False, "traceback": traceback.format_exc()}
+        try:
+            pickle.dumps(exc)
+            response["error"] = exc
+        except Exception:
+            response["error"] = WorkerError(f"{type(exc).__name__}: {exc}")
+        return response, False
+    return {"ok": True, "result": result}, False
+
+
+def _serve_stream(rfile: BinaryIO, wfile: BinaryIO) -> bool:
+    # serve frames until EOF; True if a shutdown was requested
+    while True:
+        try:
+            request = recv_frame(rfile)
+        except EOFError:
+            return False
+        response, stop = _handle(request, partial(send_frame, wfile))
+        send_frame(wfile, response)
+        if stop:
+            return True
+
+
+def _preload() -> None:
+    from rpy2.robjects.packages import importr  # type: ignore
+
+    importr("fastFMM")
+
+
+def serve(socket_path: Path | None = None) -> None:
+    """
+    Serve `fui` requests on a Unix socket until a shutdown request.
+
+    R and fastFMM are loaded before the socket starts listening, so a
+    successful connection means the worker is ready. Connections are
+    served one at a time because embedded R is single-threaded; each
+    connection may send any number of requests.
+
+    Parameters
+    ----------
+    socket_path : Path or None, optional
+        Socket to listen on. Default is `default_socket_path()`.
+
+    Raises
+    ------
+    WorkerError
+        If another worker is already listening on `socket_path`.
+    """
+    socket_path = Path(socket_path or default_socket_path())
+    if socket_path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()  # stale socket of a dead worker
+        else:
+            raise WorkerError(f"a worker is already serving {socket_path}")
+        finally:
+            probe.close()
+    _preload()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        old_umask = os.umask(0o177)  # socket readable by this user only
+        try:
+            server.bind(str(socket_path))
+        finally:
+            os.umask(old_umask)
+        server.listen()
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile("rb") as rfile:
+                with conn.makefile("wb") as wfile:
+                    if _serve_stream(rfile, wfile):  # type: ignore[arg-type]
+                        break
+    finally:
+        server.close()
+        socket_path.unlink(missing_ok=True)
+
+
+def serve_stdio() -> None:
+    """
+    Serve `fui` requests over stdin/stdout until EOF or shutdown.
+
+    R's console output is redirected to stderr so it cannot corrupt the
+    frames written to stdout.
+    """
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    _preload()
+    with protocol_out:
+        _serve_stream(sys.stdin.buffer, protocol_out)
+
+
+class WorkerClient:
+    """
+    Thin client for a worker; `fui` mirrors `fmm_run.fui`.
+
+    Parameters
+    ----------
+    socket_path : Path or None, optional
+        Socket of the worker. Default is `default_socket_path()`.
+    stdio : bool, optional
+        If True, `start` spawns a private worker talking over its
+        stdin/stdout instead of a socket; it exits with the client.
+        Default is False.
+    timeout : float or None, optional
+        Socket timeout in seconds for a single request. Default is None
+        (wait for as long as the fit takes).
+
+    Examples
+    --------
+    >>> with WorkerClient().start() as client:
+    ...     mod = client.fui(Path("tests/data/binary.csv"),
+    ...                      "photometry ~ cs + (1 | id)")
+    >>> mod["betaHat"].shape
+    """
+
+    def __init__(
+        self,
+        socket_path: Path | None = None,
+        stdio: bool = False,
+        timeout: float | None = None,
+    ):
+        self.socket_path = Path(socket_path or default_socket_path())
+        self.stdio = stdio
+        self.timeout = timeout
+        self._proc: subprocess.Popen | None = None
+
+    def __enter__(self) -> "WorkerClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _command(self) -> list[str]:
+        cmd = [sys.executable, "-m", "fast_fmm_rpy2.worker"]
+        if self.stdio:
+            return cmd + ["--stdio"]
+        return cmd + ["--socket", str(self.socket_path)]
+
+    def start(self, wait: float = 300.0) -> "WorkerClient":
+        """
+        Connect to a running worker, spawning one if none is listening.
+
+        Parameters
+        ----------
+        wait : float, optional
+            Seconds to wait for a new worker to load R and fastFMM.
+            Default is 300.
+
+        Returns
+        -------
+        WorkerClient
+            This client, for chaining.
+
+        Raises
+        ------
+        WorkerError
+            If a spawned worker exits or is not ready within `wait`.
+        """
+        if self.stdio:
+            if self._proc is None:
+                self._proc = subprocess.Popen(
+                    self._command(),
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+            return self
+        if self.is_running():
+            return self
+        proc = subprocess.Popen(
+            self._command(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + wait
+        while not self.is_running():
+            if proc.poll() is not None:
+                raise WorkerError(
+                    f"worker exited with status {proc.returncode}"
+                )
+            if time.monotonic() > deadline:
+                proc.kill()
+                raise WorkerError(f"worker not ready after {wait} s")
+            time.sleep(0.05)
+        return self
+
+    def is_running(self) -> bool:
+        """
+        Check whether a worker is accepting connections.
+
+        Returns
+        -------
+        bool
+            True if the socket accepts connections (or the private stdio
+            worker is alive).
+        """
+        if self.stdio:
+            return self._proc is not None and self._proc.poll() is None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(str(self.socket_path))
+        except OSError:
+            return False
+        return True
+
+    def _request(self, request: dict, progress: Callable | None = None):
+        def receive(rfile: BinaryIO) -> dict:
+            # pass progress frames on until the response arrives
+            while "event" in (frame := recv_frame(rfile)):
+                if progress is not None:
+                    progress(frame["event"])
+            return frame
+
+        if self.stdio:
+            if self._proc is None:
+                self.start()
+            assert self._proc is not None
+            try:
+                send_frame(self._proc.stdin, request)  # type: ignore
+                response = receive(self._proc.stdout)  # type: ignore
+            except (EOFError, OSError) as e:
+                raise WorkerError(f"worker process died: {e}") from e
+        else:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(self.timeout)
+                    sock.connect(str(self.socket_path))
+                    with sock.makefile("wb") as wfile:
+                        send_frame(wfile, request)  # type: ignore[arg-type]
+                    with sock.makefile("rb") as rfile:
+                        response = receive(rfile)  # type: ignore
+            except (EOFError, OSError) as e:
+                raise WorkerError(
+                    f"cannot reach worker at {self.socket_path}: {e}"
+                ) from e
+        if not response["ok"]:
+            error = response["error"]
+            error.__cause__ = WorkerError(
+                f"\n\nRemote traceback:\n{response['traceback']}"
+            )
+            raise error
+        return response["result"]
+
+    def ping(self) -> dict:
+        """
+        Check that the worker can answer requests.
+
+        Returns
+        -------
+        dict
+            The worker's `pid` and `fastfmm_version`.
+        """
+        return self._request({"op": "ping"})
+
+    def fui(
+        self,
+        csv_filepath: Path | pd.DataFrame | None,
+        formula: str,
+        parallel: bool = True,
+        r_var_name: str | None = "py_dat",
+        outcome: np.ndarray | None = None,
+        progress: Callable | None = None,
+        **kwargs,
+    ) -> dict:
+        """
+        Fit a model in the worker; see `fmm_run.fui` for the arguments.
+
+        Paths are resolved on the client, so relative paths work even if
+        the worker runs in another directory. R's `NULL` defaults are
+        spelled as None. `import_rules` and `result_cache` are not
+        supported because they cannot cross the process boundary.
+        `progress` is called in this process with the `ProgressEvent`s the
+        worker captures from R's console.
+
+        Returns
+        -------
+        dict
+            The fitted model as converted by `fmm_run.fui_result_to_dict`.
+
+        Raises
+        ------
+        TypeError
+            If `import_rules` or `result_cache` is given.
+        WorkerError
+            If the worker cannot be reached. Errors raised by `fui` inside
+            the worker are re-raised with the remote traceback attached.
+        """
+        for unsupported in ("import_rules", "result_cache"):
+            if unsupported in kwargs:
+                raise TypeError(
+                    f"{unsupported} is not supported by the worker"
+                )
+        if csv_filepath is not None and not isinstance(
+            csv_filepath, pd.DataFrame
+        ):
+            csv_filepath = Path(csv_filepath).absolute()
+        job = dict(
+            csv_filepath=csv_filepath,
+            formula=formula,
+            parallel=parallel,
+            r_var_name=r_var_name,
+            outcome=outcome,
+            **kwargs,
+        )
+        return self._request(
+            {"op": "fui", "job": job, "progress": progress is not None},
+            progress,
+        )
+
+    def shutdown(self) -> None:
+        """Ask the worker to exit once the current request is served."""
+        self._request({"op": "shutdown"})
+        if self._proc is not None:
+            self._proc.wait()
+            self._proc = None
+
+    def close(self) -> None:
+        """
+        Release the client. A private stdio worker is stopped; a socket
+        worker keeps running for other clients.
+        """
+        if self._proc is None:
+            return
+        for stream in (self._proc.stdin, self._proc.stdout):
+            if stream is not None:
+                stream.close()
+        self._proc.wait()
+        self._proc = None
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m fast_fmm_rpy2.worker",
+        description="Keep R and fastFMM loaded and serve fui requests.",
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        help="Unix socket to listen on (default: per-user temp socket)",
+    )
+    group.add_argument(
+        "--stdio",
+        action="store_true",
+        help="serve a single client over stdin/stdout",
+    )
+    args = parser.parse_args(argv)
+    if args.stdio:
+        serve_stdio()
+    else:
+        serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
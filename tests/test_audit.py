@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.audit import (
+    audit_precision,
+    outcome_columns,
+    ulp_distance,
+)
+
+
+def test_ulp_distance_counts_adjacent_floats():
+    x = np.array([1.0, -1.0, 0.0, 1e300])
+    assert ulp_distance(x, x).tolist() == [0, 0, 0, 0]
+    assert ulp_distance(x, np.nextafter(x, np.inf)).tolist() == [1, 1, 1, 1]
+    assert ulp_distance([0.0], [-0.0]).tolist() == [0]
+    tiny = np.nextafter(0.0, 1.0)
+    assert ulp_distance([-tiny], [tiny]).tolist() == [2]
+
+
+def test_ulp_distance_beyond_int64():
+    distance = ulp_distance([-np.finfo(float).max], [np.finfo(float).max])
+    assert distance.dtype == np.uint64
+    assert int(distance[0]) > np.iinfo(np.int64).max
+
+
+def test_audit_precision_identical():
+    df = pd.DataFrame({"photometry.1": [1.0, np.nan], "photometry.2": [2, 3]})
+    audit = audit_precision(df, df.to_numpy(), ulp=True)
+    assert audit.ok
+    assert audit.mismatches.empty
+    assert list(audit.mismatches.columns) == [
+        "row",
+        "column",
+        "expected",
+        "actual",
+        "abs_diff",
+        "rel_diff",
+        "ulp",
+    ]
+    assert audit.summary["n_cells"] == 4
+    assert audit.summary["n_identical"] == 4
+    assert audit.summary["max_ulp"] == 0
+
+
+def test_audit_precision_reports_only_mismatches():
+    rng = np.random.default_rng(0)
+    expected = rng.normal(size=(50, 20))
+    actual = expected.copy()
+    actual[3, 7] += 1.0
+    actual[10, 2] = np.nan
+    actual[0, 0] = np.nextafter(actual[0, 0], np.inf)
+    columns = [f"photometry.{j + 1}" for j in range(20)]
+    audit = audit_precision(expected, actual, columns=columns, ulp=True)
+    assert not audit.ok
+    mismatches = audit.mismatches
+    assert list(zip(mismatches["row"], mismatches["column"])) == [
+        (3, "photometry.8"),
+        (10, "photometry.3"),
+    ]
+    assert mismatches["abs_diff"].iloc[0] == pytest.approx(1.0)
+    assert mismatches["ulp"].isna().tolist() == [False, True]
+    summary = audit.summary
+    assert summary["n_mismatched"] == 2
+    assert summary["n_nan_mismatched"] == 1
+    assert summary["n_identical"] == 1000 - 3
+    assert summary["max_abs_diff"] == pytest.approx(1.0)
+    assert summary["max_ulp"] == int(mismatches["ulp"].iloc[0])
+
+
+def test_audit_precision_tolerances_and_nan():
+    expected = np.array([[1.0, np.nan]])
+    actual = np.array([[1.001, np.nan]])
+    assert not audit_precision(expected, actual).ok
+    assert audit_precision(expected, actual, rtol=1e-2).ok
+    assert not audit_precision(expected, actual, rtol=1e-2, equal_nan=False).ok
+
+
+def test_audit_precision_shape_mismatch():
+    with pytest.raises(ValueError):
+        audit_precision(np.zeros((2, 3)), np.zeros((3, 2)))
+
+
+def test_outcome_columns():
+    df = pd.DataFrame(columns=["id", "photometry.1", "photometry.2", "cs"])
+    assert outcome_columns(df) == ["photometry.1", "photometry.2"]
+    assert outcome_columns(df, "dff") == []
@@ -0,0 +1,86 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fast_fmm_rpy2.batch import FuiJob, fit_batch, run_batch
+
+
+def _square(x: int) -> int:
+    if x < 0:
+        raise ValueError("negative")
+    return x * x
+
+
+def _crash_once(marker: Path) -> str:
+    if not marker.exists():
+        marker.touch()
+        os._exit(1)
+    return "recovered"
+
+
+def test_run_batch_streams_all_results():
+    results = list(run_batch(range(10), _square, max_workers=2))
+    assert sorted(res.index for res in results) == list(range(10))
+    assert all(res.ok and res.result == res.job**2 for res in results)
+
+
+def test_run_batch_reports_errors_without_retrying():
+    results = {res.index: res for res in run_batch([2, -1], _square, 1)}
+    assert results[0].result == 4
+    assert isinstance(results[1].error, ValueError)
+    assert results[1].attempts == 1
+    assert not results[1].ok
+
+
+def test_run_batch_retries_dead_workers(tmp_path: Path):
+    (res,) = run_batch([tmp_path / "marker"], _crash_once, max_workers=1)
+    assert res.ok and res.result == "recovered"
+    assert res.attempts == 2
+
+
+def test_run_batch_gives_up_after_retries(tmp_path: Path):
+    jobs = [tmp_path / "marker"]
+    (res,) = run_batch(jobs, _crash_once, max_workers=1, retries=0)
+    assert isinstance(res.error, BrokenProcessPool)
+
+
+def test_run_batch_bounds_pending_jobs():
+    consumed = []
+
+    def jobs():
+        for i in range(20):
+            consumed.append(i)
+            yield i
+
+    stream = run_batch(jobs(), _square, max_workers=1, max_pending=3)
+    next(stream)
+    assert len(consumed) <= 4
+    stream.close()
+
+
+def test_fui_job_rejects_local_only_arguments():
+    job = FuiJob("data.csv", "y ~ x", {"result_cache": None})
+    with pytest.raises(TypeError):
+        job.to_job()
+    assert FuiJob("data.csv", "y ~ x").to_job()["csv_filepath"].is_absolute()
+
+
+def test_fit_batch_matches_fui():
+    from fast_fmm_rpy2.fmm_run import fui, fui_result_to_dict
+
+    csv_filepath = Path("tests/data/binary.csv")
+    formulas = ["photometry ~ cs + (1 | id)", "photometry ~ cs + (cs | id)"]
+    jobs = [
+        FuiJob(csv_filepath, formula, {"parallel": False}, tag=formula)
+        for formula in formulas
+    ]
+    results = list(fit_batch(jobs, max_workers=2))
+    assert all(res.ok for res in results)
+    for res in results:
+        expected = fui_result_to_dict(
+            fui(csv_filepath, res.job.tag, parallel=False)
+        )
+        np.testing.assert_allclose(res.result["betaHat"], expected["betaHat"])
@@ -0,0 +1,187 @@
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.bootstrap import (
+    ShardQueue,
+    fui_bootstrap,
+    grouping_variable,
+    merge_replicates,
+    plan_shards,
+    resample_clusters,
+)
+from fast_fmm_rpy2.result import FuiResult
+
+FORMULA = "photometry ~ cs + (1 | id)"
+
+
+def _estimate(p: int = 2, L: int = 5) -> dict:
+    beta = pd.DataFrame(np.zeros((p, L)), index=[f"b{r}" for r in range(p)])
+    return {"betaHat": beta, "argvals": np.arange(1, L + 1)}
+
+
+def test_plan_shards_covers_replicates():
+    shards = plan_shards(10, 3, seed=7)
+    assert [(s.start, s.stop) for s in shards] == [(0, 3), (3, 7), (7, 10)]
+    assert sum(s.n_boots for s in shards) == 10
+    assert {s.seed for s in shards} == {7}
+    assert len(plan_shards(2, 5)) == 2
+    with pytest.raises(ValueError):
+        plan_shards(0, 1)
+
+
+def test_grouping_variable():
+    assert grouping_variable(FORMULA) == "id"
+    assert grouping_variable("y ~ x + (x | site) + (1 | subj.id)") == "subj.id"
+    with pytest.raises(ValueError):
+        grouping_variable("y ~ x")
+
+
+def test_resample_clusters_keeps_subjects_together():
+    groups = np.array(["a", "b", "a", "c", "b", "a"])
+    rows, ids = resample_clusters(groups, seed=1, replicate=3)
+    again, _ = resample_clusters(groups, seed=1, replicate=3)
+    np.testing.assert_array_equal(rows, again)
+    assert ids.max() == 3
+    for new_id in np.unique(ids):
+        drawn = groups[rows[ids == new_id]]
+        assert len(set(drawn)) == 1
+        assert len(drawn) == np.count_nonzero(groups == drawn[0])
+    others = [resample_clusters(groups, 1, b)[0] for b in range(20)]
+    assert any(not np.array_equal(rows, other) for other in others)
+
+
+def test_merge_replicates_is_independent_of_sharding():
+    rng = np.random.default_rng(0)
+    boots = rng.normal(size=(40, 2, 5))
+    whole = merge_replicates(_estimate(), [boots])
+    split = merge_replicates(_estimate(), [boots[:13], boots[13:]])
+    np.testing.assert_array_equal(whole["qn"], split["qn"])
+    np.testing.assert_array_equal(whole["betaHat_var"], split["betaHat_var"])
+    assert whole["betaHat_var"].shape == (5, 5, 2)
+    np.testing.assert_allclose(
+        whole["betaHat_var"][:, :, 1], np.cov(boots[:, 1, :], rowvar=False)
+    )
+    assert whole["n_boots"] == 40
+    # the joint band is wider than the pointwise one
+    assert (whole["qn"] > 1.5).all()
+
+
+def test_merge_replicates_leaves_out_failed_replicates():
+    rng = np.random.default_rng(0)
+    boots = rng.normal(size=(20, 2, 5))
+    failed = boots.copy()
+    failed[[3, 11]] = np.nan
+    with pytest.warns(UserWarning, match="2 of 20"):
+        mod = merge_replicates(_estimate(), [failed[:10], failed[10:]])
+    expected = merge_replicates(_estimate(), [np.delete(boots, [3, 11], 0)])
+    assert mod["n_boots"] == 18
+    np.testing.assert_array_equal(mod["failed_replicates"], [3, 11])
+    np.testing.assert_array_equal(mod["qn"], expected["qn"])
+
+
+def test_merged_result_plots_without_r(tmp_path: Path):
+    from fast_fmm_rpy2.plot_fui import compute_plot_data
+
+    boots = np.random.default_rng(1).normal(size=(20, 2, 5))
+    mod = merge_replicates(_estimate(), [boots])
+    data = compute_plot_data(FuiResult.load(mod.save(tmp_path)))
+    assert list(data) == ["b0", "b1"]
+    assert (data["b0"]["upper_joint"] > data["b0"]["upper"]).all()
+
+
+def _write_outputs(queue: ShardQueue, rng) -> None:
+    FuiResult._from_fields(_estimate()).save(
+        queue.directory / "estimate", ["betaHat", "argvals"]
+    )
+    for shard in queue.shards:
+        np.save(
+            queue.directory / f"{shard.name}.npy",
+            rng.normal(size=(shard.n_boots, 2, 5)),
+        )
+
+
+def test_shard_queue_lifecycle(tmp_path: Path):
+    queue = ShardQueue.create(
+        tmp_path / "queue", "data.csv", FORMULA, n_boots=10, n_shards=3
+    )
+    assert queue.tasks() == [
+        "estimate",
+        "shard-0000",
+        "shard-0001",
+        "shard-0002",
+    ]
+    assert set(queue.status().values()) == {"pending"}
+    with pytest.raises(FileExistsError):
+        ShardQueue.create(tmp_path / "queue", "data.csv", FORMULA)
+    assert queue._claim("shard-0001")
+    assert not queue._claim("shard-0001")
+    assert queue.status()["shard-0001"] == "running"
+    assert queue.release_stale(3600) == []
+    old = time.time() - 7200
+    os.utime(queue._lock("shard-0001"), (old, old))
+    assert queue.release_stale(3600) == ["shard-0001"]
+    assert queue.status()["shard-0001"] == "pending"
+    with pytest.raises(RuntimeError):
+        queue.merge()
+    _write_outputs(queue, np.random.default_rng(2))
+    assert set(ShardQueue(queue.directory).status().values()) == {"done"}
+    mod = queue.merge()
+    assert mod["n_boots"] == 10
+    assert mod.metadata["bootstrap"]["subj_id"] == "id"
+
+
+def test_shard_queue_rejects_unserializable_kwargs(tmp_path: Path):
+    with pytest.raises(TypeError):
+        ShardQueue.create(tmp_path, "data.csv", FORMULA, argvals=object())
+
+
+@pytest.mark.parametrize(
+    "n_shards, processes", [(None, None), (3, None), (None, 2)]
+)
+def test_fui_bootstrap_is_reproducible(n_shards, processes):
+    csv_filepath = Path("tests/data/binary.csv")
+    expected = fui_bootstrap(
+        csv_filepath, FORMULA, n_boots=6, seed=3, parallel=False
+    )
+    mod = fui_bootstrap(
+        csv_filepath,
+        FORMULA,
+        n_boots=6,
+        seed=3,
+        n_shards=n_shards,
+        processes=processes,
+        parallel=False,
+    )
+    np.testing.assert_array_equal(mod["qn"], expected["qn"])
+    np.testing.assert_array_equal(mod["betaHat_var"], expected["betaHat_var"])
+
+
+def test_fui_bootstrap_reads_data_with_schema():
+    from rpy2 import robjects as ro  # type: ignore
+
+    from fast_fmm_rpy2.schema import IngestSchema
+
+    fui_bootstrap(
+        Path("tests/data/binary.csv"),
+        FORMULA,
+        n_boots=2,
+        parallel=False,
+        schema=IngestSchema(categorical=("id",)),
+    )
+    assert ro.r("is.factor(boot_dat$id)")[0]
+
+
+def test_shard_queue_work_matches_fui_bootstrap(tmp_path: Path):
+    csv_filepath = Path("tests/data/binary.csv")
+    queue = ShardQueue.create(
+        tmp_path, csv_filepath, FORMULA, n_boots=4, n_shards=2, parallel=False
+    )
+    assert queue.work(max_tasks=1) == ["estimate"]
+    assert queue.work() == ["shard-0000", "shard-0001"]
+    expected = fui_bootstrap(csv_filepath, FORMULA, n_boots=4, parallel=False)
+    np.testing.assert_allclose(queue.merge()["qn"], expected["qn"])
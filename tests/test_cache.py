@@ -0,0 +1,161 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.cache import (
+    FuiResultCache,
+    IngestCache,
+    file_digest,
+    fingerprint_array,
+    fingerprint_frame,
+)
+
+
+@pytest.fixture
+def binary_filepath() -> Path:
+    return Path(r"tests/data/binary.csv")
+
+
+@pytest.fixture
+def csv_copy(tmp_path: Path, binary_filepath: Path) -> Path:
+    path = tmp_path / "binary.csv"
+    path.write_bytes(binary_filepath.read_bytes())
+    return path
+
+
+def test_ingest_cache_roundtrip(tmp_path: Path, csv_copy: Path):
+    cache = IngestCache(tmp_path / "cache")
+    key = cache.key(csv_copy, float_precision="round_trip")
+    assert cache.get(key) is None
+
+    df = pd.read_csv(csv_copy, float_precision="round_trip")
+    df.index = range(1, len(df) + 1)  # type: ignore
+    cache.put(key, df)
+    cached = cache.get(key)
+    assert cached is not None
+    pd.testing.assert_frame_equal(cached, df)
+
+
+def test_ingest_cache_drops_corrupt_entries(tmp_path: Path, csv_copy: Path):
+    cache = IngestCache(tmp_path / "cache")
+    key = cache.key(csv_copy)
+    cache.put(key, pd.read_csv(csv_copy))
+    path = cache._entry_path(key)
+    path.write_bytes(path.read_bytes()[:100])
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_ingest_cache_key_tracks_content_and_options(
+    tmp_path: Path, csv_copy: Path
+):
+    cache = IngestCache(tmp_path / "cache")
+    key = cache.key(csv_copy, float_precision="round_trip")
+    assert key == cache.key(csv_copy, float_precision="round_trip")
+    assert key != cache.key(csv_copy, float_precision="high")
+
+    with open(csv_copy, "a") as f:
+        f.write("\n")
+    assert key != cache.key(csv_copy, float_precision="round_trip")
+
+
+def test_ingest_cache_reuses_digest(tmp_path: Path, csv_copy: Path):
+    cache = IngestCache(tmp_path / "cache")
+    cache.key(csv_copy)
+    index = (tmp_path / "cache" / "digests.json").read_text()
+    assert file_digest(csv_copy) in index
+
+
+def test_ingest_cache_evicts_least_recently_used(tmp_path: Path):
+    df = pd.DataFrame({"x": range(10_000)}, dtype="float64")
+    cache = IngestCache(tmp_path / "cache", max_bytes=10**9)
+    for key in ("a", "b", "c"):
+        cache.put(key, df)
+    # make "a" the most recently used entry
+    for i, key in enumerate(("b", "c", "a")):
+        os.utime(cache._entry_path(key), ns=(i, i))
+    entry_size = cache._entry_path("a").stat().st_size
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.get("a") is not None
+    assert cache.size() <= cache.max_bytes
+
+
+def test_ingest_cache_clear(tmp_path: Path):
+    cache = IngestCache(tmp_path / "cache")
+    cache.put("a", pd.DataFrame({"x": [1.0]}))
+    cache.clear()
+    assert cache.entries() == []
+
+
+def test_fingerprint_array_ignores_layout():
+    arr = np.arange(12, dtype=np.float64).reshape(3, 4)
+    assert fingerprint_array(arr) == fingerprint_array(np.asfortranarray(arr))
+    assert fingerprint_array(arr) != fingerprint_array(arr.reshape(4, 3))
+    changed = arr.copy()
+    changed[1, 2] += 1e-12
+    assert fingerprint_array(arr) != fingerprint_array(changed)
+
+
+def test_fingerprint_frame(binary_filepath: Path):
+    df = pd.read_csv(binary_filepath)
+    assert fingerprint_frame(df) == fingerprint_frame(df.copy())
+    assert fingerprint_frame(df) != fingerprint_frame(df.iloc[:-1])
+    assert fingerprint_frame(df) != fingerprint_frame(
+        df.astype({"cs": "float64"})
+    )
+
+
+def test_fui_result_cache_key():
+    kwargs = {"family": "gaussian", "n_boots": 500, "argvals": None}
+    key = FuiResultCache.key("abc", "photometry ~ cs + (1 | id)", kwargs, "1")
+    assert key == FuiResultCache.key(
+        "abc", "photometry ~ cs +  (1 | id)", dict(kwargs), "1"
+    )
+    assert key != FuiResultCache.key(
+        "abc", "photometry ~ cs + (1 | id)", {**kwargs, "n_boots": 100}, "1"
+    )
+    assert key != FuiResultCache.key(
+        "abc", "photometry ~ cs + (1 | id)", kwargs, "2"
+    )
+
+
+def test_fui_result_cache_tiers(tmp_path: Path):
+    cache = FuiResultCache(tmp_path, max_entries=1)
+    assert cache.get("a") is None
+    cache.put("a", {"betaHat": np.ones(3)})
+    cache.put("b", {"betaHat": np.zeros(3)})
+    # "a" fell out of memory but is still on disk
+    assert cache.stats.evictions == 1
+    result = cache.get("a")
+    assert result is not None and np.array_equal(result["betaHat"], np.ones(3))
+    assert cache.get("a") is result
+    assert cache.stats.disk_hits == 1
+    assert cache.stats.memory_hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.hit_rate == pytest.approx(2 / 3)
+
+    reopened = FuiResultCache(tmp_path)
+    assert reopened.get("b") is not None
+    reopened.clear()
+    assert reopened.get("b") is None
+
+
+def test_fui_result_cache_unpicklable_stays_in_memory(tmp_path: Path):
+    cache = FuiResultCache(tmp_path)
+    result = {"callback": lambda: None}
+    cache.put("a", result)
+    assert cache.entries() == []
+    assert cache.get("a") is result
+
+
+def test_fui_result_cache_memory_only(tmp_path: Path):
+    cache = FuiResultCache(tmp_path, disk=False)
+    cache.put("a", {"x": 1})
+    assert cache.entries() == []
+    assert cache.get("a") == {"x": 1}
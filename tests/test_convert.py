@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+from rpy2 import robjects as ro  # type: ignore
+from rpy2.robjects.conversion import localconverter  # type: ignore
+
+from fast_fmm_rpy2.convert import rpy2py_floatvector
+
+
+def r_eval(code: str):
+    with localconverter(ro.default_converter):
+        return ro.r(code)
+
+
+def test_unnamed_vector_is_a_view():
+    obj = r_eval("c(1.5, 2.5, 3.5)")
+    x = rpy2py_floatvector(obj)
+    assert isinstance(x, np.ndarray)
+    assert np.shares_memory(x, np.asarray(obj))
+    np.testing.assert_array_equal(x, [1.5, 2.5, 3.5])
+
+
+def test_array_keeps_dims_and_fortran_order():
+    obj = r_eval("array(as.numeric(1:24), c(2, 3, 4))")
+    x = rpy2py_floatvector(obj)
+    assert x.shape == (2, 3, 4)
+    assert x.flags.f_contiguous
+    # R's x[2, 3, 4] is its last element
+    assert x[1, 2, 3] == 24
+    np.testing.assert_array_equal(x.ravel(order="F"), np.arange(1, 25))
+
+
+def test_named_vector_is_a_series():
+    x = rpy2py_floatvector(r_eval("c(a = 1, b = 2)"))
+    pd.testing.assert_series_equal(x, pd.Series([1.0, 2.0], index=["a", "b"]))
+
+
+def test_matrix_with_dimnames_is_a_frame():
+    obj = r_eval(
+        "matrix(as.numeric(1:6), 2, dimnames = list(c('r1', 'r2'), "
+        + "c('a', 'b', 'c')))"
+    )
+    x = rpy2py_floatvector(obj)
+    expected = pd.DataFrame(
+        [[1.0, 3.0, 5.0], [2.0, 4.0, 6.0]],
+        index=["r1", "r2"],
+        columns=["a", "b", "c"],
+    )
+    pd.testing.assert_frame_equal(x, expected)
+
+
+def test_matrix_with_column_names_only():
+    obj = r_eval("matrix(c(1,2,3,4), 2, dimnames = list(NULL, c('a', 'b')))")
+    x = rpy2py_floatvector(obj)
+    assert isinstance(x, pd.DataFrame)
+    assert list(x.columns) == ["a", "b"]
+
+
+def test_matrix_with_row_names_only_stays_an_array():
+    obj = r_eval("matrix(c(1,2,3,4), 2, dimnames = list(c('a', 'b'), NULL))")
+    assert isinstance(rpy2py_floatvector(obj), np.ndarray)
@@ -15,11 +15,15 @@ from rpy2.robjects import pandas2ri  # type: ignore
 from rpy2.robjects.conversion import localconverter  # type: ignore
 from rpy2.robjects.vectors import BoolVector  # type: ignore
 
+from fast_fmm_rpy2.cache import FuiResultCache
 from fast_fmm_rpy2.fmm_run import (
     check_fastfmm_version,
+    fit_r_data,
     fui,
     get_fastfmm_version,
 )
+from fast_fmm_rpy2.result import FuiResult
+from fast_fmm_rpy2.schema import IngestSchema
 
 local_rules = ro.default_converter + pandas2ri.converter
 
@@ -182,6 +186,196 @@ def test_fui_compare(csv_filepath, formula, parallel, import_rules) -> None:
     )
 
 
+@pytest.mark.parametrize(
+    "formula",
+    ["photometry ~ cs + (1 | id)", "photometry ~ cs + (cs | id)"],
+)
+def test_fui_in_memory_matches_csv(formula) -> None:
+    csv_filepath = Path(r"tests/data/binary.csv")
+    csv_mod = fui(csv_filepath, formula, parallel=False, silent=True)
+
+    df = pd.read_csv(csv_filepath, float_precision="round_trip")
+    df_mod = fui(df, formula, parallel=False, silent=True)
+
+    photometry_cols = [c for c in df.columns if c.startswith("photometry.")]
+    matrix_mod = fui(
+        df.drop(columns=photometry_cols),
+        formula,
+        parallel=False,
+        silent=True,
+        outcome=df[photometry_cols].to_numpy(),
+    )
+    for mod in (df_mod, matrix_mod):
+        assert np.allclose(
+            np.asarray(mod.getbyname("betaHat")),
+            np.asarray(csv_mod.getbyname("betaHat")),
+        )
+        assert np.allclose(
+            np.asarray(mod.getbyname("qn")),
+            np.asarray(csv_mod.getbyname("qn")),
+        )
+
+
+def test_fui_outcome_requires_dataframe() -> None:
+    with pytest.raises(ValueError):
+        fui(
+            Path(r"tests/data/binary.csv"),
+            "photometry ~ cs + (1 | id)",
+            outcome=np.zeros((690, 3)),
+        )
+
+
+def test_fui_result_converts_fields_on_access() -> None:
+    mod = fui(
+        Path(r"tests/data/binary.csv"),
+        "photometry ~ cs + (1 | id)",
+        parallel=False,
+        silent=True,
+    )
+    assert isinstance(mod, FuiResult)
+    assert mod.converted == []
+    beta = mod.getbyname("betaHat")
+    assert mod["betaHat"] is beta
+    assert mod.converted == ["betaHat"]
+
+    n_vars, n_points = beta.shape
+    beta_var = mod.to_numpy("betaHat_var")
+    assert beta_var.shape == (n_points, n_points, n_vars)
+    assert "betaHat_var" not in mod.converted
+    assert np.allclose(mod.to_numpy("betaHat"), beta.to_numpy())
+    assert isinstance(mod.to_pandas("betaHat"), DataFrame)
+    assert mod.to_pandas("qn").shape == (n_vars,)
+    with pytest.raises(TypeError):
+        mod.to_pandas("betaHat_var")
+    with pytest.raises(KeyError):
+        mod["not_a_field"]
+
+
+def test_fui_return_fields() -> None:
+    csv_filepath = Path(r"tests/data/binary.csv")
+    formula = "photometry ~ cs + (1 | id)"
+    full = fui(csv_filepath, formula, parallel=False, silent=True)
+    mod = fui(
+        csv_filepath,
+        formula,
+        parallel=False,
+        silent=True,
+        return_fields=["betaHat", "qn", "not_a_field"],
+        float32=True,
+    )
+    assert set(mod.names()) == {"betaHat", "qn"}
+    beta = mod.getbyname("betaHat")
+    assert (beta.dtypes == np.float32).all()
+    assert np.allclose(beta, full.getbyname("betaHat"), rtol=1e-6)
+    assert mod.to_numpy("qn").dtype == np.float32
+
+
+def test_fit_r_data_matches_fui() -> None:
+    formula = "photometry ~ cs + (1 | id)"
+    full = fui(Path(r"tests/data/binary.csv"), formula, parallel=False)
+    mod = fit_r_data(
+        formula, "py_dat", return_fields="betaHat", parallel=False
+    )
+    assert mod.names() == ["betaHat"]
+    assert mod.spans == [] and mod.metadata == {}
+    assert np.allclose(mod["betaHat"], full["betaHat"])
+    with pytest.raises(TypeError, match="ingest_cache"):
+        fit_r_data(formula, ingest_cache=True)
+
+
+def test_fui_save_load(tmp_path: Path) -> None:
+    from fast_fmm_rpy2.result import FuiResult
+
+    csv_filepath = Path(r"tests/data/binary.csv")
+    mod = fui(csv_filepath, "photometry ~ cs + (1 | id)", parallel=False)
+    loaded = FuiResult.load(mod.save(tmp_path / "fit"))
+    assert loaded.metadata["formula"] == "photometry ~ cs + (1 | id)"
+    assert np.allclose(loaded["betaHat"], mod["betaHat"])
+    assert np.allclose(loaded["betaHat_var"], mod.to_numpy("betaHat_var"))
+
+
+def test_fui_fingerprints_data_at_fit_time(tmp_path: Path) -> None:
+    from fast_fmm_rpy2.fmm_run import data_fingerprint
+
+    formula = "photometry ~ cs + (1 | id)"
+    fui(Path(r"tests/data/binary.csv"), formula, parallel=False)
+    expected = data_fingerprint(None, r_var_name="py_dat")
+    mod = fui(None, formula, parallel=False)
+    # py_dat changes before the metadata is first read
+    ro.r("py_dat$cs <- rev(py_dat$cs)")
+    loaded = FuiResult.load(mod.save(tmp_path / "fit"))
+    assert loaded.metadata["data_fingerprint"] == expected
+
+
+def test_fui_betahat_var_path(tmp_path: Path) -> None:
+    csv_filepath = Path(r"tests/data/binary.csv")
+    formula = "photometry ~ cs + (1 | id)"
+    full = fui(csv_filepath, formula, parallel=False)
+    mod = fui(
+        csv_filepath,
+        formula,
+        parallel=False,
+        betaHat_var_path=tmp_path / "var.npy",
+    )
+    assert isinstance(mod["betaHat_var"], np.memmap)
+    assert np.allclose(mod["betaHat_var"], full.to_numpy("betaHat_var"))
+    assert np.allclose(
+        mod.var_diagonal(1), np.diag(full.to_numpy("betaHat_var")[:, :, 1])
+    )
+
+
+def test_fui_records_spans() -> None:
+    csv_filepath = Path(r"tests/data/binary.csv")
+    mod = fui(csv_filepath, "photometry ~ cs + (1 | id)", parallel=False)
+    names = [s.name for s in mod.spans]
+    for stage in ("ingest.read_csv", "ingest.pandas_to_r", "fui.fit", "fui"):
+        assert stage in names
+    fit = mod.spans[names.index("fui.fit")]
+    assert fit.parent == "fui" and fit.r_heap_bytes > 0
+    mod.getbyname("betaHat")
+    assert mod.spans[-1].attrs == {"field": "betaHat"}
+
+
+def test_fui_progress_events() -> None:
+    events = []
+    fui(
+        Path(r"tests/data/binary.csv"),
+        "photometry ~ cs + (1 | id)",
+        parallel=False,
+        silent=False,
+        progress=events.append,
+    )
+    steps = [e for e in events if e.kind == "step"]
+    assert steps[0].step == "1" and steps[0].stage == "univariate"
+    assert "smoothing" in {e.stage for e in steps}
+
+
+def test_fui_result_cache(tmp_path: Path) -> None:
+    csv_filepath = Path(r"tests/data/binary.csv")
+    formula = "photometry ~ cs + (1 | id)"
+    cache = FuiResultCache(tmp_path)
+    mod = fui(csv_filepath, formula, silent=True, result_cache=cache)
+    assert cache.stats.misses == 1
+    assert fui(csv_filepath, formula, silent=True, result_cache=cache) is mod
+    assert cache.stats.memory_hits == 1
+
+    df = pd.read_csv(csv_filepath, float_precision="round_trip")
+    fui(df, formula, silent=True, result_cache=cache)
+    fui(df, formula, silent=True, n_boots=100, result_cache=cache)
+    assert cache.stats.misses == 3
+
+    schema = IngestSchema(categorical=("id",))
+    fui(csv_filepath, formula, silent=True, result_cache=cache, schema=schema)
+    assert cache.stats.misses == 4
+    with pytest.raises(ValueError):
+        fui(
+            csv_filepath,
+            formula,
+            import_rules=local_rules,
+            result_cache=cache,
+        )
+
+
 def fui_lick_compare(formula, parallel, import_rules, var, silent) -> None:
     bool_map: dict = {True: "TRUE", False: "FALSE"}
     ro.r("library(fastFMM)")
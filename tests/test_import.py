@@ -0,0 +1,70 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# seconds the package may add on top of importing numpy and pandas, which
+# every module needs anyway; starting R alone takes several times this
+IMPORT_BUDGET_S = 0.5
+
+R_FREE_MODULES = [
+    "fast_fmm_rpy2",
+    "fast_fmm_rpy2.audit",
+    "fast_fmm_rpy2.batch",
+    "fast_fmm_rpy2.bootstrap",
+    "fast_fmm_rpy2.cache",
+    "fast_fmm_rpy2.ingest",
+    "fast_fmm_rpy2.instrument",
+    "fast_fmm_rpy2.plot_fui",
+    "fast_fmm_rpy2.progress",
+    "fast_fmm_rpy2.render",
+    "fast_fmm_rpy2.result",
+    "fast_fmm_rpy2.scheduler",
+    "fast_fmm_rpy2.schema",
+    "fast_fmm_rpy2.sidecar",
+    "fast_fmm_rpy2.sweep",
+    "fast_fmm_rpy2.synthetic",
+    "fast_fmm_rpy2.worker",
+]
+
+
+def _import_in_fresh_interpreter(module: str) -> dict:
+    code = f"""
+import json, sys, time
+import numpy, pandas
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(
+    name for name in sys.modules
+    if name.split(".")[0] in ("rpy2", "matplotlib")
+    or name == "fast_fmm_rpy2.fmm_run"
+)
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", R_FREE_MODULES)
+def test_import_does_not_load_r_or_matplotlib(module: str):
+    result = _import_in_fresh_interpreter(module)
+    assert result["heavy"] == []
+
+
+def test_import_time_budget():
+    # best of three to keep scheduler noise out of the measurement
+    elapsed = min(
+        _import_in_fresh_interpreter("fast_fmm_rpy2")["elapsed"]
+        for _ in range(3)
+    )
+    assert elapsed < IMPORT_BUDGET_S, (
+        f"import fast_fmm_rpy2 took {elapsed:.3f} s "
+        + f"(budget {IMPORT_BUDGET_S} s)"
+    )
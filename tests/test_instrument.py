@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from fast_fmm_rpy2.ingest import read_csv_cached
+from fast_fmm_rpy2.instrument import (
+    add_hook,
+    collect_spans,
+    remove_hook,
+    span,
+)
+
+
+def test_spans_nest_and_collect():
+    with collect_spans() as outer:
+        with span("outer", size=3):
+            with collect_spans() as inner, span("inner"):
+                sum(range(10_000))
+    assert [s.name for s in outer] == ["inner", "outer"]
+    assert [s.name for s in inner] == ["inner"]
+    assert outer[0].parent == "outer" and outer[1].parent is None
+    assert outer[1].attrs == {"size": 3}
+    assert outer[1].wall_s >= outer[0].wall_s >= 0
+    assert outer[1].options()["name"] == "outer"
+
+
+def test_hooks_receive_spans_even_on_error():
+    seen = []
+    hook = add_hook(seen.append)
+    try:
+        with pytest.raises(ValueError), span("failing"):
+            raise ValueError("boom")
+    finally:
+        remove_hook(hook)
+    with span("after"):
+        pass
+    assert [s.name for s in seen] == ["failing"]
+
+
+def test_failing_hook_warns():
+    def broken(_):
+        raise RuntimeError("metrics down")
+
+    add_hook(broken)
+    try:
+        with pytest.warns(UserWarning, match="metrics down"), span("x"):
+            pass
+    finally:
+        remove_hook(broken)
+
+
+def test_ingest_records_spans():
+    with collect_spans() as spans:
+        read_csv_cached(Path("tests/data/binary.csv"))
+    (read,) = spans
+    assert read.name == "ingest.read_csv"
+    assert read.rss_bytes is None or read.rss_bytes > 0
@@ -1,12 +1,17 @@
 from pathlib import Path
 
 import numpy as np
+import pandas as pd
 import pytest
 
 from fast_fmm_rpy2.plot_fui import (
+    compute_plot_data,
+    downsample_plot_data,
+    plot_fui,
     py_plot_fui_results,
     r_export_plot_fui_results,
 )
+from fast_fmm_rpy2.result import FuiResult
 
 
 @pytest.fixture
@@ -22,3 +27,82 @@ def test_plot_fui_compare(binary_filepath: Path) -> None:
     )
     assert np.allclose(r_cs.to_numpy().flatten(), py_cs.to_numpy().flatten())
     return None
+
+
+def _fit_fields(L: int = 15) -> dict:
+    rng = np.random.default_rng(1)
+    cov = rng.normal(size=(L, L, 2))
+    return {
+        "betaHat": pd.DataFrame(
+            rng.normal(size=(2, L)), index=["(Intercept)", "cs"]
+        ),
+        "betaHat_var": np.einsum("ijp,kjp->ikp", cov, cov),
+        "argvals": np.arange(1, L + 1),
+        "qn": np.array([2.4, 2.9]),
+    }
+
+
+def test_compute_plot_data_bands():
+    fields = _fit_fields()
+    data = compute_plot_data(FuiResult._from_fields(fields))
+    assert list(data) == ["(Intercept)", "cs"]
+    for r, frame in enumerate(data.values()):
+        beta = fields["betaHat"].iloc[r, :].to_numpy()
+        se = np.sqrt(np.diag(fields["betaHat_var"][:, :, r]))
+        qn = fields["qn"][r]
+        np.testing.assert_allclose(frame["lower"], beta - 2 * se)
+        np.testing.assert_allclose(frame["upper_joint"], beta + qn * se)
+        np.testing.assert_array_equal(frame["s"], fields["argvals"])
+
+
+def test_compute_plot_data_long_and_without_variance():
+    fields = _fit_fields()
+    long = compute_plot_data(FuiResult._from_fields(fields), long=True)
+    assert len(long) == 2 * 15
+    wide = compute_plot_data(FuiResult._from_fields(fields))
+    np.testing.assert_array_equal(
+        long.loc[long["coefficient"] == "cs", "upper"], wide["cs"]["upper"]
+    )
+    del fields["betaHat_var"]
+    data = compute_plot_data(FuiResult._from_fields(fields))
+    assert list(data["cs"].columns) == ["s", "beta"]
+
+
+def test_downsample_plot_data_keeps_extrema():
+    rng = np.random.default_rng(2)
+    n = 20_000
+    beta = np.cumsum(rng.normal(size=n))
+    se = np.abs(rng.normal(size=n)) + 0.1
+    frame = pd.DataFrame(
+        {
+            "s": np.arange(1, n + 1),
+            "beta": beta,
+            "lower": beta - 2 * se,
+            "upper": beta + 2 * se,
+        }
+    )
+    frame.loc[100, "beta"] = np.nan
+    thinned = downsample_plot_data(frame, 500)
+    assert len(thinned) <= 500
+    assert thinned["s"].is_monotonic_increasing
+    assert thinned["s"].iloc[[0, -1]].tolist() == [1, n]
+    assert thinned["lower"].min() == frame["lower"].min()
+    assert thinned["upper"].max() == frame["upper"].max()
+    assert thinned["beta"].max() == frame["beta"].max()
+    assert downsample_plot_data(frame, None) is frame
+    assert downsample_plot_data(frame.iloc[:400], 500).equals(frame[:400])
+    with pytest.raises(ValueError, match="at least 8"):
+        downsample_plot_data(frame, 7)
+
+
+def test_plot_fui_max_points():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    mod = FuiResult._from_fields(_fit_fields(L=300))
+    fig, data = plot_fui(mod, return_data=True, max_points=20)
+    (line,) = [
+        line for line in fig.axes[1].lines if line.get_label() == "Estimate"
+    ]
+    assert len(line.get_xdata()) < 300
+    assert len(data["cs"]) == 300
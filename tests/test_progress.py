@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+from fast_fmm_rpy2.progress import FuiEvents, ProgressParser
+
+
+def test_parser_steps_and_messages():
+    parser = ProgressParser()
+    events = parser.feed('[1] "Step 1: Fit Massively Univariate Mixed ')
+    assert events == []
+    events += parser.feed('Models"\n[1] "Step 2: Smoothing"\nfixed-effect')
+    events += parser.feed(" model matrix is rank deficient\n")
+    assert [e.kind for e in events] == ["step", "step", "message"]
+    assert [e.stage for e in events] == [
+        "univariate",
+        "smoothing",
+        "smoothing",
+    ]
+    assert events[1].step == "2" and events[1].label == "Smoothing"
+    assert events[2].text.startswith("fixed-effect model matrix")
+
+
+def test_parser_bootstrap_iterations():
+    parser = ProgressParser()
+    parser.feed('[1] "Step 3: Inference (Bootstrap)"\n')
+    (sub,) = parser.feed("Step 3.1: Bootstrap resampling-\n")
+    assert sub.stage == "bootstrap" and sub.step == "3.1"
+    # txtProgressBar redraws its line with carriage returns
+    events = parser.feed("\r  |====      |  40%\r  |====      |  40%")
+    events += parser.feed("\r  |=====     |  50%\rBootstrap 300/500")
+    events += parser.flush()
+    assert [e.fraction for e in events] == [0.4, 0.5, 0.6]
+    assert events[-1].current == 300 and events[-1].total == 500
+    assert all(e.kind == "iteration" for e in events)
+    assert all(e.eta_s is not None and e.eta_s >= 0 for e in events)
+
+
+def _fake_fit(n_steps, progress=None, fail=False):
+    parser = ProgressParser()
+    for i in range(n_steps):
+        for event in parser.feed(f"Step {i + 1}: stage\n"):
+            progress(event)
+    if fail:
+        raise RuntimeError("fit failed")
+    return "model"
+
+
+def test_fui_events_streams_then_returns():
+    async def main():
+        stream = FuiEvents(_fake_fit, 3)
+        steps = [event.step async for event in stream]
+        return steps, await stream
+
+    steps, result = asyncio.run(main())
+    assert steps == ["1", "2", "3"]
+    assert result == "model"
+
+
+def test_fui_events_reraises():
+    async def main():
+        stream = FuiEvents(_fake_fit, 1, fail=True)
+        async for _ in stream:
+            pass
+        await stream
+
+    with pytest.raises(RuntimeError, match="fit failed"):
+        asyncio.run(main())
+
+
+def test_fui_events_run_one_at_a_time():
+    running = []
+
+    def fit(progress=None):
+        running.append(fit)
+        time.sleep(0.05)
+        overlapped = len(running) > 1
+        running.pop()
+        return overlapped
+
+    async def main():
+        streams = [FuiEvents(fit) for _ in range(3)]
+        return [await stream for stream in streams]
+
+    assert asyncio.run(main()) == [False, False, False]
@@ -1,15 +1,23 @@
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 from rpy2 import robjects as ro  # type: ignore
 
+from fast_fmm_rpy2.audit import audit_df_dat
+from fast_fmm_rpy2.cache import IngestCache
 from fast_fmm_rpy2.ingest import (
     compare_df_dat,
     compare_df_dat_in_r,
     pandas_read_in_csv_roundtrip,
     r_read_in_csv_rpy2_convert,
+    read_csv_for_r,
+    read_csv_memmap_pass_to_r,
+    read_csvs_for_r,
+    split_functional_outcome,
 )
+from fast_fmm_rpy2.schema import IngestSchema
 
 
 @pytest.fixture
@@ -92,6 +100,18 @@ def test_roundtrip_compare_corr(corr_filepath: Path):
     assert results_df["float_isclose"].all()
 
 
+def test_audit_df_dat_matches_compare_df_dat(example_filepath: Path):
+    df: pd.DataFrame = pandas_read_in_csv_roundtrip(example_filepath)
+    dat: ro.vectors.DataFrame = r_read_in_csv_rpy2_convert(example_filepath)
+    audit = audit_df_dat(df, dat, ulp=True)
+    results_df = compare_df_dat(df=df, dat=dat)
+    assert audit.ok
+    assert audit.summary["n_cells"] == len(results_df)
+    assert (
+        audit.summary["n_mismatched"] == (~results_df["float_isclose"]).sum()
+    )
+
+
 def test_compare_df_dat_in_r_binary(binary_filepath: Path):
     result = compare_df_dat_in_r(binary_filepath)
     assert result
@@ -115,3 +135,79 @@ def test_compare_df_dat_in_r_anova(anova_filepath: Path):
 def test_compare_df_dat_in_r_corr(corr_filepath: Path):
     result = compare_df_dat_in_r(corr_filepath)
     assert result
+
+
+def test_split_functional_outcome(example_filepath: Path):
+    df: pd.DataFrame = pandas_read_in_csv_roundtrip(example_filepath)
+    covariates, outcome = split_functional_outcome(df, "photometry")
+    photometry_cols = [c for c in df.columns if c.startswith("photometry.")]
+    assert outcome is not None
+    assert outcome.shape == (len(df), len(photometry_cols))
+    assert (outcome == df[photometry_cols].to_numpy()).all()
+    assert list(covariates.columns) == [
+        c for c in df.columns if c not in photometry_cols
+    ]
+
+
+def test_split_functional_outcome_missing_prefix(binary_filepath: Path):
+    df: pd.DataFrame = pandas_read_in_csv_roundtrip(binary_filepath)
+    covariates, outcome = split_functional_outcome(df, "dff")
+    assert outcome is None
+    assert covariates is df
+
+
+def test_read_csv_for_r_cached(tmp_path: Path, example_filepath: Path):
+    cache = IngestCache(tmp_path)
+    df = read_csv_for_r(example_filepath)
+    cold = read_csv_for_r(example_filepath, cache=cache)
+    warm = read_csv_for_r(example_filepath, cache=cache)
+    assert len(cache.entries()) == 1
+    pd.testing.assert_frame_equal(cold, df)
+    pd.testing.assert_frame_equal(warm, df)
+
+
+def test_read_csv_memmap_pass_to_r(tmp_path: Path, example_filepath: Path):
+    df = read_csv_for_r(example_filepath)
+    covariates, outcome = read_csv_memmap_pass_to_r(
+        example_filepath, r_var_name="mm_dat", sidecar_dir=tmp_path
+    )
+    r_outcome = np.asarray(ro.r("mm_dat$photometry"))
+    assert r_outcome.shape == outcome.shape
+    assert np.array_equal(r_outcome, np.asarray(outcome), equal_nan=True)
+    assert list(ro.r("names(mm_dat)")) == list(covariates.columns) + [
+        "photometry"
+    ]
+    assert len(covariates) == len(df)
+
+
+def test_read_csvs_for_r_concatenates(
+    corr_filepath: Path, anova_filepath: Path
+):
+    corr = read_csv_for_r(corr_filepath)
+    anova = read_csv_for_r(anova_filepath)
+    df = read_csvs_for_r([corr_filepath, anova_filepath], source_column="src")
+    assert len(df) == len(corr) + len(anova)
+    assert list(df.index) == list(range(1, len(df) + 1))
+    assert df["src"].value_counts()["anova_data.csv"] == len(anova)
+    expected = pd.concat([corr, anova], ignore_index=True)
+    expected.index = df.index
+    pd.testing.assert_frame_equal(df.drop(columns="src"), expected)
+
+
+def test_read_csvs_for_r_categoricals_in_processes(
+    binary_filepath: Path, anova_filepath: Path
+):
+    df = read_csvs_for_r(
+        [binary_filepath, anova_filepath],
+        schema=IngestSchema(categorical=("id",)),
+        chunksize=100,
+        use_processes=True,
+    )
+    assert isinstance(df["id"].dtype, pd.CategoricalDtype)
+
+
+def test_read_csvs_for_r_rejects_mismatched_columns(
+    binary_filepath: Path, example_filepath: Path
+):
+    with pytest.raises(ValueError):
+        read_csvs_for_r([binary_filepath, example_filepath])
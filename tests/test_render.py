@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fast_fmm_rpy2 import render
+from fast_fmm_rpy2.plot_fui import compute_plot_data
+from fast_fmm_rpy2.render import render_batch, render_plot_data
+from fast_fmm_rpy2.result import FuiResult
+
+
+def _fitted(seed: int, L: int = 25) -> FuiResult:
+    rng = np.random.default_rng(seed)
+    cov = rng.normal(size=(L, L, 2))
+    return FuiResult._from_fields(
+        {
+            "betaHat": pd.DataFrame(
+                rng.normal(size=(2, L)), index=["(Intercept)", "cs"]
+            ),
+            "betaHat_var": np.einsum("ijp,kjp->ikp", cov, cov),
+            "argvals": np.arange(1, L + 1),
+            "qn": np.array([2.4, 2.9]),
+        }
+    )
+
+
+def test_render_plot_data_reuses_templates(tmp_path: Path):
+    render._templates.clear()
+    first = compute_plot_data(_fitted(0))
+    second = compute_plot_data(_fitted(1))
+    render_plot_data(first, [tmp_path / "a.png"])
+    render_plot_data(second, [tmp_path / "b.png"])
+    assert len(render._templates) == 1
+    (fig, axes) = next(iter(render._templates.values()))
+    # the old model's artists were replaced, not added to
+    assert len(axes[0].collections) == 2
+    np.testing.assert_allclose(
+        axes[1].get_ylim()[1],
+        second["cs"]["upper_joint"].max() * 1.1,
+    )
+    assert (tmp_path / "b.png").read_bytes().startswith(b"\x89PNG")
+
+
+def test_render_batch_writes_every_format(tmp_path: Path):
+    saved = _fitted(2).save(tmp_path / "saved_fit")
+    results = [_fitted(0), _fitted(1), saved, tmp_path / "missing"]
+    out = tmp_path / "figures"
+    rendered = {
+        res.index: res
+        for res in render_batch(
+            results, out, formats=("png", "svg"), max_workers=2
+        )
+    }
+    assert all(rendered[i].ok for i in range(3))
+    assert not rendered[3].ok
+    assert rendered[2].result == [
+        out / "saved_fit.png",
+        out / "saved_fit.svg",
+    ]
+    for stem in ("model_0", "model_1", "saved_fit"):
+        assert (out / f"{stem}.png").stat().st_size > 0
+        assert (out / f"{stem}.svg").read_text().lstrip().startswith("<?xml")
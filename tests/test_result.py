@@ -0,0 +1,140 @@
+import json
+from pathlib import Path
+
+import matplotlib
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.plot_fui import plot_fui
+from fast_fmm_rpy2.result import FuiResult
+
+matplotlib.use("Agg")
+
+
+def _fitted(L: int = 20) -> FuiResult:
+    rng = np.random.default_rng(0)
+    names = ["(Intercept)", "cs"]
+    cov = rng.normal(size=(L, L, len(names)))
+    beta_var = np.asfortranarray(np.einsum("ijp,kjp->ikp", cov, cov))
+    return FuiResult._from_fields(
+        {
+            "betaHat": pd.DataFrame(rng.normal(size=(2, L)), index=names),
+            "betaHat_var": beta_var,
+            "argvals": np.arange(1, L + 1),
+            "qn": np.array([2.5, 2.7]),
+            "aic": None,
+        },
+        {"formula": "photometry ~ cs + (1 | id)"},
+    )
+
+
+def test_deferred_metadata_is_built_once(tmp_path: Path):
+    calls = []
+
+    def describe():
+        calls.append(1)
+        return {"formula": "photometry ~ cs + (1 | id)"}
+
+    mod = _fitted()
+    mod.metadata = describe
+    assert calls == []
+    loaded = FuiResult.load(mod.save(tmp_path / "fit"))
+    assert loaded.metadata == {"formula": "photometry ~ cs + (1 | id)"}
+    assert mod.metadata is mod.metadata
+    assert calls == [1]
+
+
+def test_save_load_round_trip(tmp_path: Path):
+    mod = _fitted()
+    path = mod.save(tmp_path / "fit")
+    loaded = FuiResult.load(path)
+    assert loaded.names() == ["betaHat", "betaHat_var", "argvals", "qn"]
+    assert loaded.r_object is None
+    assert loaded.metadata == mod.metadata
+    pd.testing.assert_frame_equal(loaded["betaHat"], mod["betaHat"])
+    assert isinstance(loaded.to_numpy("betaHat_var"), np.memmap)
+    assert loaded.to_numpy("betaHat_var").flags.f_contiguous
+    np.testing.assert_array_equal(loaded["betaHat_var"], mod["betaHat_var"])
+    assert loaded.to_dict()["qn"].tolist() == [2.5, 2.7]
+
+
+def test_save_explicit_fields(tmp_path: Path):
+    mod = _fitted()
+    loaded = FuiResult.load(mod.save(tmp_path, ["qn", "aic"]), mmap=False)
+    assert loaded["aic"] is None
+    assert not isinstance(loaded["qn"], np.memmap)
+    with pytest.raises(KeyError):
+        mod.save(tmp_path, ["residuals"])
+
+
+def test_load_rejects_other_formats(tmp_path: Path):
+    path = _fitted().save(tmp_path)
+    meta = json.loads((path / "metadata.json").read_text())
+    meta["format"] = -1
+    (path / "metadata.json").write_text(json.dumps(meta))
+    with pytest.raises(ValueError):
+        FuiResult.load(path)
+
+
+def test_plot_fui_on_loaded_result(tmp_path: Path):
+    mod = _fitted()
+    _, expected = plot_fui(mod, return_data=True)
+    _, actual = plot_fui(FuiResult.load(mod.save(tmp_path)), return_data=True)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name])
+
+
+def test_save_over_loaded_result(tmp_path: Path):
+    mod = _fitted()
+    path = mod.save(tmp_path / "fit")
+    loaded = FuiResult.load(path)
+    expected = np.array(loaded["betaHat_var"])
+    # fewer fields, written into the directory the arrays are mapped from
+    loaded.save(path, ["betaHat_var", "qn"])
+    np.testing.assert_array_equal(loaded["betaHat_var"], expected)
+    again = FuiResult.load(path)
+    assert again.names() == ["betaHat_var", "qn"]
+    np.testing.assert_array_equal(again["betaHat_var"], expected)
+    assert sorted(p.name for p in path.iterdir()) == [
+        "0.npy",
+        "1.npy",
+        "metadata.json",
+    ]
+
+
+def test_spill_maps_field_from_disk(tmp_path: Path):
+    mod = _fitted()
+    expected = np.array(mod["betaHat_var"])
+    stored = mod.spill("betaHat_var", tmp_path / "var.npy")
+    assert isinstance(mod["betaHat_var"], np.memmap)
+    assert mod.to_numpy("betaHat_var") is stored
+    np.testing.assert_array_equal(stored, expected)
+    with pytest.raises(TypeError):
+        mod.spill("aic", tmp_path / "aic.npy")
+
+
+def test_spill_again_to_the_same_path(tmp_path: Path):
+    mod = _fitted()
+    expected = np.array(mod["betaHat_var"])
+    first = mod.spill("betaHat_var", tmp_path / "var.npy")
+    second = mod.spill("betaHat_var", tmp_path / "var.npy")
+    np.testing.assert_array_equal(second, expected)
+    # the earlier mapping still reads the file it was mapped from
+    np.testing.assert_array_equal(first, expected)
+    assert [p.name for p in tmp_path.iterdir()] == ["var.npy"]
+
+
+def test_var_diagonal_and_block():
+    mod = _fitted()
+    var = mod["betaHat_var"]
+    np.testing.assert_array_equal(mod.var_diagonal(1), np.diag(var[:, :, 1]))
+    assert mod.var_diagonal().shape == (2, 20)
+    np.testing.assert_array_equal(mod.var_diagonal()[0], mod.var_diagonal(0))
+    np.testing.assert_array_equal(
+        mod.var_block(0, slice(2, 5), slice(0, 3)), var[2:5, 0:3, 0]
+    )
+    idx = np.array([1, 4])
+    np.testing.assert_array_equal(
+        mod.var_block(1, idx), var[np.ix_(idx, idx, [1])][:, :, 0]
+    )
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from fast_fmm_rpy2.batch import FuiJob, fit_batch
+from fast_fmm_rpy2.scheduler import (
+    CORE_BUDGET_ENV,
+    THREAD_ENV_VARS,
+    CoreBudget,
+    apply_thread_env,
+    available_cores,
+    default_core_budget,
+    plan_resources,
+)
+
+
+@pytest.mark.parametrize(
+    "n_jobs, total_cores, max_workers, expected",
+    [
+        (None, 16, None, (16, 1)),
+        (2, 16, None, (2, 8)),
+        (1000, 16, 4, (4, 4)),
+        (3, 8, None, (3, 2)),
+        (5, 1, None, (1, 1)),
+    ],
+)
+def test_plan_resources(n_jobs, total_cores, max_workers, expected):
+    plan = plan_resources(n_jobs, total_cores, max_workers)
+    assert (plan.max_workers, plan.n_cores) == expected
+    assert plan.cores_in_use <= total_cores
+    assert plan.blas_threads == 1
+    assert plan.fui_kwargs() == {
+        "parallel": plan.n_cores > 1,
+        "n_cores": plan.n_cores,
+    }
+
+
+def test_plan_resources_defaults_to_available_cores():
+    assert plan_resources().total_cores == available_cores()
+
+
+def test_plan_resources_rejects_empty_budget():
+    with pytest.raises(ValueError, match="total_cores"):
+        plan_resources(total_cores=0)
+
+
+def test_apply_thread_env(monkeypatch: pytest.MonkeyPatch):
+    for name in THREAD_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    apply_thread_env(plan_resources(total_cores=4))
+    assert all(os.environ[name] == "1" for name in THREAD_ENV_VARS)
+
+
+def test_fit_batch_exposes_plan():
+    jobs = [FuiJob("data.csv", "y ~ x")] * 3
+    run = fit_batch(jobs, total_cores=12)
+    assert run.plan.options() == {
+        "total_cores": 12,
+        "max_workers": 3,
+        "n_cores": 4,
+        "blas_threads": 1,
+        "parallel": True,
+        "cores_in_use": 12,
+    }
+    run.close()
+
+
+def test_core_budget_shares_tokens(tmp_path):
+    budget = CoreBudget(4, tmp_path)
+    with budget.acquire(3) as first:
+        assert first == 3
+        with budget.acquire(4, minimum=1) as second:
+            assert second == 1
+    with budget.acquire(10) as again:
+        assert again == 4
+
+
+def test_default_core_budget_can_be_disabled(monkeypatch):
+    monkeypatch.setenv(CORE_BUDGET_ENV, "0")
+    assert default_core_budget() is None
+    monkeypatch.setenv(CORE_BUDGET_ENV, "6")
+    assert default_core_budget().total_cores == 6
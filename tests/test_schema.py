@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.schema import (
+    DEFAULT_SCHEMA,
+    IngestSchema,
+    apply_schema,
+    read_csv_with_schema,
+)
+
+
+@pytest.fixture
+def binary_filepath() -> Path:
+    return Path(r"tests/data/binary.csv")
+
+
+@pytest.fixture
+def corr_filepath() -> Path:
+    return Path(r"tests/data/corr_data.csv")
+
+
+def legacy_read(csv_filepath: Path) -> pd.DataFrame:
+    # historical per-row fix-up that the schema engine replaces
+    df = pd.read_csv(csv_filepath, float_precision="round_trip")
+    df["trial"] = df["trial"].fillna(-1).astype("int")
+    df["trial"] = df["trial"].apply(lambda x: pd.NA if x < 1 else x)
+    df.index = range(1, len(df) + 1)  # type: ignore
+    return df
+
+
+@pytest.mark.parametrize(
+    "csv_filepath",
+    [
+        Path(r"tests/data/binary.csv"),
+        Path(r"tests/data/corr_data.csv"),
+        Path(r"tests/data/anova_data.csv"),
+        Path(r"tests/data/example_data.csv"),
+    ],
+)
+def test_default_schema_matches_legacy(csv_filepath: Path):
+    legacy = legacy_read(csv_filepath)
+    df = read_csv_with_schema(csv_filepath)
+    assert df["trial"].dtype == "Int64"
+    assert (df["trial"].isna() == legacy["trial"].isna()).all()
+    assert (df["trial"].dropna().astype(int) == legacy["trial"].dropna()).all()
+    pd.testing.assert_frame_equal(
+        df.drop(columns="trial"), legacy.drop(columns="trial")
+    )
+    assert list(df.index) == list(range(1, len(df) + 1))
+
+
+def test_schema_without_trial_column(corr_filepath: Path):
+    df = read_csv_with_schema(
+        corr_filepath, IngestSchema(nullable_int=("block",))
+    )
+    assert "block" not in df.columns
+    outcome_cols = DEFAULT_SCHEMA.outcome_columns(df.columns)
+    assert (df[outcome_cols].dtypes == "float64").all()
+
+    no_trial = pd.read_csv(corr_filepath).drop(columns="trial")
+    apply_schema(no_trial)
+    assert no_trial.index[0] == 1
+
+
+def test_schema_categorical_ids(binary_filepath: Path):
+    df = read_csv_with_schema(
+        binary_filepath, IngestSchema(categorical=("id",))
+    )
+    assert isinstance(df["id"].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_string_dtype(df["id"].cat.categories)
+
+
+def test_apply_schema_masks_out_of_range():
+    df = pd.DataFrame({"trial": [0.0, float("nan"), 3.0], "id": [1, 2, 1]})
+    apply_schema(df, IngestSchema(categorical=("id",)))
+    assert df["trial"].isna().tolist() == [True, True, False]
+    assert df["trial"].iloc[2] == 3
+    assert list(df["id"].cat.categories) == ["1", "2"]
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.schema import DEFAULT_SCHEMA, read_csv_with_schema
+from fast_fmm_rpy2.sidecar import build_outcome_sidecar, load_outcome_sidecar
+
+
+@pytest.fixture
+def csv_copy(tmp_path: Path) -> Path:
+    path = tmp_path / "binary.csv"
+    path.write_bytes(Path(r"tests/data/binary.csv").read_bytes())
+    return path
+
+
+def test_sidecar_matches_csv(csv_copy: Path):
+    df = read_csv_with_schema(csv_copy)
+    outcome_cols = DEFAULT_SCHEMA.outcome_columns(df.columns)
+    covariates, outcome = load_outcome_sidecar(csv_copy, chunksize=100)
+    assert isinstance(outcome, np.memmap)
+    assert outcome.flags.f_contiguous
+    assert not outcome.flags.writeable
+    assert np.array_equal(
+        np.asarray(outcome), df[outcome_cols].to_numpy(), equal_nan=True
+    )
+    pd.testing.assert_frame_equal(covariates, df.drop(columns=outcome_cols))
+
+
+def test_sidecar_rebuilds_when_csv_changes(csv_copy: Path):
+    _, outcome = load_outcome_sidecar(csv_copy)
+    n_rows = outcome.shape[0]
+    del outcome
+    lines = csv_copy.read_text().splitlines(keepends=True)
+    csv_copy.write_text("".join(lines[:-10]))
+    covariates, outcome = load_outcome_sidecar(csv_copy)
+    assert outcome.shape[0] == n_rows - 10
+    assert len(covariates) == n_rows - 10
+
+
+def test_sidecar_rebuild_keeps_open_maps_valid(csv_copy: Path):
+    _, old = load_outcome_sidecar(csv_copy)
+    expected = np.array(old)
+    lines = csv_copy.read_text().splitlines(keepends=True)
+    csv_copy.write_text("".join(lines[:-10]))
+    _, new = load_outcome_sidecar(csv_copy)
+    assert new.shape[0] == old.shape[0] - 10
+    np.testing.assert_array_equal(np.asarray(old), expected)
+    assert not list(csv_copy.with_suffix(".fmm").glob("*.tmp*"))
+
+
+def test_sidecar_trims_blank_lines(csv_copy: Path):
+    with open(csv_copy, "a") as f:
+        f.write("\n\n")
+    sidecar_dir = build_outcome_sidecar(csv_copy)
+    outcome = np.load(sidecar_dir / "outcome.npy", mmap_mode="r")
+    assert outcome.shape[0] == len(read_csv_with_schema(csv_copy))
+    assert outcome.flags.f_contiguous
+
+
+def test_sidecar_requires_outcome_columns(tmp_path: Path):
+    path = tmp_path / "no_outcome.csv"
+    pd.DataFrame({"id": [1, 2], "cs": [0, 1]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        build_outcome_sidecar(path)
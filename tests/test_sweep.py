@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fast_fmm_rpy2.sweep import _aic_summary, candidates, sweep
+
+FORMULAS = ["photometry ~ cs + (1 | id)", "photometry ~ cs + (cs | id)"]
+
+
+def test_candidates_expands_grid():
+    pairs = candidates(
+        [FORMULAS[0], (FORMULAS[1], {"splines": "cr"})],
+        grid={"splines": ["tp", "bs"], "MoM": [1, 2]},
+    )
+    assert len(pairs) == 8
+    assert pairs[0] == (FORMULAS[0], {"splines": "tp", "MoM": 1})
+    assert pairs[3] == (FORMULAS[0], {"splines": "bs", "MoM": 2})
+    assert {kwargs["splines"] for _, kwargs in pairs[4:]} == {"cr"}
+    assert candidates(FORMULAS) == [(f, {}) for f in FORMULAS]
+
+
+def test_sweep_rejects_mixed_outcomes():
+    with pytest.raises(ValueError):
+        sweep(Path("tests/data/binary.csv"), [FORMULAS[0], "dff ~ cs"])
+    with pytest.raises(ValueError):
+        sweep(Path("tests/data/binary.csv"), [])
+
+
+def test_aic_summary():
+    aic = np.array([[1.0, 2.0, np.nan], [3.0, 4.0, np.nan]])
+    summary = _aic_summary(aic)
+    assert summary["AIC"] == 2.0
+    assert summary["BIC"] == 3.0
+    assert np.isnan(summary["cAIC"])
+    assert all(np.isnan(v) for v in _aic_summary(None).values())
+
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_sweep_matches_fui(processes):
+    from fast_fmm_rpy2.fmm_run import fui
+
+    csv_filepath = Path("tests/data/binary.csv")
+    table = sweep(csv_filepath, FORMULAS, parallel=False, processes=processes)
+    assert list(table["formula"]) == FORMULAS
+    assert (table["status"] == "ok").all()
+    assert (table["fit_s"] > 0).all()
+    for formula, caic in zip(table["formula"], table["cAIC"]):
+        mod = fui(csv_filepath, formula, parallel=False, caic=True)
+        expected = np.nanmean(mod.to_numpy("aic")[:, 2])
+        np.testing.assert_allclose(caic, expected)
+
+
+def test_sweep_records_failures():
+    table = sweep(
+        Path("tests/data/binary.csv"),
+        [FORMULAS[0], "photometry ~ missing_column + (1 | id)"],
+        parallel=False,
+        keep_results=True,
+    )
+    assert list(table["status"]) == ["ok", "error"]
+    assert table["error"].iloc[1]
+    assert np.isnan(table["cAIC"].iloc[1])
+    assert "betaHat" in table["result"].iloc[0]
+
+
+def test_sweep_reads_data_with_schema():
+    from rpy2 import robjects as ro  # type: ignore
+
+    from fast_fmm_rpy2.schema import IngestSchema
+
+    table = sweep(
+        Path("tests/data/binary.csv"),
+        FORMULAS[:1],
+        parallel=False,
+        schema=IngestSchema(categorical=("id",)),
+    )
+    assert list(table["status"]) == ["ok"]
+    assert ro.r("is.factor(sweep_dat$id)")[0]
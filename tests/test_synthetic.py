@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.synthetic import (
+    SyntheticSpec,
+    bump,
+    load_synthetic,
+    make_synthetic,
+    write_synthetic,
+)
+
+
+def test_layout_matches_bundled_data():
+    df = make_synthetic(n_subjects=3, n_sessions=2, n_trials=4, L=7)
+    bundled = pd.read_csv("tests/data/anova_data.csv", nrows=1)
+    assert list(df.columns[:4]) == list(bundled.columns[:4])
+    assert list(df.columns[4:]) == [f"photometry.{i}" for i in range(1, 8)]
+    assert len(df) == 3 * 2 * 4
+    assert df.groupby(["id", "session"])["trial"].max().eq(4).all()
+
+
+def test_noise_free_data_follow_the_effect_curves():
+    spec = SyntheticSpec(
+        n_subjects=2,
+        L=20,
+        effects={"(Intercept)": 1.0, "cs": bump(0.5)},
+        random_sd=0.0,
+        noise_sd=0.0,
+    )
+    covariates, outcome = make_synthetic(spec, wide=False)
+    s = np.linspace(0, 1, 20)
+    expected = 1.0 + np.outer(covariates["cs"], bump(0.5)(s))
+    np.testing.assert_allclose(outcome, expected)
+
+
+def test_seed_and_chunking_are_reproducible(tmp_path: Path):
+    spec = SyntheticSpec(n_subjects=5, L=10, missing_trials=0.2, seed=3)
+    df = make_synthetic(spec)
+    pd.testing.assert_frame_equal(df, make_synthetic(spec))
+    assert not df.equals(make_synthetic(SyntheticSpec(n_subjects=5, L=10)))
+    path = write_synthetic(tmp_path / "data.csv", spec, chunk_subjects=2)
+    np.testing.assert_allclose(pd.read_csv(path).to_numpy(), df.to_numpy())
+
+
+def test_npy_format_round_trip(tmp_path: Path):
+    spec = SyntheticSpec(n_subjects=4, L=70, missing_outcome=0.1, seed=1)
+    covariates, outcome = load_synthetic(
+        write_synthetic(tmp_path / "data", spec, chunk_subjects=3)
+    )
+    expected_covariates, expected = make_synthetic(spec, wide=False)
+    pd.testing.assert_frame_equal(covariates, expected_covariates)
+    assert outcome.flags.f_contiguous
+    np.testing.assert_array_equal(outcome, expected)
+    assert 0.05 < np.isnan(outcome).mean() < 0.15
+
+
+def test_random_slopes_and_unknown_format(tmp_path: Path):
+    df = make_synthetic(
+        n_subjects=2,
+        effects={"(Intercept)": 0.0, "cs": 1.0, "speed": 0.5},
+        continuous=["speed"],
+        random_effects=["(Intercept)", "cs"],
+    )
+    assert set(df["cs"]) <= {0, 1}
+    assert df["speed"].dtype == np.float64
+    with pytest.raises(ValueError):
+        write_synthetic(tmp_path / "data.xlsx")
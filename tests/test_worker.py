@@ -0,0 +1,119 @@
+import io
+import socket
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fast_fmm_rpy2.worker import (
+    WorkerClient,
+    WorkerError,
+    _serve_stream,
+    recv_frame,
+    send_frame,
+)
+
+
+def test_frame_roundtrip():
+    df = pd.DataFrame({"x": np.arange(5.0), "id": list("abcde")})
+    left, right = socket.socketpair()
+    with left, right:
+        with left.makefile("wb") as wfile:
+            send_frame(wfile, {"data": df, "outcome": np.eye(3)})  # type: ignore
+        with right.makefile("rb") as rfile:
+            payload = recv_frame(rfile)  # type: ignore
+    pd.testing.assert_frame_equal(payload["data"], df)
+    np.testing.assert_array_equal(payload["outcome"], np.eye(3))
+
+
+def test_recv_frame_truncated():
+    buf = io.BytesIO()
+    send_frame(buf, list(range(100)))
+    with pytest.raises(EOFError):
+        recv_frame(io.BytesIO(buf.getvalue()[:-1]))
+    with pytest.raises(EOFError):
+        recv_frame(io.BytesIO(b""))
+
+
+def test_client_reraises_worker_errors(tmp_path: Path):
+    socket_path = tmp_path / "w.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+
+    def serve(n_connections):
+        for _ in range(n_connections):
+            conn, _ = server.accept()
+            with conn, conn.makefile("rb") as rfile:
+                with conn.makefile("wb") as wfile:
+                    _serve_stream(rfile, wfile)  # type: ignore[arg-type]
+
+    # one connection for the liveness probe, one for the request
+    thread = threading.Thread(target=serve, args=(2,))
+    thread.start()
+    try:
+        client = WorkerClient(socket_path)
+        assert client.is_running()
+        with pytest.raises(ValueError, match="unknown worker op") as info:
+            client._request({"op": "bogus"})
+        assert isinstance(info.value.__cause__, WorkerError)
+    finally:
+        thread.join()
+        server.close()
+    with pytest.raises(TypeError):
+        client.fui(None, "y ~ x", import_rules=None)
+
+
+def test_client_forwards_progress_events(tmp_path: Path):
+    socket_path = tmp_path / "w.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+
+    def serve():
+        conn, _ = server.accept()
+        with conn, conn.makefile("rb") as rfile:
+            request = recv_frame(rfile)  # type: ignore[arg-type]
+            with conn.makefile("wb") as wfile:
+                for i in range(2):
+                    send_frame(wfile, {"event": i})  # type: ignore
+                send_frame(wfile, {"ok": True, "result": request})  # type: ignore
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    events = []
+    try:
+        result = WorkerClient(socket_path).fui(
+            None, "y ~ x", progress=events.append
+        )
+    finally:
+        thread.join()
+        server.close()
+    assert events == [0, 1]
+    assert result["progress"] is True
+
+
+def test_client_unreachable(tmp_path: Path):
+    client = WorkerClient(tmp_path / "missing.sock")
+    assert not client.is_running()
+    with pytest.raises(WorkerError):
+        client.ping()
+
+
+def test_stdio_worker_matches_in_process_fui():
+    from fast_fmm_rpy2.fmm_run import fui, fui_result_to_dict
+
+    csv_filepath = Path("tests/data/binary.csv")
+    formula = "photometry ~ cs + (1 | id)"
+    expected = fui_result_to_dict(fui(csv_filepath, formula, parallel=False))
+    with WorkerClient(stdio=True).start() as client:
+        assert client.ping()["fastfmm_version"]
+        first = client.fui(csv_filepath, formula, parallel=False)
+        second = client.fui(pd.read_csv(csv_filepath), formula, parallel=False)
+        with pytest.raises(ValueError, match="outcome"):
+            client.fui(csv_filepath, formula, outcome=np.ones((2, 2)))
+    for result in (first, second):
+        np.testing.assert_allclose(result["betaHat"], expected["betaHat"])
+        np.testing.assert_allclose(result["qn"], expected["qn"])